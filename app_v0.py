@@ -1,21 +1,46 @@
 import pandas as pd
 import os
+import asyncio
+import hmac
 from typing import List, Dict, Tuple
 import numpy as np
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, Form, HTTPException, Header, Query
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from pydantic import BaseModel
 import uvicorn
 import json
 import ast
-import re
-from unicodedata import normalize as uni_normalize
+import threading
+import uuid
+import time
+from typing import Any
+from tag_engine import TagEngine, NO_TAG
+from topk import top_k_indices
+from inverted_index import fill_with_zero_rows, MAX_CANDIDATE_FRACTION
+from recommender import compile_products, rank_hybrid_rows
+from batching import MicroBatcher
+from executor import ExecutorSaturated, SearchExecutor
+from query_cache import QueryCache
+from label_registry import LabelRegistry
+from lexical_index import LexicalIndex
+from spelling import load_or_build as cargar_corrector
+from query_constraints import FilterIndex, has_filters
+from json_api import (decode_cursor, dumps, encode_cursor, etag_for, etag_matches,
+                      parse_fields, project_records)
+from catalog import (SNAPSHOT_AVAILABLE, CatalogSnapshot, file_checksum, find_data_path,
+                     load_catalog, memory_report, read_csv_catalog)
+from catalog_updates import CsvWatcher, DeltaJournal, apply_delta, delta_key, journal_path
 
 # Verificar disponibilidad del modelo LLM
 LLM_AVAILABLE = False
 llm_model = None
 
+# Versión del catálogo en uso (snapshot, o CSV compilado en memoria) y su CSV de origen
+catalogo = None
+ruta_csv = None
+
 try:
     from es_ecommerce_classifier import load as load_model
     # Intentar cargar el modelo
@@ -67,96 +92,48 @@ def safe_list(x):
             return []
     return []
 
+# Registro de labels: tabla precalculada con los labels del modelo (meta.json);
+# el vocabulario del catálogo se agrega cuando se compila el motor
+registro_labels = LabelRegistry.from_sources()
+
 def clean_label(label: str) -> str:
     """
-    Normaliza labels del modelo:
-    - Mayúsculas
-    - Sin acentos
-    - Espacios/guiones -> _
-    - Colapsa prefijos duplicados (CAT_CAT_ -> CAT_, INT_INT_ -> INT_, ATTR_ATTR_ -> ATTR_)
-    - Colapsa underscores repetidos
-    """
-    if not isinstance(label, str):
-        label = str(label)
-    s = label.strip().upper()
-    s = uni_normalize("NFKD", s).encode("ascii", "ignore").decode("ascii")
-    s = re.sub(r"[ \-./:;,]+", "_", s)            # separadores -> _
-    s = re.sub(r"^(CAT_)+", "CAT_", s)            # CAT_CAT_... -> CAT_
-    s = re.sub(r"^(INT_)+", "INT_", s)            # INT_INT_... -> INT_
-    s = re.sub(r"^(ATTR_)+", "ATTR_", s)          # ATTR_ATTR_... -> ATTR_
-    s = re.sub(r"_+", "_", s)                     # varios __ -> _
-    s = s.strip("_")
-    return s
+    Normaliza labels del modelo (ver `label_registry.normalize_label`):
+    mayúsculas, sin acentos, separadores -> _, sin prefijos duplicados.
+    Los labels conocidos salen de la tabla del registro sin regex ni NFKD.
+    """
+    return registro_labels.clean(label)
 
 # Función para cargar datos reales del CSV
 def load_data():
-    """Carga los datos reales del CSV productos-gemini.csv"""
+    """
+    Carga los datos reales de productos-gemini.csv.
+    Si pyarrow está disponible usa el snapshot compilado (memory-map), recompilándolo
+    si el CSV cambió; si no, parsea el CSV como siempre.
+    """
+    global catalogo, ruta_csv
     try:
-        # Intentar con diferentes rutas
-        data_path = None
-        possible_paths = ['datos/productos-gemini.csv', 'data/productos-gemini.csv', 'productos-gemini.csv']
-        
-        for path in possible_paths:
-            if os.path.exists(path):
-                data_path = path
-                break
-        
+        data_path = find_data_path()
         if data_path is None:
             raise FileNotFoundError("No se encontró el archivo productos-gemini.csv en ninguna ubicación")
-            
-        df = pd.read_csv(data_path)
-        print(f"SUCCESS: Cargados {len(df)} productos del archivo CSV: {data_path}")
-        print(f"Columnas disponibles: {list(df.columns)}")
-        
-        # Procesar la columna atributos_correctos para extraer categorías, intenciones y atributos
-        df['parsed_attributes'] = df['atributos_correctos'].apply(parse_attributes)
-        
-        # Agregar campos separados para facilitar el cálculo de scores
-        df['categoria_principal'] = df['parsed_attributes'].apply(lambda x: x.get('categoria', '') if x else '')
-        df['intencion_principal'] = df['parsed_attributes'].apply(lambda x: x.get('intencion', '') if x else '')
-        df['atributos_lista'] = df['parsed_attributes'].apply(lambda x: x.get('atributos', []) if x else [])
-        
-        # Agregar columnas que necesita el template (con valores por defecto)
-        if 'list_price' in df.columns:
-            df['sale_price'] = df['list_price'] * 0.9  # Simular 10% descuento
+        ruta_csv = data_path
+
+        if SNAPSHOT_AVAILABLE:
+            catalogo = load_catalog(data_path)
+            df = catalogo.df
+            print(f"SUCCESS: Snapshot del catálogo abierto: {catalogo.path}")
         else:
-            df['sale_price'] = 100000  # Precio por defecto
-            
-        df['sku_id'] = df['slug'] if 'slug' in df.columns else range(len(df))  # Usar slug como SKU
-        df['discount_percent'] = 10.0  # Descuento fijo del 10%
-        
-        # Agregar columna de relevance_score inicializada en 0
-        df['relevance_score'] = 0.0
-        
-        # Agregar columnas para compatibilidad con el sistema de tags
-        if 'atributos_list' not in df.columns:
-            df['atributos_list'] = df['atributos_lista'].apply(safe_list)
-        if 'categoria_detectada' not in df.columns:
-            df['categoria_detectada'] = df['categoria_principal']
-        if 'intencion_detectada' not in df.columns:
-            df['intencion_detectada'] = df['intencion_principal']
-        
+            df = read_csv_catalog(data_path)
+
         print(f"SUCCESS: Datos procesados correctamente. Shape final: {df.shape}")
         return df
     except Exception as e:
         print(f"ERROR cargando datos del CSV: {e}")
         print("Usando datos de muestra como fallback")
+        catalogo = None
+        ruta_csv = None
         return load_sample_data()
 
-def parse_attributes(attr_str):
-    """Parsea la cadena JSON de atributos_correctos"""
-    if pd.isna(attr_str) or not attr_str:
-        return {}
-    
-    try:
-        # Intentar parsear como diccionario
-        if isinstance(attr_str, str):
-            return ast.literal_eval(attr_str)
-        return attr_str
-    except Exception as e:
-        print(f"Error parseando atributos: {e}")
-        return {}
-
 def load_sample_data():
     """Datos de muestra como fallback"""
     sample_data = {
@@ -182,6 +159,7 @@ def load_sample_data():
     df['categoria_detectada'] = df['categoria_principal']
     df['intencion_detectada'] = df['intencion_principal']
     df['slug'] = range(len(df))
+    df['sku_id'] = df['slug']
     
     return df
 
@@ -207,6 +185,10 @@ def similitud_producto(row: pd.Series, tags_set: set) -> int:
 
     return total
 
+def limpiar_cats(raw_predictions: dict) -> dict[str, float]:
+    """doc.cats con los labels normalizados por `clean_label`."""
+    return registro_labels.clean_scores(raw_predictions)
+
 # --- Generación de tags desde LLM o dict de scores ---
 def generar_tags(query: str = "",
                  model=None,
@@ -227,7 +209,7 @@ def generar_tags(query: str = "",
         raw_predictions = getattr(doc, "cats", {})
 
     # Normalizar labels
-    cleaned_predictions = { clean_label(k): float(v) for k, v in raw_predictions.items() }
+    cleaned_predictions = limpiar_cats(raw_predictions)
 
     # Ordenar por score desc
     predicciones_ordenadas = sorted(cleaned_predictions.items(), key=lambda x: x[1], reverse=True)
@@ -235,88 +217,573 @@ def generar_tags(query: str = "",
     return tags
 
 # --- Pipeline completo ---
-def filtrar_por_tags(df: pd.DataFrame, tags: list[str], min_coincidencias: int = 2) -> pd.DataFrame:
+def filtrar_por_tags(df: pd.DataFrame, tags: list[str], min_coincidencias: int = 2,
+                     motor: TagEngine | None = None, top_k: int | None = None,
+                     cache: QueryCache | None = None, filas: np.ndarray | None = None) -> pd.DataFrame:
     """
     Calcula similitud y devuelve DF filtrado (similitud >= min_coincidencias) y ordenado.
+    Usa el motor precompilado (`TagEngine`); si no se pasa uno que corresponda a `df`,
+    lo compila en el momento. Con `top_k` sólo se seleccionan (y arman) los k mejores.
+    Si el motor tiene índice invertido, sólo se puntúan los candidatos de la query.
+    Con `cache` (que tiene que corresponder a `motor`) el ranking de un mismo set
+    de tags se reutiliza entre requests.
     """
-    df = df.copy()
+    if motor is None or motor.n_products != len(df):
+        motor = TagEngine.from_dataframe(df)
+        cache = None
 
-    # Asegurar columnas
-    if "atributos_list" not in df.columns:
-        df["atributos_list"] = [[] for _ in range(len(df))]
-    else:
-        df["atributos_list"] = df["atributos_list"].apply(safe_list)
+    idx, similitud = rankear_por_tags(tags, motor, min_coincidencias, top_k, cache, filas)
 
+    # Columnas útiles (ajusta según tu catálogo)
+    cols_base = [c for c in ["title", "brand_name", "categories", "list_price"] if c in df.columns]
+    df_filtrado = df.iloc[idx].loc[:, cols_base].copy()
     for col in ("categoria_detectada", "intencion_detectada"):
-        if col not in df.columns:
-            df[col] = ""
-        df[col] = df[col].fillna("")
+        df_filtrado[col] = df[col].iloc[idx].fillna("").values if col in df.columns else ""
+    df_filtrado["atributos_list"] = motor.attr_lists(idx)
+    df_filtrado["similitud"] = similitud
 
+    return df_filtrado
+
+def rankear_por_tags(tags: list[str], motor: TagEngine, min_coincidencias: int = 2,
+                     top_k: int | None = None,
+                     cache: QueryCache | None = None,
+                     filas: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Ranking de `filtrar_por_tags` sin armar el DataFrame: (filas, similitud)
+    ordenadas por similitud desc (a igual similitud, orden del catálogo).
+    Con `filas` (ya filtradas por precio/marca) sólo se puntúan esas, sin cache.
+    """
     # Preparar set de tags
     tags_norm = { clean_label(t) for t in tags if isinstance(t, str) and t.strip() }
 
-    # Calcular similitud
-    df["similitud"] = df.apply(lambda r: similitud_producto(r, tags_norm), axis=1)
+    if filas is not None:
+        similitud = motor.match_counts(tags_norm, rows=filas)
+        keep = similitud >= min_coincidencias
+        idx, similitud = filas[keep], similitud[keep]
+        orden = top_k_indices(similitud, len(idx) if top_k is None else top_k)
+        return idx[orden], similitud[orden]
 
-    # Filtrar y ordenar
-    df_filtrado = df[df["similitud"] >= min_coincidencias].sort_values("similitud", ascending=False)
+    cacheado = cache.get_ranking(tags_norm, top_k, min_coincidencias) if cache is not None else None
+    if registro_labels.motor is motor:
+        tag_ids = [registro_labels.tag_id(t) for t in tags_norm]
+    else:
+        tag_ids = [motor.tag_id(t) for t in tags_norm]
+    selectiva = (cacheado is None and motor.index is not None and
+                 motor.index.posting_size(tag_ids) <= MAX_CANDIDATE_FRACTION * motor.n_products)
+    if cacheado is not None:
+        idx, similitud = cacheado
+    elif selectiva and (top_k is not None or min_coincidencias >= 1):
+        # Sólo se puntúan los productos que comparten algún tag con la query
+        # (unión de postings); el resto tiene similitud 0.
+        candidatos = motor.index.union(tag_ids)
+        sim_cand = motor.match_counts(tags_norm, rows=candidatos)
+        keep = sim_cand >= min_coincidencias
+        idx, similitud = candidatos[keep], sim_cand[keep]
+        orden = top_k_indices(similitud, len(idx) if top_k is None else top_k)
+        idx, similitud = idx[orden], similitud[orden]
+        if min_coincidencias <= 0 and top_k is not None:
+            ceros = fill_with_zero_rows(idx, top_k, motor.n_products)
+            idx = np.concatenate((idx, ceros))
+            similitud = np.concatenate((similitud, np.zeros(len(ceros), dtype=similitud.dtype)))
+    else:
+        # Calcular similitud (una sola pasada NumPy sobre todo el catálogo)
+        similitud = motor.match_counts(tags_norm)
 
-    # Columnas útiles (ajusta según tu catálogo)
-    cols_show = [c for c in [
-        "title", "brand_name", "categories", "list_price",
-        "categoria_detectada", "intencion_detectada", "atributos_list",
-        "similitud"
-    ] if c in df_filtrado.columns]
+        # Filtrar y ordenar (a igual similitud se respeta el orden del catálogo)
+        idx = np.flatnonzero(similitud >= min_coincidencias)
+        idx = idx[top_k_indices(similitud[idx], len(idx) if top_k is None else top_k)]
+        similitud = similitud[idx]
 
-    return df_filtrado.loc[:, cols_show]
+    if cache is not None and cacheado is None:
+        cache.put_ranking(tags_norm, top_k, min_coincidencias, idx, similitud)
+    return idx, similitud
+
+# Ranking con modelo: "off" (por defecto) deja sólo los tags (`filtrar_por_tags`);
+# "weighted" / "rrf" fusionan tags (pesos de `rank_products`) con BM25 del título
+# (`rank_hybrid_rows`). Cambia el orden de /search y /api/search: se activa a mano
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "off")
+HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", "0.5"))
+
+def usa_hibrido(df: pd.DataFrame, lexico: LexicalIndex | None) -> bool:
+    return HYBRID_FUSION != "off" and lexico is not None and lexico.n_docs == len(df)
+
+def filtrar_query(query: str, df: pd.DataFrame, filtros: FilterIndex | None,
+                  log: bool = True) -> tuple[np.ndarray | None, str]:
+    """
+    (filas que cumplen el precio/las marcas que pide la query, texto sin el precio).
+    None si la query no restringe nada (o no hay `filtros` de este catálogo).
+    """
+    if filtros is None or filtros.n_products != len(df):
+        return None, query
+    consulta = filtros.parse(query)
+    if not has_filters(consulta):
+        return None, query
+    filas = filtros.rows(consulta["precio_min"], consulta["precio_max"], consulta["marcas"])
+    if log:
+        print(f"Filtros de '{query}': {consulta} -> {len(filas)} productos")
+    return filas, consulta["texto"]
 
-def intelligent_search(query: str, df: pd.DataFrame, model=None, top_k: int = 5):
+def intelligent_search(query: str, df: pd.DataFrame, model=None, top_k: int = 5,
+                       motor: TagEngine | None = None, scores_dict: dict | None = None,
+                       cache: QueryCache | None = None, lexico: LexicalIndex | None = None,
+                       filtros: FilterIndex | None = None):
     """
-    Realiza búsqueda inteligente usando el modelo LLM si está disponible,
-    o búsqueda por texto si no está disponible.
+    Realiza búsqueda inteligente usando el modelo LLM si está disponible
+    (fusionado con BM25 si hay `lexico`, ver HYBRID_FUSION), o búsqueda por
+    texto si no está disponible (BM25 con `lexico`).
+    Si se pasa `scores_dict` (doc.cats ya calculado, p.ej. por el MicroBatcher)
+    no se vuelve a correr el modelo. Con `filtros`, el precio y las marcas que
+    pide la query ("hasta 800 mil", "lenovo") restringen las filas antes de puntuar.
     """
     try:
-        if model is not None:
+        if (model is not None or scores_dict is not None) and usa_hibrido(df, lexico):
+            # Mismo ranking que /api/search (y mismo cache de resultados)
+            idx, similitud = rankear_query(query, df, model, depth=top_k, motor=motor,
+                                           scores_dict=scores_dict, cache=cache, lexico=lexico,
+                                           filtros=filtros)
+            filtered_df = df.iloc[idx].copy()
+            filtered_df['similitud'] = similitud
+        elif model is not None or scores_dict is not None:
             # Usar modelo LLM para generar tags y filtrar
-            tags = generar_tags(query, model=model)
+            filas, _ = filtrar_query(query, df, filtros)
+            tags = generar_tags(query, model=model, scores_dict=scores_dict)
             print(f"Tags generados para '{query}': {tags}")
-            filtered_df = filtrar_por_tags(df, tags, min_coincidencias=0)  # Incluir más productos
+            filtered_df = filtrar_por_tags(df, tags, min_coincidencias=0, motor=motor, top_k=top_k, cache=cache,
+                                           filas=filas)  # Incluir más productos
+        elif lexico is not None and lexico.n_docs == len(df):
+            filas, texto = filtrar_query(query, df, filtros)
+            if filas is not None and not texto.strip():
+                # Sólo precio ("hasta 200 mil"): los que lo cumplen, en orden de catálogo
+                filas, scores = filas[:top_k], np.ones(min(top_k, len(filas)))
+            else:
+                filas, scores = lexico.search(texto, top_k, rows=filas)
+            filtered_df = df.iloc[filas].copy()
+            filtered_df['similitud'] = scores
         else:
             # Búsqueda simple por texto en título y marca
-            query_lower = query.lower()
-            if 'title' in df.columns and 'brand_name' in df.columns:
-                mask = (df['title'].str.lower().str.contains(query_lower, na=False) | 
-                       df['brand_name'].str.lower().str.contains(query_lower, na=False))
-                filtered_df = df[mask].copy()
+            filas, texto = filtrar_query(query, df, filtros)
+            base = df if filas is None else df.iloc[filas]
+            query_lower = texto.lower()
+            if 'title' in base.columns and 'brand_name' in base.columns:
+                mask = (base['title'].str.lower().str.contains(query_lower, na=False) | 
+                       base['brand_name'].str.lower().str.contains(query_lower, na=False))
+                filtered_df = base[mask]
             else:
-                filtered_df = df.copy()
-                
-        # Agregar relevance_score basado en similitud
+                filtered_df = base
+
+        # relevance_score basado en similitud
         if 'similitud' in filtered_df.columns:
-            filtered_df['relevance_score'] = filtered_df['similitud']
+            relevancia = filtered_df['similitud'].to_numpy()
         else:
-            filtered_df['relevance_score'] = 1.0
-            
-        # Ordenar por relevancia y retornar top_k
-        filtered_df = filtered_df.sort_values('relevance_score', ascending=False).head(top_k)
+            relevancia = np.ones(len(filtered_df))
+
+        # Selección parcial de los top_k por relevancia (sin ordenar todo el catálogo)
+        seleccion = top_k_indices(relevancia, top_k)
+        filtered_df = filtered_df.iloc[seleccion].copy()
+        filtered_df['relevance_score'] = relevancia[seleccion]
         return filtered_df
         
     except Exception as e:
         print(f"Error en búsqueda inteligente: {e}")
-        # Fallback a búsqueda simple
-        query_lower = query.lower()
-        mask = df['title'].str.lower().str.contains(query_lower, na=False) if 'title' in df.columns else pd.Series([True] * len(df))
-        return df[mask].head(top_k)
+        return df.iloc[filas_emergencia(query, df, lexico, top_k)]
+
+def filas_emergencia(query: str, df: pd.DataFrame, lexico: LexicalIndex | None, k: int) -> np.ndarray:
+    """
+    Filas para cuando falla el ranking: BM25 si hay índice de este catálogo; si
+    no, los títulos que contienen la query (en orden de catálogo).
+    """
+    if lexico is not None and lexico.n_docs == len(df):
+        return lexico.search(query, k)[0]
+    if 'title' not in df.columns:
+        return np.arange(min(k, len(df)))
+    mask = df['title'].str.lower().str.contains(query.lower(), na=False, regex=False)
+    return np.flatnonzero(mask.to_numpy(dtype=bool, na_value=False))[:k]
+
+def rankear_query(query: str, df: pd.DataFrame, model=None, depth: int = 1000,
+                  motor: TagEngine | None = None, scores_dict: dict | None = None,
+                  cache: QueryCache | None = None, lexico: LexicalIndex | None = None,
+                  filtros: FilterIndex | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Los `depth` mejores resultados de `intelligent_search` como arrays
+    (posiciones en df, relevance_score), en el mismo orden y sin armar DataFrames.
+    Sus primeros k coinciden con `intelligent_search(top_k=k)`, así que se puede
+    paginar sobre este ranking (con el ranking híbrido, salvo algún producto que
+    sólo entra con los candidatos de un `depth` mayor). Con `cache` se calcula
+    una sola vez por query.
+    """
+    if cache is not None:
+        cacheado = cache.get_results(query, depth)
+        if cacheado is not None:
+            return cacheado
+    if motor is None or motor.n_products != len(df):
+        motor = TagEngine.from_dataframe(df)
+    try:
+        # El clasificador ve la query completa ("hasta 800 mil" también dice algo);
+        # el BM25, el texto sin la expresión de precio
+        filas, texto = filtrar_query(query, df, filtros)
+        if (model is not None or scores_dict is not None) and usa_hibrido(df, lexico):
+            cats = limpiar_cats(scores_dict if scores_dict is not None else getattr(model(query), "cats", {}))
+            if motor.index is None:
+                motor.build_index()
+            idx, scores, _, _ = rank_hybrid_rows(cats, texto, motor, lexico, top_k=depth,
+                                                 fusion=HYBRID_FUSION, alpha=HYBRID_ALPHA, rows=filas)
+        elif model is not None or scores_dict is not None:
+            tags = generar_tags(query, model=model, scores_dict=scores_dict)
+            idx, scores = rankear_por_tags(tags, motor, min_coincidencias=0, top_k=depth, cache=cache, filas=filas)
+        elif lexico is not None and lexico.n_docs == len(df) and filas is not None and not texto.strip():
+            idx, scores = filas[:depth], np.ones(min(depth, len(filas)))
+        elif lexico is not None and lexico.n_docs == len(df):
+            idx, scores = lexico.search(texto, depth, rows=filas)
+        else:
+            # Búsqueda simple por texto: todos con relevancia 1, en orden de catálogo
+            base = df if filas is None else df.iloc[filas]
+            query_lower = texto.lower()
+            if 'title' in base.columns and 'brand_name' in base.columns:
+                mask = (base['title'].str.lower().str.contains(query_lower, na=False) |
+                        base['brand_name'].str.lower().str.contains(query_lower, na=False))
+                idx = np.flatnonzero(mask.to_numpy(dtype=bool, na_value=False))[:depth]
+            else:
+                idx = np.arange(min(depth, len(base)))
+            idx = idx if filas is None else filas[idx]
+            scores = np.ones(len(idx))
+    except Exception as e:
+        print(f"Error rankeando '{query}': {e}")
+        idx = filas_emergencia(query, df, lexico, depth)
+        scores = np.ones(len(idx))
+    if cache is not None:
+        cache.put_results(query, depth, idx, scores)
+    return idx, scores
+
+def candidatos_query(query: str, df: pd.DataFrame, model=None, motor: TagEngine | None = None,
+                     scores_dict: dict | None = None, lexico: LexicalIndex | None = None,
+                     filtros: FilterIndex | None = None) -> np.ndarray | None:
+    """
+    Productos sobre los que se cuentan las facetas de la query (None = todo el
+    catálogo), siempre dentro del precio/las marcas que pida: con modelo, los de
+    la categoría más probable (si no predice ninguna, los que comparten algún tag
+    con la query); sin modelo, los que tienen algún término (BM25) o la contienen.
+    """
+    filas, texto = filtrar_query(query, df, filtros, log=False)
+    if not texto.strip():
+        return filas
+    if motor is None or motor.n_products != len(df):
+        motor = TagEngine.from_dataframe(df)
+    if model is not None or scores_dict is not None:
+        tags = generar_tags(query, model=model, scores_dict=scores_dict)
+        categoria = next((t for t in tags if t.startswith("CAT_")), None)
+        tid = motor.tag_id(categoria) if categoria else NO_TAG
+        if tid != NO_TAG:
+            # Con filtros alcanza con mirar la categoría de las filas que los cumplen
+            candidatos = motor.rows_with_category(categoria) if filas is None else filas[motor.cat_ids[filas] == tid]
+            if len(candidatos):
+                return candidatos
+        if motor.index is None:
+            motor.build_index()
+        candidatos = motor.index.union([motor.tag_id(t) for t in tags])
+    elif lexico is not None and lexico.n_docs == len(df):
+        candidatos = lexico.matching_rows(texto)
+    elif 'title' in df.columns and 'brand_name' in df.columns:
+        query_lower = texto.lower()
+        mask = (df['title'].str.lower().str.contains(query_lower, na=False) |
+                df['brand_name'].str.lower().str.contains(query_lower, na=False))
+        candidatos = np.flatnonzero(mask.to_numpy(dtype=bool, na_value=False))
+    else:
+        return filas
+    return candidatos if filas is None else np.intersect1d(candidatos, filas, assume_unique=True)
 
 # Cargar datos al inicio
 try:
     df = load_data()
+    # Motor de tags e índice invertido: del snapshot, o compilados una sola vez
+    # (se reutilizan en cada /search)
+    if catalogo is not None:
+        motor = catalogo.motor
+    else:
+        motor = compile_products(df)
+        motor.build_index()
     # Cargar modelo si está disponible
     if LLM_AVAILABLE:
         llm_model = load_llm_model()
+    print(f"PID {os.getpid()} - {memory_report()}")
 except Exception as e:
     print(f"Error inicializando datos: {e}")
     df = load_sample_data()
+    motor = compile_products(df)
+    motor.build_index()
+    catalogo = ruta_csv = None
+
+if catalogo is None:
+    # Sin snapshot también se versiona el catálogo, para poder aplicarle cambios
+    catalogo = CatalogSnapshot(df, motor, file_checksum(ruta_csv) if ruta_csv else None, None)
+# El índice BM25 se arma acá si el snapshot no lo trae, no en la primera búsqueda
+catalogo.lexical()
+catalogo.filters()
+catalogo.facets()
+
+# Corrección de typos antes del clasificador (SPELLING=0 la desactiva). El índice
+# se guarda al lado del modelo y sólo se rearma si cambia el CSV o el vocabulario
+SPELLING = os.getenv("SPELLING", "1") == "1"
+corrector = None
+if SPELLING:
+    try:
+        corrector = cargar_corrector(df['title'] if 'title' in df.columns else [], catalogo.checksum)
+    except Exception as e:
+        print(f"Corrector de typos no disponible: {e}")
+
+def corregir_query(query: str) -> str:
+    """La query con las palabras desconocidas corregidas (igual si no hay corrector)."""
+    if corrector is None or not query.strip():
+        return query
+    corregida = corrector.correct(query)
+    if corregida != query:
+        print(f"Query corregida: '{query}' -> '{corregida}'")
+    return corregida
+
+registro_labels.add(motor.vocab)
+registro_labels.bind(motor)
+
+# Rearmado del BM25 fuera del camino de las búsquedas (un solo thread por proceso)
+_lock_lexico = threading.Lock()
+_hilo_lexico: threading.Thread | None = None
+
+def _rearmar_lexico() -> None:
+    """Rearma el BM25 de la versión vigente hasta que ninguna quede pendiente."""
+    global _hilo_lexico
+    while True:
+        with _lock_lexico:
+            actual = catalogo
+            if not actual.lexico_pendiente:
+                _hilo_lexico = None
+                return
+        t0 = time.perf_counter()
+        actual.rebuild_lexical()
+        print(f"Índice BM25 rearmado en {time.perf_counter() - t0:.1f}s ({len(actual.df)} productos)")
+
+def publicar(nuevo: CatalogSnapshot) -> None:
+    """Pasa a servir `nuevo`; las búsquedas en curso terminan sobre la versión anterior."""
+    global catalogo, df, motor, _hilo_lexico
+    registro_labels.add(nuevo.motor.vocab)
+    registro_labels.bind(nuevo.motor)
+    # El BM25 viene de la versión anterior (`apply_delta`); si el cambio tocó
+    # textos o filas se rearma en segundo plano y mientras tanto se usa ése.
+    # Las facetas se arman en la primera búsqueda que las pide
+    nuevo.lexical()
+    nuevo.filters()
+    with _lock_lexico:
+        catalogo, df, motor = nuevo, nuevo.df, nuevo.motor
+        if nuevo.lexico_pendiente and _hilo_lexico is None:
+            _hilo_lexico = threading.Thread(target=_rearmar_lexico, daemon=True, name="rearmar-bm25")
+            _hilo_lexico.start()
+
+# Cambios incrementales (POST /admin/products, CATALOG_WATCH) sobre esta versión del CSV:
+# cada proceso los lee del journal antes de buscar y los aplica en el mismo orden
+journal = DeltaJournal(journal_path(ruta_csv, catalogo.checksum)) if ruta_csv and catalogo.checksum else None
+_lock_catalogo = threading.Lock()
+# Resumen de los cambios anotados por este proceso, hasta que `registrar_cambios` los devuelve
+_resumenes_propios: dict[str, dict] = {}
+
+def sincronizar_catalogo() -> list[dict]:
+    """Aplica los cambios del journal que este proceso todavía no vio."""
+    if journal is None or not journal.pending():
+        return []
+    resumenes = []
+    with _lock_catalogo:
+        for delta in journal.read_new():
+            try:
+                nuevo, resumen = apply_delta(catalogo, delta.get("upserts", []), delta.get("deletes", []))
+            except Exception as e:
+                # Todos los procesos fallan igual con el mismo cambio: se saltea en todos
+                print(f"ERROR aplicando cambio del journal: {e}")
+                if delta.get("pid") == os.getpid():
+                    _resumenes_propios[delta.get("id")] = {"error": str(e)}
+                continue
+            publicar(nuevo)
+            resumenes.append(resumen)
+            if delta.get("pid") == os.getpid():
+                _resumenes_propios[delta.get("id")] = resumen
+    return resumenes
+
+def registrar_cambios(upserts: list[dict], deletes: list[str], **extra) -> dict | None:
+    """
+    Anota un cambio en el journal y lo aplica en este proceso (los demás lo toman
+    en su próxima búsqueda). Sin journal (datos de muestra) se aplica directo.
+    """
+    if journal is None:
+        with _lock_catalogo:
+            nuevo, resumen = apply_delta(catalogo, upserts, deletes)
+            publicar(nuevo)
+        return resumen
+    delta_id = uuid.uuid4().hex
+    journal.append({"id": delta_id, "pid": os.getpid(), **extra, "upserts": upserts, "deletes": deletes})
+    sincronizar_catalogo()
+    with _lock_catalogo:
+        return _resumenes_propios.pop(delta_id, None)
+
+def vigente() -> CatalogSnapshot:
+    """Catálogo al día con el journal; cada búsqueda usa una sola versión de principio a fin."""
+    sincronizar_catalogo()
+    return catalogo
+
+if journal is not None and journal.pending():
+    print(f"Aplicando cambios del journal {journal.path}: {sincronizar_catalogo()}")
+
+# Micro-batching de inferencia: las queries concurrentes pasan juntas por nlp.pipe
+batcher = MicroBatcher(llm_model) if LLM_AVAILABLE and llm_model is not None else None
+
+def version_catalogo():
+    """Checksum del catálogo que se está sirviendo (invalida el cache de queries)."""
+    return catalogo.checksum
+
+# Cache de queries: query normalizada -> doc.cats, y tags -> ranking
+query_cache = QueryCache(version_fn=version_catalogo)
+
+async def predecir_cats_lote(queries: list[str]) -> list[dict | None]:
+    """
+    doc.cats (ya limpios) de cada query: del cache si está, y las que faltan
+    en un solo lote del micro-batcher. None por query si no hay modelo.
+    """
+    if batcher is None:
+        return [None] * len(queries)
+    cats = [query_cache.get_cats(q) for q in queries]
+    faltan = [i for i, c in enumerate(cats) if c is None]
+    if faltan:
+        nuevos = await batcher.predict_many([queries[i] for i in faltan])
+        for i, raw in zip(faltan, nuevos):
+            cats[i] = limpiar_cats(raw)
+            query_cache.put_cats(queries[i], cats[i])
+    return cats
+
+async def predecir_cats(query: str) -> dict | None:
+    """doc.cats de la query vía cache + micro-batching (None si no hay modelo)."""
+    return (await predecir_cats_lote([query]))[0]
+
+def contar_facetas(query: str, scores_dict: dict | None = None, c: CatalogSnapshot | None = None) -> dict:
+    """Cantidad de productos por marca, categoría, intención, atributo y rango de precio entre los candidatos de la query."""
+    c = c or vigente()
+    filas = None
+    if query.strip():
+        filas = candidatos_query(query, c.df, llm_model, motor=c.motor, scores_dict=scores_dict,
+                                 lexico=c.lexical(), filtros=c.filters())
+    return c.facets().counts(filas)
+
+def buscar_registros(query: str, top_k: int = 12,
+                     scores_dict: dict | None = None) -> tuple[list[dict] | None, dict]:
+    """
+    Pipeline completo de una query (tags, scoring y `to_dict`) en una sola función
+    de nivel módulo, para poder correrla en el thread/process pool de `search_executor`.
+    Devuelve también los conteos por faceta de la query.
+    """
+    c = vigente()
+    filtered_df = intelligent_search(query, c.df, llm_model, top_k=top_k, motor=c.motor,
+                                     scores_dict=scores_dict, cache=query_cache.pinned(c.checksum),
+                                     lexico=c.lexical(), filtros=c.filters())
+    print(f"\nDEBUG: Query '{query}' - Resultados encontrados: {len(filtered_df)}")
+    if len(filtered_df) > 0:
+        print(f"DEBUG: Primer producto: {filtered_df.iloc[0].get('title', 'N/A')}")
+        print(f"DEBUG: Total productos en dataset original: {len(c.df)}")
+    records = filtered_df.to_dict('records') if filtered_df is not None and len(filtered_df) > 0 else None
+    return records, contar_facetas(query, scores_dict, c)
+
+BATCH_COLUMNS = ["title", "brand_name", "list_price", "sale_price", "sku_id",
+                 "categoria_detectada", "intencion_detectada", "relevance_score"]
+
+def buscar_lote(queries: list[str], top_k: int, all_cats: list) -> list[dict]:
+    c = vigente()
+    cache = query_cache.pinned(c.checksum)
+    results = []
+    for query, cats in zip(queries, all_cats):
+        filtered_df = intelligent_search(query, c.df, llm_model, top_k=top_k, motor=c.motor,
+                                         scores_dict=cats, cache=cache, lexico=c.lexical(),
+                                         filtros=c.filters())
+        cols = [col for col in BATCH_COLUMNS if col in filtered_df.columns]
+        results.append({
+            "query": query,
+            "products": json.loads(filtered_df.loc[:, cols].to_json(orient="records", force_ascii=False)),
+        })
+    return results
+
+def rankear_api(query: str, depth: int, scores_dict: dict | None = None,
+                c: CatalogSnapshot | None = None) -> tuple[np.ndarray, np.ndarray, str | None]:
+    """(filas, scores, versión) del ranking profundo de la query (cacheado); sin query, el catálogo en orden."""
+    c = c or vigente()
+    if not query.strip():
+        idx = np.arange(min(depth, len(c.df)))
+        return idx, np.full(len(idx), 0.5), c.checksum
+    idx, scores = rankear_query(query, c.df, llm_model, depth=depth, motor=c.motor,
+                                scores_dict=scores_dict, cache=query_cache.pinned(c.checksum),
+                                lexico=c.lexical(), filtros=c.filters())
+    return idx, scores, c.checksum
+
+def buscar_api(query: str, k: int, fields: list[str], scores_dict: dict | None = None,
+               offset: int = 0, facetas: bool = False) -> bytes:
+    """
+    Una página de /api/search: sólo las columnas pedidas, ya serializadas a JSON.
+    El ranking (hasta PAGINATION_DEPTH) se calcula una vez y cada página es un slice.
+    Con `facetas`, la respuesta trae además `facets` (ver `contar_facetas`).
+    """
+    c = vigente()
+    idx, scores, version = rankear_api(query, PAGINATION_DEPTH, scores_dict, c)
+    pagina = slice(offset, offset + k)
+    siguiente = offset + k
+    next_cursor = None
+    if siguiente < len(idx):
+        next_cursor = encode_cursor({"q": query, "o": siguiente, "v": str(version)[:16]})
+    respuesta = {"query": query, "k": k, "offset": offset, "total": len(idx),
+                 "next_cursor": next_cursor,
+                 "products": project_records(c.df, idx[pagina], fields,
+                                             {"relevance_score": scores[pagina], "similitud": scores[pagina]})}
+    if facetas:
+        respuesta["facets"] = contar_facetas(query, scores_dict, c)
+    return dumps(respuesta)
+
+def proyectar_ndjson(rows: np.ndarray, scores: np.ndarray, fields: list[str], version: str | None) -> bytes | None:
+    """Líneas NDJSON de `rows`; None si el catálogo ya no es el del ranking `version`."""
+    c = vigente()
+    if c.checksum != version:
+        return None
+    registros = project_records(c.df, rows, fields, {"relevance_score": scores, "similitud": scores})
+    return b"".join(dumps(r) + b"\n" for r in registros)
+
+def _init_search_worker():
+    # Al deserializar esta función el worker importa este módulo, que ya carga
+    # modelo, catálogo y motor; acá sólo queda reportar
+    print(f"Worker de búsqueda PID {os.getpid()} listo - {memory_report()}")
+
+# Ejecución del pipeline fuera del event loop (SEARCH_EXECUTOR=inline|thread|process)
+search_executor = SearchExecutor(initializer=_init_search_worker)
+
+def saturado(e: ExecutorSaturated) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Servidor saturado: {e}", headers={"Retry-After": "1"})
+
+# Con CATALOG_WATCH=1 los cambios al CSV se aplican en caliente (sólo las filas que cambiaron)
+CATALOG_WATCH = os.getenv("CATALOG_WATCH", "0") == "1"
+csv_watcher = None
+
+def cambios_del_csv(delta: dict) -> None:
+    sincronizar_catalogo()
+    if journal is not None and delta["csv_sha256"] in journal.csv_versions:
+        return  # otro worker ya anotó esta versión del CSV
+    upserts, deletes = delta.pop("upserts"), delta.pop("deletes")
+    try:
+        print(f"CSV modificado, cambios aplicados: {registrar_cambios(upserts, deletes, **delta)}")
+    except ValueError as e:
+        print(f"ERROR aplicando cambios del CSV: {e}")
+
+@app.on_event("startup")
+async def iniciar_executor():
+    global csv_watcher
+    await asyncio.get_running_loop().run_in_executor(None, search_executor.start)
+    print(f"Executor de búsqueda: {search_executor.stats()}")
+    if CATALOG_WATCH and ruta_csv:
+        csv_watcher = CsvWatcher(ruta_csv, cambios_del_csv)
+        csv_watcher.start()
+        print(f"Vigilando cambios en {ruta_csv}")
+
+@app.on_event("shutdown")
+async def cerrar_executor():
+    if csv_watcher is not None:
+        csv_watcher.stop()
+    search_executor.shutdown()
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -324,22 +791,177 @@ async def home(request: Request):
 
 @app.post("/search", response_class=HTMLResponse)
 async def search(request: Request, query: str = Form(...)):
+    query = corregir_query(query)
     if query.strip():
         # Siempre intentar búsqueda inteligente (con o sin LLM)
-        filtered_df = intelligent_search(query, df, llm_model, top_k=12)
-        
-        # DEBUG: Mostrar información sobre los resultados
-        print(f"\nDEBUG: Query '{query}' - Resultados encontrados: {len(filtered_df)}")
-        if len(filtered_df) > 0:
-            print(f"DEBUG: Primer producto: {filtered_df.iloc[0].get('title', 'N/A')}")
-            print(f"DEBUG: Total productos en dataset original: {len(df)}")
+        try:
+            with search_executor.admit():
+                cats = await predecir_cats(query)
+                records, facetas = await search_executor.run(buscar_registros, query, 12, cats)
+        except ExecutorSaturated as e:
+            raise saturado(e)
     else:
-        filtered_df = df.head(12).copy()  # Mostrar 12 productos si no hay query
+        filtered_df = vigente().df.head(12).copy()  # Mostrar 12 productos si no hay query
         # Agregar scores ficticios para mostrar todos con el mismo nivel
         filtered_df['relevance_score'] = 0.5
         filtered_df['similitud'] = 0
+        records = filtered_df.to_dict('records')
+        facetas = vigente().facets().counts()
+
+    return templates.TemplateResponse("index_moderno.html", {"request": request, "query": query, "filtered_df": records,
+                                                             "facets": facetas, "llm_available": LLM_AVAILABLE})
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    top_k: int = 12
+
+@app.post("/search/batch")
+async def search_batch(body: BatchSearchRequest):
+    """Varias queries en un solo request: la inferencia se hace en un único nlp.pipe."""
+    queries = [corregir_query(q) for q in body.queries if q.strip()]
+    try:
+        with search_executor.admit():
+            all_cats = await predecir_cats_lote(queries)
+            results = await search_executor.run(buscar_lote, queries, body.top_k, all_cats)
+    except ExecutorSaturated as e:
+        raise saturado(e)
+    return {"results": results}
+
+# Profundidad máxima del ranking paginable / exportable
+PAGINATION_DEPTH = int(os.getenv("PAGINATION_DEPTH", "5000"))
+
+def leer_cursor(cursor: str) -> tuple[str, int]:
+    """(query, offset) de un cursor de /api/search; 400 si es inválido, 410 si es de otro catálogo."""
+    try:
+        state = decode_cursor(cursor)
+        query, offset = str(state["q"]), int(state["o"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if state.get("v") != str(vigente().checksum)[:16]:
+        raise HTTPException(status_code=410, detail="El catálogo cambió: volvé a buscar desde la primera página")
+    return query, max(0, offset)
+
+@app.get("/api/search")
+async def api_search(q: str = "",
+                     k: int = Query(12, ge=1, le=100),
+                     fields: str | None = None,
+                     cursor: str | None = None,
+                     facets: bool = False,
+                     if_none_match: str | None = Header(None)):
+    """
+    Búsqueda en JSON sin render de templates: `fields` elige las columnas
+    (separadas por coma). Soporta ETag / If-None-Match. La respuesta trae
+    `next_cursor`: pasándolo como `cursor` se obtiene la página siguiente
+    (la query sale del cursor) sin volver a rankear. Con `facets=true` trae
+    también los conteos por marca, categoría, intención, atributo y rango de precio.
+    """
+    try:
+        campos = parse_fields(fields, df.columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    offset = 0
+    if cursor:
+        q, offset = leer_cursor(cursor)
+    else:
+        q = corregir_query(q)
+
+    # Con un catálogo versionado el resultado depende sólo de (catálogo, modelo,
+    # parámetros): el ETag se conoce antes de buscar y un 304 no cuesta nada
+    version = vigente().checksum
+    etag = etag_for(version, LLM_AVAILABLE, q, k, offset, ",".join(campos), facets) if version is not None else None
+    if etag is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    try:
+        with search_executor.admit():
+            cats = await predecir_cats(q) if q.strip() else None
+            body = await search_executor.run(buscar_api, q, k, campos, cats, offset, facets)
+    except ExecutorSaturated as e:
+        raise saturado(e)
 
-    return templates.TemplateResponse("index_moderno.html", {"request": request, "query": query, "filtered_df": filtered_df.to_dict('records') if filtered_df is not None and len(filtered_df) > 0 else None, "llm_available": LLM_AVAILABLE})
+    if etag is None:
+        etag = etag_for(body)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+@app.get("/api/search/stream")
+async def api_search_stream(q: str = "",
+                            limit: int = Query(1000, ge=1),
+                            fields: str | None = None,
+                            chunk: int = Query(200, ge=1, le=5000)):
+    """
+    Resultados en NDJSON (un producto por línea) para exportadores y scroll infinito.
+    El ranking se calcula una vez; los registros se serializan y envían de a `chunk`.
+    """
+    try:
+        campos = parse_fields(fields, df.columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    limit = min(limit, PAGINATION_DEPTH)
+    q = corregir_query(q)
+    try:
+        with search_executor.admit():
+            cats = await predecir_cats(q) if q.strip() else None
+            idx, scores, version = await search_executor.run(rankear_api, q, PAGINATION_DEPTH, cats)
+    except ExecutorSaturated as e:
+        raise saturado(e)
+    idx, scores = idx[:limit], scores[:limit]
+
+    async def lineas():
+        for inicio in range(0, len(idx), chunk):
+            fin = inicio + chunk
+            bloque = await search_executor.run(proyectar_ndjson, idx[inicio:fin], scores[inicio:fin], campos, version)
+            if bloque is None:
+                # Las filas del ranking ya no corresponden al catálogo vigente
+                yield dumps({"error": "El catálogo cambió durante la exportación", "offset": inicio}) + b"\n"
+                return
+            yield bloque
+
+    return StreamingResponse(lineas(), media_type="application/x-ndjson")
+
+# Token para /admin/products (si no se define, el endpoint queda deshabilitado)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+class ProductsUpdate(BaseModel):
+    upserts: List[Dict[str, Any]] = []
+    deletes: List[str] = []
+
+@app.post("/admin/products")
+async def admin_products(body: ProductsUpdate, x_admin_token: str | None = Header(None)):
+    """
+    Alta/modificación (`upserts`, por `sku_id` o `slug`) y baja (`deletes`) de
+    productos sin recargar el catálogo: sólo se compilan las filas que cambian.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((x_admin_token or "").encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Token de administración inválido")
+    try:
+        for item in body.upserts:
+            delta_key(item)
+        resumen = await asyncio.get_running_loop().run_in_executor(
+            None, registrar_cambios, body.upserts, body.deletes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if resumen is not None and "error" in resumen:
+        raise HTTPException(status_code=400, detail=resumen["error"])
+    return resumen
+
+@app.get("/stats")
+async def stats():
+    return {"executor": search_executor.stats(),
+            "batcher": batcher.stats() if batcher is not None else None,
+            "cache": query_cache.stats(),
+            "labels": registro_labels.stats(),
+            "catalog": {"version": catalogo.checksum, "productos": len(catalogo.df),
+                        "journal": journal.path if journal is not None else None}}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    # Con varios workers cada proceso mapea el mismo snapshot (ya compilado por
+    # este proceso al importar), así que el catálogo no se multiplica en RAM.
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        uvicorn.run("app_v0:app", host="0.0.0.0", port=8001, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -0,0 +1,95 @@
+# batching.py
+from __future__ import annotations
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Ventana de espera para juntar queries concurrentes y tamaño máximo de lote
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "3"))
+BATCH_MAX_DOCS = int(os.getenv("BATCH_MAX_DOCS", "64"))
+
+
+class MicroBatcher:
+    """
+    Micro-batching delante del clasificador spaCy.
+
+    Las queries que llegan mientras hay carga (como mucho `window_ms` desde la
+    primera, o hasta juntar `max_docs`) se procesan juntas con `model.pipe`, que es mucho más barato por documento que
+    llamar `model(query)` una vez por request. Cada caller recibe su `doc.cats`.
+    La inferencia corre en el executor por defecto para no bloquear el event loop.
+    """
+
+    def __init__(self, model, window_ms: float = BATCH_WINDOW_MS, max_docs: int = BATCH_MAX_DOCS):
+        self.model = model
+        self.window = window_ms / 1000.0
+        self.max_docs = max_docs
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.docs = 0
+
+    def _ensure_started(self) -> None:
+        # La cola y la tarea se crean dentro del loop que las va a usar
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def predict(self, text: str) -> Dict[str, float]:
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def predict_many(self, texts: List[str]) -> List[Dict[str, float]]:
+        return list(await asyncio.gather(*(self.predict(t) for t in texts)))
+
+    def _pipe(self, texts: List[str]) -> List[Dict[str, float]]:
+        return [dict(doc.cats) for doc in self.model.pipe(texts, batch_size=len(texts))]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            lote: List[Tuple[str, asyncio.Future]] = [await self._queue.get()]
+            limite = time.monotonic() + self.window
+            while len(lote) < self.max_docs and time.monotonic() < limite:
+                # Se toma todo lo que ya está encolado y se cede el loop para que
+                # entren las requests en vuelo; si no llegó nada nuevo, no hay más
+                # carga esperando y el lote sale sin agotar la ventana
+                antes = len(lote)
+                while len(lote) < self.max_docs and not self._queue.empty():
+                    lote.append(self._queue.get_nowait())
+                await asyncio.sleep(0)
+                if len(lote) == antes and self._queue.empty():
+                    break
+
+            textos = [t for t, _ in lote]
+            try:
+                cats = await loop.run_in_executor(None, self._pipe, textos)
+            except Exception as e:
+                for _, future in lote:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.docs += len(lote)
+            for (_, future), c in zip(lote, cats):
+                if not future.done():
+                    future.set_result(c)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "docs": self.docs,
+            "docs_por_batch": self.docs / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,83 @@
+"""
+Extracción de specs/atributos de JSON de detalle sintéticos (con un `__APOLLO_STATE__`
+grande, como los de Next.js): `json.load` + `get_product_attributes` archivo por
+archivo vs `scripts/atributos.extraer_atributos` con 1..N procesos.
+Uso: python benchmarks/bench_atributos.py [--archivos 4000] [--workers 1 2 4]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import pandas as pd
+
+from common import ROOT  # noqa: F401 (agrega la raíz del repo al path)
+from scripts.atributos import extraer_atributos
+from scripts.fravega import get_product_attributes
+
+
+def detalle_sintetico(sku: int, rng: random.Random, relacionados: int = 30) -> dict:
+    """pageProps con el item del SKU y `relacionados` entradas más en el Apollo state."""
+    def item(code):
+        return {"__typename": "Item", "id": f"id-{code}", "title": f"Producto {code}",
+                'specifications({"tagged":["detailed"]})': [
+                    {"name": f"Spec {j}", "value": f"valor {rng.randint(0, 50)}", "__typename": "Spec"} for j in range(25)],
+                "attributes": [{"name": n, "value": f"{n} {rng.randint(0, 9)}", "__typename": "Attr"}
+                               for n in ("color", "memoria", "imagen principal", "garantía", "pantalla")],
+                "images": [f"https://img/{code}/{k}.jpg" for k in range(8)],
+                "description": "Lorem ipsum " * 40}
+    root = {f'sku({{"code":"{sku + 10_000 + k}"}})': {"item": item(sku + 10_000 + k)} for k in range(relacionados)}
+    root[f'sku({{"code":"{sku}"}})'] = {"__typename": "SkuQuery", "item": item(sku)}
+    return {"pageProps": {"sku": str(sku), "__APOLLO_STATE__": {"ROOT_QUERY": root}}, "__N_SSG": True}
+
+
+def tabla_original(directorio: str) -> pd.DataFrame:
+    filas = []
+    for nombre in sorted(os.listdir(directorio)):
+        with open(os.path.join(directorio, nombre), "r", encoding="utf-8") as f:
+            attrs = get_product_attributes(json.load(f))
+        sku = nombre[:-len(".json")]
+        for tipo, clave in (("spec", "product_specifications"), ("attr", "product_attributes")):
+            for par in attrs.get(clave, []):
+                (nombre_attr, valor), = par.items()
+                filas.append((sku, attrs["product_id"], tipo, nombre_attr, valor))
+    return pd.DataFrame(filas, columns=["sku_id", "product_id", "tipo", "nombre", "valor"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--archivos", type=int, default=4000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        directorio = os.path.join(tmp, "productos")
+        os.makedirs(directorio)
+        for i in range(args.archivos):
+            data = detalle_sintetico(100_000 + i, rng)
+            if i % 500 == 7:
+                del data["pageProps"]["__APOLLO_STATE__"]  # algunos archivos rotos
+            with open(os.path.join(directorio, f"{100_000 + i}.json"), "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        tam = sum(os.path.getsize(os.path.join(directorio, n)) for n in os.listdir(directorio))
+        print(f"archivos = {args.archivos:,} ({tam / 1e6:,.0f} MB) | CPUs = {os.cpu_count()}")
+
+        t0 = time.perf_counter()
+        esperado = tabla_original(directorio)
+        base = time.perf_counter() - t0
+        print(f"{'variante':>22} | {'seg':>6} | {'archivos/s':>10} | {'speedup':>7}")
+        print(f"{'get_product_attributes':>22} | {base:>6.2f} | {args.archivos / base:>10,.0f} | {1:>6.1f}x")
+        for w in args.workers:
+            destino = os.path.join(tmp, f"atributos-{w}.parquet")
+            stats = extraer_atributos(directorio, destino, workers=w)
+            obtenido = pd.read_parquet(destino)
+            assert obtenido.equals(esperado), "la tabla no coincide con get_product_attributes"
+            print(f"{f'extraer_atributos x{w}':>22} | {stats['segundos']:>6.2f} | {stats['archivos_por_segundo']:>10,.0f} | "
+                  f"{base / stats['segundos']:>6.1f}x   errores: {stats['errores']}")
+
+
+if __name__ == "__main__":
+    main()
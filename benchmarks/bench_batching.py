@@ -0,0 +1,78 @@
+"""
+Throughput del clasificador: una llamada `model(query)` por request vs `MicroBatcher`
+(`model.pipe` sobre las queries que llegan juntas), con concurrencia creciente.
+Uso: python benchmarks/bench_batching.py [--concurrencia 1 8 32 128] [--queries 2000]
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from common import MARCAS, cargar_clasificador, labels_modelo
+from batching import MicroBatcher
+
+
+def queries_sinteticas(n: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    palabras = [l.split("_", 1)[1].lower().replace("_", " ") for l in labels_modelo()]
+    return [
+        f"{' '.join(rng.choice(palabras, size=rng.integers(1, 4)))} {rng.choice(MARCAS).lower()}"
+        for _ in range(n)
+    ]
+
+
+async def correr(predict, queries: list, concurrencia: int) -> float:
+    """`concurrencia` clientes que se reparten las queries; devuelve queries/seg."""
+    pendientes = iter(queries)
+
+    async def cliente():
+        for q in pendientes:
+            await predict(q)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(cliente() for _ in range(concurrencia)))
+    return len(queries) / (time.perf_counter() - t0)
+
+
+async def main_async(args):
+    nlp = cargar_clasificador()
+    queries = queries_sinteticas(args.queries)
+    loop = asyncio.get_running_loop()
+
+    async def por_request(q):
+        return dict((await loop.run_in_executor(None, nlp, q)).cats)
+
+    # Las dos variantes tienen que dar los mismos scores
+    batcher = MicroBatcher(nlp, window_ms=args.window_ms, max_docs=args.max_docs)
+    muestra = queries[:50]
+    esperado = [await por_request(q) for q in muestra]
+    obtenido = await batcher.predict_many(muestra)
+    assert all(
+        e.keys() == o.keys() and all(abs(e[k] - o[k]) < 1e-6 for k in e)
+        for e, o in zip(esperado, obtenido)
+    ), "pipe y model(query) no coinciden"
+    await batcher.close()
+
+    print(f"queries = {len(queries):,} | ventana = {args.window_ms} ms | max_docs = {args.max_docs}")
+    print(f"{'concurrencia':>12} | {'por request (q/s)':>17} | {'micro-batch (q/s)':>17} | {'docs/batch':>10} | {'speedup':>8}")
+    for c in args.concurrencia:
+        qps_req = await correr(por_request, queries, c)
+        batcher = MicroBatcher(nlp, window_ms=args.window_ms, max_docs=args.max_docs)
+        qps_batch = await correr(batcher.predict, queries, c)
+        await batcher.close()
+        print(f"{c:>12} | {qps_req:>17,.0f} | {qps_batch:>17,.0f} | "
+              f"{batcher.stats()['docs_por_batch']:>10.1f} | {qps_batch / qps_req:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--window-ms", type=float, default=3.0)
+    parser.add_argument("--max-docs", type=int, default=64)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Filtros de precio/marca de la query: máscara booleana de pandas sobre todo el
+catálogo (lo obvio) vs `FilterIndex` (precios ordenados + postings de marca),
+y el costo total de `rank_products` con y sin filtro. Con el índice, un
+filtro angosto abarata la query en vez de encarecerla.
+Uso: python benchmarks/bench_constraints.py [--n 1000000] [--k 12]
+"""
+import argparse
+
+import numpy as np
+
+from common import catalogo_sintetico, cronometrar
+from query_constraints import FilterIndex
+from recommender import compile_products, rank_products, slugify_tag
+
+MODEL_SCORES = {"CAT_NOTEBOOK": 0.9, "INT_GAMING": 0.8, "ATTR_TARJETA_GRAFICA": 0.7}
+CASOS = [
+    ("sin filtro", {}),
+    ("hasta 2.5M (83%)", {"precio_max": 2_500_000}),
+    ("lenovo (10%)", {"marcas": ["Lenovo"]}),
+    ("lenovo hasta 800 mil", {"precio_max": 800_000, "marcas": ["Lenovo"]}),
+    ("entre 200 y 210 mil", {"precio_min": 200_000, "precio_max": 210_000}),
+    ("lenovo o hp 1M-1.05M", {"precio_min": 1_000_000, "precio_max": 1_050_000, "marcas": ["Lenovo", "HP"]}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--k", type=int, default=12)
+    args = parser.parse_args()
+
+    df = catalogo_sintetico(args.n)
+    motor = compile_products(df)
+    motor.build_index()
+    filtros = cronometrar(lambda: FilterIndex.from_catalog(df, motor), 1)
+    indice = FilterIndex.from_catalog(df, motor)
+    print(f"n = {args.n:,} | FilterIndex armado en {filtros * 1e3:.0f} ms")
+
+    marca_slug = df["brand_name"].map(slugify_tag)
+    print(f"{'filtro':>22} | {'filas':>9} | {'máscara (ms)':>12} | {'índice (ms)':>11} | "
+          f"{'rank_products (ms)':>18}")
+    for nombre, parsed in CASOS:
+        def mascara():
+            m = np.ones(len(df), dtype=bool)
+            if parsed.get("precio_min") is not None:
+                m &= (df["list_price"] >= parsed["precio_min"]).to_numpy()
+            if parsed.get("precio_max") is not None:
+                m &= (df["list_price"] <= parsed["precio_max"]).to_numpy()
+            if parsed.get("marcas"):
+                m &= marca_slug.isin([slugify_tag(x) for x in parsed["marcas"]]).to_numpy()
+            return np.flatnonzero(m)
+
+        def por_indice():
+            return indice.rows(parsed.get("precio_min"), parsed.get("precio_max"),
+                               [slugify_tag(x) for x in parsed.get("marcas", [])])
+
+        filas = por_indice()
+        if filas is not None:
+            assert np.array_equal(filas, mascara()), nombre
+        t_mascara = cronometrar(mascara) if parsed else 0.0
+        t_indice = cronometrar(por_indice) if parsed else 0.0
+        t_rank = cronometrar(lambda: rank_products(MODEL_SCORES, df, parsed, top_k=args.k, motor=motor,
+                                                   early_termination=True, filters=indice))
+        n_filas = len(df) if filas is None else len(filas)
+        print(f"{nombre:>22} | {n_filas:>9,} | {t_mascara * 1e3:>12.1f} | {t_indice * 1e3:>11.2f} | "
+              f"{t_rank * 1e3:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
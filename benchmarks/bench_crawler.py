@@ -0,0 +1,131 @@
+"""
+Crawl de Fravega contra el stub local (`scripts/stub_server.py`) con JSON sintéticos:
+listado + detalle de cada producto, secuencial (concurrency=1) vs concurrente, con
+latencia y 429/503 simulados. Después corta un crawl a la mitad y lo retoma desde
+el checkpoint para verificar que no se repiten requests. Por último guarda el detalle
+en el ResponseStore, modifica una parte de los productos en el stub y mide un
+refresco condicional (requests, 304, productos a reprocesar, espacio en disco).
+Uso: python benchmarks/bench_crawler.py [--productos 400] [--latencia 0.05] [--fail-rate 0.05]
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from common import ROOT  # noqa: F401 (agrega la raíz del repo al path)
+from scripts import fravega
+from scripts.crawler import Job
+from scripts.response_store import ResponseStore
+from scripts.stub_server import serve
+
+
+def datos_sinteticos(root: str, productos: int, page_size: int) -> None:
+    """Páginas de listado (con `total`) y un JSON de detalle por SKU, como los guarda el scraper."""
+    os.makedirs(os.path.join(root, "productos"))
+    for offset in range(0, productos, page_size):
+        results = [{"id": f"p{i}", "title": f"Producto {i}", "slug": f"producto-{i}",
+                    "skus": {"results": [{"code": str(100000 + i)}]}}
+                   for i in range(offset, min(offset + page_size, productos))]
+        with open(os.path.join(root, f"productos-offset{offset}.json"), "w", encoding="utf-8") as f:
+            json.dump({"data": {"items": {"total": productos, "results": results}}}, f)
+    for i in range(productos):
+        escribir_detalle(root, i)
+
+
+def escribir_detalle(root: str, i: int, precio: int = 100_000) -> None:
+    """JSON de detalle con specs repetitivas (como los de Next.js), indentado como lo guardaba el scraper."""
+    specs = [{"name": f"Especificación {j}", "value": f"Valor {j % 7} para el producto"} for j in range(40)]
+    with open(os.path.join(root, "productos", f"{100000 + i}.json"), "w", encoding="utf-8") as f:
+        json.dump({"pageProps": {"sku": str(100000 + i), "precio": precio + i, "specifications": specs}}, f, indent=2)
+
+
+async def crawl(base_url: str, out: str, args, concurrency: int, checkpoint=None, max_jobs=None, **kwargs):
+    fravega.FRAVEGA_BASE_URL = base_url
+    crawler = fravega.crear_crawler(ruta=os.path.join(out, ""), output_dir_path=os.path.join(out, "productos"),
+                                    page_size=args.page_size, detalle=True, concurrency=concurrency,
+                                    rate=args.rate, backoff_base=0.05, checkpoint=checkpoint, verbose=False,
+                                    **kwargs)
+    jobs = [Job("listado", "0", offset=0)]
+    if max_jobs is None:
+        return await crawler.run(jobs)
+    # Interrupción simulada: se cancela el crawl apenas hay `max_jobs` terminados
+    tarea = asyncio.create_task(crawler.run(jobs))
+    while crawler.stats["ok"] < max_jobs:
+        await asyncio.sleep(0.01)
+    tarea.cancel()
+    await asyncio.gather(tarea, return_exceptions=True)
+    crawler.checkpoint.close()
+    return crawler.stats
+
+
+def tam_directorio(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--productos", type=int, default=400)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--latencia", type=float, default=0.05, help="segundos por request en el stub")
+    parser.add_argument("--fail-rate", type=float, default=0.05)
+    parser.add_argument("--rate", type=float, default=0, help="req/s por host (0 = sin límite)")
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--cambios", type=float, default=0.1, help="fracción de productos modificados antes del refresco")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stub_root = os.path.join(tmp, "stub")
+        datos_sinteticos(stub_root, args.productos, args.page_size)
+        server, base_url, stub_stats = serve(stub_root, latency=args.latencia, fail_rate=args.fail_rate)
+        esperados = args.productos + -(-args.productos // args.page_size)
+        print(f"productos = {args.productos:,} | jobs = {esperados:,} | latencia = {args.latencia * 1e3:.0f} ms | "
+              f"fail_rate = {args.fail_rate:.0%}")
+        print(f"{'concurrencia':>12} | {'jobs/s':>7} | {'segundos':>8} | {'requests':>8} | {'reintentos':>10} | {'fallidos':>8}")
+        base = None
+        for c in args.concurrencia:
+            out = os.path.join(tmp, f"out-{c}")
+            stats = asyncio.run(crawl(base_url, out, args, c))
+            assert stats["ok"] == esperados, stats
+            assert len(os.listdir(os.path.join(out, "productos"))) == args.productos
+            base = base or stats["jobs_por_segundo"]
+            print(f"{c:>12} | {stats['jobs_por_segundo']:>7.1f} | {stats['segundos']:>8.2f} | {stats['requests']:>8} | "
+                  f"{stats['retries']:>10} | {stats['failed']:>8}   ({stats['jobs_por_segundo'] / base:.1f}x)")
+
+        # Crawl interrumpido y retomado: entre las dos corridas se hace cada job una sola vez
+        out, ckpt = os.path.join(tmp, "out-resume"), os.path.join(tmp, "out-resume", "checkpoint.jsonl")
+        c = max(args.concurrencia)
+        antes = stub_stats["requests"] - stub_stats["fallas"]
+        primera = asyncio.run(crawl(base_url, out, args, c, ckpt, max_jobs=esperados // 2))
+        segunda = asyncio.run(crawl(base_url, out, args, c, ckpt))
+        exitosos = stub_stats["requests"] - stub_stats["fallas"] - antes
+        print(f"retomado: {primera['ok']} + {segunda['ok']} jobs, {segunda['cached']} reusados del disco, "
+              f"{exitosos} respuestas del stub para {esperados} jobs (el excedente son requests en vuelo al cortar)")
+
+        # ResponseStore + refresco condicional
+        out = os.path.join(tmp, "out-store")
+        store = ResponseStore(os.path.join(out, "respuestas"))
+        asyncio.run(crawl(base_url, out, args, c, store=store))
+        cambiados = list(range(0, args.productos, max(1, round(1 / args.cambios))))
+        time.sleep(1.1)  # Last-Modified tiene resolución de segundos
+        for i in cambiados:
+            escribir_detalle(stub_root, i, precio=90_000)
+        inicio = time.time()
+        antes = dict(stub_stats)
+        stats = asyncio.run(crawl(base_url, out, args, c, checkpoint=os.path.join(out, "refresco.jsonl"),
+                                  store=store, refresh=True))
+        a_reprocesar = store.changed_since(inicio)
+        assert sorted(a_reprocesar) == sorted(str(100000 + i) for i in cambiados), a_reprocesar
+        print(f"refresco: {stats['requests']} requests, {stub_stats['not_modified'] - antes['not_modified']} con 304, "
+              f"{stats['changed']} cambiados -> {len(a_reprocesar)} productos a reprocesar (de {args.productos})")
+        resumen = store.summary()
+        store.close()
+        print(f"disco: {tam_directorio(os.path.join(stub_root, 'productos')) / 1e3:,.0f} kB en {args.productos} archivos "
+              f"indentados vs pack {resumen['pack_bytes'] / 1e3:,.0f} kB + índice {resumen['index_bytes'] / 1e3:,.0f} kB "
+              f"({resumen['bodies']} bodies, {resumen['codec']})")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
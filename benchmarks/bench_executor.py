@@ -0,0 +1,111 @@
+"""
+Prueba de carga de /search con cada estrategia de SEARCH_EXECUTOR (inline, thread, process).
+
+Levanta la app con uvicorn sobre un catálogo sintético, tira `--clientes` clientes
+concurrentes contra POST /search durante `--segundos` y, en paralelo, un cliente que
+pide GET / (barato): su latencia muestra cuánto se traba el event loop.
+Uso: python benchmarks/bench_executor.py [--n 50000] [--clientes 16] [--segundos 15]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from common import ROOT, MARCAS, catalogo_sintetico, labels_modelo
+
+
+def queries_sinteticas(n: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    palabras = [l.split("_", 1)[1].lower().replace("_", " ") for l in labels_modelo()]
+    return [f"{rng.choice(palabras)} {rng.choice(MARCAS).lower()}" for _ in range(n)]
+
+
+def levantar(workdir: str, modo: str, port: int, args) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=ROOT, SEARCH_EXECUTOR=modo,
+               SEARCH_WORKERS=str(args.workers), SEARCH_MAX_PENDING=str(args.max_pending))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app_v0:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    limite = time.monotonic() + 300
+    while time.monotonic() < limite:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/stats", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError(f"la app no levantó en modo {modo}")
+
+
+async def cargar(port: int, queries: list, clientes: int, segundos: float):
+    url = f"http://127.0.0.1:{port}"
+    latencias, latencias_home, codigos = [], [], {}
+    fin = time.monotonic() + segundos
+
+    async def cliente(client, i):
+        j = i
+        while time.monotonic() < fin:
+            t0 = time.perf_counter()
+            r = await client.post(f"{url}/search", data={"query": queries[j % len(queries)]})
+            codigos[r.status_code] = codigos.get(r.status_code, 0) + 1
+            if r.status_code == 200:
+                latencias.append(time.perf_counter() - t0)
+            elif r.status_code == 503:
+                await asyncio.sleep(0.05)
+            j += clientes
+
+    async def home(client):
+        while time.monotonic() < fin:
+            t0 = time.perf_counter()
+            await client.get(f"{url}/")
+            latencias_home.append(time.perf_counter() - t0)
+            await asyncio.sleep(0.05)
+
+    limits = httpx.Limits(max_connections=clientes + 1)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        await asyncio.gather(home(client), *(cliente(client, i) for i in range(clientes)))
+    return np.array(latencias), np.array(latencias_home), codigos
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=50_000, help="productos del catálogo sintético")
+    parser.add_argument("--clientes", type=int, default=16)
+    parser.add_argument("--segundos", type=float, default=15)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--modos", nargs="+", default=["inline", "thread", "process"])
+    args = parser.parse_args()
+
+    queries = queries_sinteticas(500)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "datos"))
+        catalogo_sintetico(args.n).to_csv(os.path.join(workdir, "datos", "productos-gemini.csv"), index=False)
+        os.symlink(os.path.join(ROOT, "templates"), os.path.join(workdir, "templates"))
+
+        print(f"n = {args.n:,} | clientes = {args.clientes} | {args.segundos:.0f} s por modo | "
+              f"workers = {args.workers} | max_pending = {args.max_pending}")
+        print(f"{'modo':>8} | {'req/s':>6} | {'p50 (ms)':>8} | {'p99 (ms)':>8} | "
+              f"{'GET / p50':>9} | {'GET / p99':>9} | {'503':>5}")
+        for i, modo in enumerate(args.modos):
+            port = 8700 + i
+            proc = levantar(workdir, modo, port, args)
+            try:
+                lat, home, codigos = asyncio.run(cargar(port, queries, args.clientes, args.segundos))
+            finally:
+                proc.terminate()
+                proc.wait()
+            p = lambda a, q: np.percentile(a, q) * 1e3 if len(a) else float("nan")
+            print(f"{modo:>8} | {len(lat) / args.segundos:>6.1f} | {p(lat, 50):>8.0f} | {p(lat, 99):>8.0f} | "
+                  f"{p(home, 50):>9.0f} | {p(home, 99):>9.0f} | {codigos.get(503, 0):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Conteos por faceta en el mismo request que la búsqueda: costo de
+`FacetIndex.counts` (bitsets + popcount, o bincount de las filas, lo que
+estime más barato) sobre los candidatos de la query, como porcentaje de la
+búsqueda (`rank_products` con MaxScore + filtros), frente a `value_counts` de
+pandas sobre las mismas filas (con los atributos ya explotados, a favor de pandas).
+Uso: python benchmarks/bench_facets.py [--productos 100000 1000000] [--k 12]
+"""
+import argparse
+import ast
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import catalogo_sintetico, cronometrar
+from facets import FacetIndex, PRICE_BUCKETS
+from query_constraints import FilterIndex
+from recommender import compile_products, rank_products, slugify_tag
+
+# (nombre, scores del modelo, query parseada): la categoría define los candidatos
+QUERIES = [
+    ("notebook gamer", {"CAT_NOTEBOOK": 0.9, "INT_GAMING": 0.8, "ATTR_TARJETA_GRAFICA": 0.7},
+     {"categoria": "notebook", "intencion": "gaming"}),
+    ("notebook lenovo hasta 800 mil", {"CAT_NOTEBOOK": 0.9, "ATTR_POTENTE": 0.4},
+     {"categoria": "notebook", "precio_max": 800_000, "marcas": ["Lenovo"]}),
+    ("monitor entre 200 y 210 mil", {"CAT_MONITOR": 0.9, "ATTR_PANEL_IPS": 0.5},
+     {"categoria": "monitor", "precio_min": 200_000, "precio_max": 210_000}),
+    ("tablet o auricular", {"CAT_TABLET": 0.6, "CAT_AURICULAR": 0.5}, {}),
+]
+
+
+def candidatos(motor, filtros, parsed, scores):
+    """Como `candidatos_query` de la app: categoría más probable (o unión de tags) dentro de los filtros."""
+    filas = filtros.rows(parsed.get("precio_min"), parsed.get("precio_max"),
+                         [slugify_tag(m) for m in parsed.get("marcas", [])])
+    tags = sorted(scores, key=scores.get, reverse=True)
+    cat = next((t for t in tags if t.startswith("CAT_")), None) if parsed.get("categoria") else None
+    if cat:
+        return motor.rows_with_category(cat) if filas is None else filas[motor.cat_ids[filas] == motor.tag_id(cat)]
+    cand = motor.index.union([motor.tag_id(t) for t in tags])
+    return cand if filas is None else np.intersect1d(cand, filas, assume_unique=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--productos", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--k", type=int, default=12)
+    args = parser.parse_args()
+
+    for n in args.productos:
+        df = catalogo_sintetico(n)
+        motor = compile_products(df)
+        motor.build_index()
+        filtros = FilterIndex.from_catalog(df, motor)
+        t0 = time.perf_counter()
+        facetas = FacetIndex.from_catalog(df, motor, filtros.precio_fila)
+        construccion = time.perf_counter() - t0
+        stats = facetas.stats()
+        print(f"\nproductos = {n:,} | facetas armadas en {construccion * 1e3:.0f} ms | "
+              f"{stats['bytes'] / 2**20:.1f} MB | "
+              + ", ".join(f"{k}: {v['bitsets']}/{v['valores']} con bitset" for k, v in stats["facetas"].items()))
+
+        # Lo que haría pandas por request (atributos ya explotados una vez, a favor de pandas)
+        atributos = df["atributos_list"].map(lambda s: list(set(ast.literal_eval(s)))).explode().dropna()
+        rango = pd.cut(filtros.precio_fila, [-np.inf, *PRICE_BUCKETS, np.inf], right=False)
+        rango = pd.Series(rango)
+
+        def con_pandas(cand):
+            sub = df.iloc[cand]
+            return (sub["brand_name"].value_counts(), sub["categoria_detectada"].value_counts(),
+                    sub["intencion_detectada"].value_counts(), rango.iloc[cand].value_counts(),
+                    atributos[atributos.index.isin(cand)].value_counts())
+
+        print(f"{'query':>30} | {'candidatos':>10} | {'búsqueda (ms)':>13} | {'candidatos (ms)':>15} | "
+              f"{'conteo (ms)':>11} | {'overhead':>8} | {'bitsets (ms)':>12} | {'filas (ms)':>10} | {'pandas (ms)':>11}")
+        for nombre, scores, parsed in QUERIES:
+            def buscar():
+                return rank_products(scores, df, parsed, top_k=args.k, motor=motor,
+                                     early_termination=True, filters=filtros)
+
+            cand = candidatos(motor, filtros, parsed, scores)
+            esperado = facetas.counts(cand, metodo="filas")
+            assert facetas.counts(cand, metodo="bits") == esperado == facetas.counts(cand), nombre
+            t_busqueda = cronometrar(buscar, 5)
+            t_cand = cronometrar(lambda: candidatos(motor, filtros, parsed, scores), 5)
+            t_conteo = cronometrar(lambda: facetas.counts(cand), 5)
+            t_bits = cronometrar(lambda: facetas.counts(cand, metodo="bits"), 5)
+            t_filas = cronometrar(lambda: facetas.counts(cand, metodo="filas"), 5)
+            t_pandas = cronometrar(lambda: con_pandas(cand), 1)
+            print(f"{nombre:>30} | {len(cand):>10,} | {t_busqueda * 1e3:>13.1f} | {t_cand * 1e3:>15.2f} | "
+                  f"{t_conteo * 1e3:>11.2f} | {(t_cand + t_conteo) / t_busqueda:>8.0%} | {t_bits * 1e3:>12.2f} | "
+                  f"{t_filas * 1e3:>10.2f} | {t_pandas * 1e3:>11.0f}")
+        t_vacia = cronometrar(lambda: facetas.counts(None), 20)
+        print(f"{'(query vacía: totales)':>30} | {n:>10,} | {'':>13} | {'':>15} | {t_vacia * 1e3:>11.3f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Ranking híbrido (`rank_hybrid_rows`: tags + BM25 sobre candidatos de los dos
+índices) vs sólo tags (`rank_products` con early_termination), más la
+verificación de que la fusión "weighted" da el mismo top-k que fusionar los
+scores de todo el catálogo.
+Uso: python benchmarks/bench_hybrid.py [--productos 100000 1000000] [--k 12]
+"""
+import argparse
+
+import numpy as np
+
+from common import catalogo_sintetico, cronometrar, labels_modelo
+from lexical_index import LexicalIndex
+from recommender import (_score_rows, build_query_constraints, compile_products,
+                         rank_hybrid_rows, rank_products)
+from topk import top_k_indices
+
+# (query, labels con score alto del clasificador para esa query)
+QUERIES = [
+    ("notebook lenovo gamer", {"CAT_NOTEBOOK", "INT_GAMING"}),
+    ("auriculares sony inalambricos", {"CAT_AURICULAR", "ATTR_INALAMBRICO"}),
+    ("samsung modelo 4242", {"CAT_CELULAR"}),
+    ("tablet para estudiar", {"CAT_TABLET", "INT_ESTUDIO"}),
+]
+
+
+def scores_modelo(altos: set, seed: int = 1) -> dict:
+    """Salida típica de textcat_multilabel: unos pocos labels altos y el resto casi 0."""
+    rng = np.random.default_rng(seed)
+    return {l: float(rng.uniform(0.7, 0.95) if l in altos else rng.uniform(0, 0.02)) for l in labels_modelo()}
+
+
+def top_completo(motor, lexico, cats: dict, query: str, k: int, alpha: float = 0.5) -> np.ndarray:
+    """Fusión "weighted" puntuando todo el catálogo."""
+    pesos = {"category": 1.0, "intent": 1.0, "attr": 1.0}
+    s_tags = _score_rows(motor, motor.score_vector(cats), pesos, build_query_constraints({}))
+    s_lex = lexico.score_rows(query, np.arange(motor.n_products))
+    fused = alpha * s_tags / s_tags.max() + ((1 - alpha) * s_lex / s_lex.max() if s_lex.max() > 0 else 0)
+    return top_k_indices(fused, k)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--productos", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--k", type=int, default=12)
+    args = parser.parse_args()
+
+    for n in args.productos:
+        df = catalogo_sintetico(n)
+        motor = compile_products(df)
+        motor.build_index()
+        lexico = LexicalIndex.from_dataframe(df)
+        print(f"\nproductos = {n:,}")
+        print(f"{'query':>30} | {'tags (ms)':>9} | {'weighted (ms)':>13} | {'rrf (ms)':>8} | exacto")
+        for query, altos in QUERIES:
+            cats = scores_modelo(altos)
+            t_tags = cronometrar(lambda: rank_products(cats, df, top_k=args.k, motor=motor,
+                                                       early_termination=True), 5)
+            t_w = cronometrar(lambda: rank_hybrid_rows(cats, query, motor, lexico, top_k=args.k), 5)
+            t_rrf = cronometrar(lambda: rank_hybrid_rows(cats, query, motor, lexico, top_k=args.k,
+                                                         fusion="rrf"), 5)
+            filas = rank_hybrid_rows(cats, query, motor, lexico, top_k=args.k)[0]
+            exacto = np.array_equal(filas, top_completo(motor, lexico, cats, query, args.k))
+            print(f"{query:>30} | {t_tags * 1e3:>9.1f} | {t_w * 1e3:>13.1f} | {t_rrf * 1e3:>8.1f} | {exacto}")
+
+
+if __name__ == "__main__":
+    main()
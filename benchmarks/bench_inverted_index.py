@@ -0,0 +1,55 @@
+"""
+Scan completo vs candidatos del índice invertido (filtrar_por_tags) y vs MaxScore
+(rank_products con early_termination=True).
+Uso: python benchmarks/bench_inverted_index.py [--n 1000000] [--k 12]
+"""
+import argparse
+
+import numpy as np
+
+from common import catalogo_sintetico, labels_modelo, cronometrar
+from app_v0 import filtrar_por_tags
+from recommender import compile_products, rank_products
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--k", type=int, default=12)
+    args = parser.parse_args()
+
+    df = catalogo_sintetico(args.n)
+    motor_scan = compile_products(df)
+    motor = compile_products(df)
+    motor.build_index()
+    n_post, n_bytes = motor.index.stats()
+    print(f"n = {args.n:,} | postings: {n_post} | {n_bytes / 1e6:.1f} MB comprimidos "
+          f"(int64 sin comprimir: {(len(motor.attr_indices) + 3 * args.n) * 8 / 1e6:.1f} MB)")
+
+    rng = np.random.default_rng(1)
+    labels = labels_modelo()
+    # Query típica de textcat_multilabel: 3 labels con score alto y el resto casi 0
+    altos = {"CAT_NOTEBOOK", "INT_GAMING", "ATTR_TARJETA_GRAFICA"}
+    model_scores = {l: float(rng.uniform(0.7, 0.95) if l in altos else rng.uniform(0, 0.02)) for l in labels}
+    tags = sorted(altos)
+    cand = motor.index.union(motor.tag_id(t) for t in tags)
+    print(f"candidatos de la query: {len(cand) / args.n:.0%} del catálogo")
+    parsed = {"categoria": "notebook", "marca": "lenovo"}
+
+    casos = [
+        ("filtrar_por_tags", lambda m: filtrar_por_tags(df, tags, 1, motor=m, top_k=args.k)),
+        # Query selectiva: sólo atributos poco frecuentes
+        ("filtrar (attrs)", lambda m: filtrar_por_tags(df, ["ATTR_RGB", "ATTR_TWS"], 1, motor=m, top_k=args.k)),
+        ("rank_products", lambda m: rank_products(model_scores, df, parsed, top_k=args.k, motor=m,
+                                                  early_termination=m is motor)),
+    ]
+    print(f"{'camino':>17} | {'scan (ms)':>10} | {'índice (ms)':>11} | {'speedup':>8}")
+    for nombre, fn in casos:
+        assert fn(motor_scan).equals(fn(motor)), f"{nombre}: resultados distintos"
+        t_scan = cronometrar(lambda: fn(motor_scan))
+        t_idx = cronometrar(lambda: fn(motor))
+        print(f"{nombre:>17} | {t_scan * 1e3:>10.1f} | {t_idx * 1e3:>11.1f} | {t_scan / t_idx:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Fallback de búsqueda sin modelo: `str.lower().str.contains` sobre título/marca
+(lo de antes) vs `LexicalIndex.search` (BM25 con corte temprano), más el
+tiempo de construcción, el tamaño de las postings y la verificación de que
+el top-k con corte temprano es el mismo que puntuando todos los productos.
+Uso: python benchmarks/bench_lexical.py [--productos 100000 1000000] [--k 10]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import catalogo_sintetico, cronometrar
+from lexical_index import LexicalIndex
+
+QUERIES = ["notebook lenovo gamer", "Monitores Samsung", "auriculares sony", "celular xiaomi",
+           "modelo 4242", "tablet", "parlante jbl bluetooth", "zzz inexistente"]
+
+
+def top_completo(indice: LexicalIndex, query: str, k: int) -> np.ndarray:
+    """El mismo ranking puntuando todo el catálogo (sin corte temprano)."""
+    todos = np.arange(indice.n_docs, dtype=np.uint32)
+    scores = indice._score(todos, indice.term_ids(query))
+    orden = np.lexsort((todos, -scores))
+    return orden[scores[orden] > 0][:k]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--productos", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    for n in args.productos:
+        df = catalogo_sintetico(n)
+        t0 = time.perf_counter()
+        indice = LexicalIndex.from_dataframe(df)
+        construccion = time.perf_counter() - t0
+        print(f"\nproductos = {n:,} | construcción {construccion:.1f}s | {indice.stats()}")
+        print(f"{'query':>24} | {'contains (ms)':>13} | {'hits':>7} | {'BM25 (ms)':>9} | mismo top-k")
+        for q in QUERIES:
+            def contains():
+                ql = q.lower()
+                mask = df["title"].str.lower().str.contains(ql, na=False) | \
+                    df["brand_name"].str.lower().str.contains(ql, na=False)
+                return np.flatnonzero(mask.to_numpy())[:args.k]
+            t_contains = cronometrar(contains, 3)
+            hits = len(contains())
+            t_bm25 = cronometrar(lambda: indice.search(q, args.k), 20)
+            filas, _ = indice.search(q, args.k)
+            igual = np.array_equal(filas, top_completo(indice, q, args.k))
+            print(f"{q:>24} | {t_contains * 1e3:>13.1f} | {hits:>7} | {t_bm25 * 1e3:>9.3f} | {igual}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Memoria por worker con el catálogo cargado desde CSV (copia privada por proceso)
+contra el snapshot mapeado (páginas compartidas entre procesos).
+Uso: python benchmarks/bench_shared_memory.py [--n 300000] [--workers 4]
+Requiere un CSV generado antes por bench_snapshot.py en --dir.
+"""
+import argparse
+import multiprocessing as mp
+import os
+
+import numpy as np
+
+import common  # noqa: F401  (agrega la raíz del repo al sys.path)
+
+
+def _worker(modo: str, csv_path: str, cola):
+    import psutil
+    from catalog import load_catalog, read_csv_catalog
+    from recommender import compile_products, rank_products
+
+    if modo == "csv":
+        df = read_csv_catalog(csv_path)
+        motor = compile_products(df)
+        motor.build_index()
+    else:
+        snapshot = load_catalog(csv_path)
+        df, motor = snapshot.df, snapshot.motor
+
+    # Tocar todo el catálogo como lo haría el tráfico real
+    rank_products({"CAT_NOTEBOOK": 0.9, "ATTR_RGB": 0.5}, df, top_k=12, motor=motor)
+    df["title"].str.len().sum()
+    float(np.asarray(df["list_price"]).sum())
+
+    info = psutil.Process().memory_full_info()
+    cola.put((info.rss, getattr(info, "shared", 0), info.uss, getattr(info, "pss", info.uss)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--dir", default="/tmp/bench-catalogo")
+    args = parser.parse_args()
+    csv_path = os.path.join(args.dir, "productos-gemini.csv")
+
+    ctx = mp.get_context("spawn")
+    mb = 1024 * 1024
+    print(f"{'modo':>9} | {'RSS/worker':>10} | {'compartida':>10} | {'USS/worker':>10} | {'PSS total':>10}")
+    for modo in ("csv", "snapshot"):
+        cola = ctx.Queue()
+        procesos = [ctx.Process(target=_worker, args=(modo, csv_path, cola)) for _ in range(args.workers)]
+        for p in procesos:
+            p.start()
+        datos = [cola.get() for _ in procesos]
+        for p in procesos:
+            p.join()
+        rss, shared, uss, pss = (np.mean([d[i] for d in datos]) for i in range(4))
+        pss_total = sum(d[3] for d in datos)
+        print(f"{modo:>9} | {rss / mb:>8.0f}MB | {shared / mb:>8.0f}MB | {uss / mb:>8.0f}MB | {pss_total / mb:>8.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Arranque en frío: CSV + parseo (load_data clásico) + compilación del motor,
+contra abrir el snapshot compilado por `python catalog.py build-catalog`.
+Uso: python benchmarks/bench_snapshot.py [--n 1000000] [--dir /tmp/bench-catalogo]
+"""
+import argparse
+import os
+import time
+
+from common import catalogo_sintetico
+from catalog import build_snapshot, load_catalog, read_csv_catalog
+from recommender import compile_products
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--dir", default="/tmp/bench-catalogo")
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    csv_path = os.path.join(args.dir, "productos-gemini.csv")
+    catalogo_sintetico(args.n).drop(columns=["categoria_detectada", "intencion_detectada"]).to_csv(csv_path, index=False)
+    print(f"CSV sintético: {args.n:,} productos, {os.path.getsize(csv_path) / 1e6:.0f} MB")
+
+    t0 = time.perf_counter()
+    df = read_csv_catalog(csv_path)
+    motor = compile_products(df)
+    motor.build_index()
+    t_csv = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    build_snapshot(csv_path)
+    t_build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    snapshot = load_catalog(csv_path)
+    t_snap = time.perf_counter() - t0
+    assert len(snapshot.df) == args.n and snapshot.motor.n_products == args.n
+
+    print(f"{'CSV + parseo + motor':>24}: {t_csv:8.2f} s")
+    print(f"{'build-catalog':>24}: {t_build:8.2f} s (una sola vez)")
+    print(f"{'snapshot (mmap)':>24}: {t_snap * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Corrección de typos (`spelling.SpellChecker`, SymSpell) con diccionarios de
+distinto tamaño: tiempo de armado y de carga, tamaño del índice, microsegundos
+por token desconocido (sin el lru_cache) y cuántos typos sintéticos (1-2
+ediciones de una palabra del diccionario) vuelven a la palabra original.
+Uso: python benchmarks/bench_spelling.py [--palabras 20000 200000] [--typos 2000]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from common import catalogo_sintetico
+from spelling import MIN_FREQUENCY, SpellChecker, build_vocabulary
+
+LETRAS = "abcdefghijlmnopqrstuvyzñáéíó"
+EJEMPLOS = ["notbook lenovo", "auriculares inalanbricos", "teclao gamer", "Monitr Samsumg 27 pulgadas"]
+
+
+def palabras_sinteticas(n: int, rng: random.Random) -> dict:
+    """Vocabulario del modelo + títulos sintéticos + pseudo-palabras hasta llegar a `n`."""
+    frecuencias = build_vocabulary(catalogo_sintetico(20_000)["title"])
+    while len(frecuencias) < n:
+        palabra = "".join(rng.choice(LETRAS) for _ in range(rng.randint(4, 12)))
+        frecuencias[palabra] += rng.randint(1, 50)
+    return frecuencias
+
+
+def typo(palabra: str, rng: random.Random) -> str:
+    for _ in range(rng.choice([1, 1, 2])):
+        i = rng.randrange(len(palabra))
+        op = rng.choice(["borrar", "insertar", "cambiar", "transponer"])
+        if op == "borrar" and len(palabra) > 1:
+            palabra = palabra[:i] + palabra[i + 1:]
+        elif op == "insertar":
+            palabra = palabra[:i] + rng.choice(LETRAS) + palabra[i:]
+        elif op == "cambiar":
+            palabra = palabra[:i] + rng.choice(LETRAS) + palabra[i + 1:]
+        elif i + 1 < len(palabra):
+            palabra = palabra[:i] + palabra[i + 1] + palabra[i] + palabra[i + 2:]
+    return palabra
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--palabras", type=int, nargs="+", default=[20_000, 200_000])
+    parser.add_argument("--typos", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    for n in args.palabras:
+        frecuencias = palabras_sinteticas(n, rng)
+        t0 = time.perf_counter()
+        checker = SpellChecker.build(frecuencias)
+        t_build = time.perf_counter() - t0
+        tmp = tempfile.mkdtemp()
+        try:
+            checker.save(os.path.join(tmp, "spelling"))
+            t0 = time.perf_counter()
+            checker = SpellChecker.load(os.path.join(tmp, "spelling"))
+            t_load = time.perf_counter() - t0
+
+            # Sólo las palabras que pueden reemplazar a un token
+            largas = [p for p, f in frecuencias.items() if len(p) >= 6 and f >= MIN_FREQUENCY]
+            casos = []
+            while len(casos) < args.typos:
+                original = rng.choice(largas)
+                t = typo(original, rng)
+                if t not in frecuencias and len(t) >= 4:
+                    casos.append((original, t))
+            t0 = time.perf_counter()
+            corregidas = [checker._lookup(t) for _, t in casos]
+            t_lookup = (time.perf_counter() - t0) / len(casos)
+            aciertos = sum(c == o for (o, _), c in zip(casos, corregidas))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        print(f"\npalabras = {len(frecuencias):,} | armado {t_build:.1f}s | carga {t_load * 1e3:.0f} ms | {checker.stats()}")
+        print(f"  token desconocido: {t_lookup * 1e6:.0f} µs | typos corregidos a la palabra original: "
+              f"{aciertos / len(casos):.1%} (el resto: otra palabra a la misma distancia, o más ediciones "
+              f"de las que admite su largo)")
+        for q in EJEMPLOS:
+            print(f"  {q!r} -> {checker.correct(q)!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Compara `similitud_producto` vía df.apply (camino original) contra `TagEngine.match_counts`.
+Uso: python benchmarks/bench_tag_engine.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+
+import numpy as np
+
+from common import catalogo_sintetico, query_tags_sintetica, cronometrar
+from app_v0 import similitud_producto, safe_list
+from tag_engine import TagEngine
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    tags = set(query_tags_sintetica())
+    print(f"{'productos':>10} | {'apply (s)':>10} | {'motor (s)':>10} | {'build (s)':>10} | {'speedup':>8}")
+    for n in args.sizes:
+        df = catalogo_sintetico(n)
+
+        def camino_apply():
+            d = df.copy()
+            d["atributos_list"] = d["atributos_list"].apply(safe_list)
+            return d.apply(lambda r: similitud_producto(r, tags), axis=1).to_numpy()
+
+        t_build = cronometrar(lambda: TagEngine.from_dataframe(df), repeticiones=1)
+        motor = TagEngine.from_dataframe(df)
+        t_apply = cronometrar(camino_apply, repeticiones=1)
+        t_motor = cronometrar(lambda: motor.match_counts(tags))
+
+        assert np.array_equal(camino_apply(), motor.match_counts(tags)), "los scores no coinciden"
+        print(f"{n:>10} | {t_apply:>10.3f} | {t_motor:>10.4f} | {t_build:>10.3f} | {t_apply / t_motor:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Orden completo vs selección parcial (`top_k_indices`) sobre un vector de scores.
+Uso: python benchmarks/bench_topk.py [--n 1000000] [--k 5 12]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from common import cronometrar
+from topk import top_k_indices
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=1_000_000)
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 12])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    casos = {
+        # similitud de filtrar_por_tags: enteros chicos, muchísimos empates
+        "conteos (int)": rng.integers(0, 6, size=args.n),
+        # similitud_total de rank_products: floats casi sin empates
+        "scores (float)": rng.random(args.n),
+    }
+    print(f"n = {args.n:,}")
+    print(f"{'caso':>15} | {'k':>3} | {'sort_values (ms)':>16} | {'argsort (ms)':>12} | {'top_k (ms)':>10} | {'speedup':>8}")
+    for nombre, scores in casos.items():
+        serie = pd.Series(scores)
+        for k in args.k:
+            t_pandas = cronometrar(lambda: serie.sort_values(ascending=False, kind="stable").head(k))
+            t_argsort = cronometrar(lambda: np.argsort(-scores, kind="stable")[:k])
+            t_topk = cronometrar(lambda: top_k_indices(scores, k))
+
+            esperado = np.argsort(-scores, kind="stable")[:k]
+            assert np.array_equal(top_k_indices(scores, k), esperado), "el top-k no coincide"
+            print(f"{nombre:>15} | {k:>3} | {t_pandas * 1e3:>16.1f} | {t_argsort * 1e3:>12.1f} | "
+                  f"{t_topk * 1e3:>10.1f} | {t_pandas / t_topk:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
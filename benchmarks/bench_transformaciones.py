@@ -0,0 +1,97 @@
+"""
+`transformaciones` (pandas, con todas las páginas concatenadas en memoria) vs
+`transformaciones_stream` (generador + escritura incremental a Parquet) sobre
+páginas sintéticas de listado de Fravega. Cada variante corre en un subproceso
+para medir su pico de memoria (RSS máximo).
+Uso: python benchmarks/bench_transformaciones.py [--paginas 20 200 800] [--page-size 50]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT
+
+
+def pagina_sintetica(offset: int, n: int, seed: int = 0) -> dict:
+    """Una respuesta de listProducts_Shopping con la forma de `extendedItemFragment`."""
+    rng = random.Random(seed * 100003 + offset)
+    canales = ["fravega-ecommerce", "net-price", "app"]
+    results = []
+    for i in range(offset, offset + n):
+        skus = []
+        for j in range(rng.randint(1, 3)):
+            pricing = [{"channel": c, "listPrice": rng.randint(1, 900) * 1000.0,
+                        "salePrice": rng.randint(1, 900) * 1000.0, "discount": rng.randint(0, 30),
+                        "__typename": "Pricing"} for c in rng.sample(canales, rng.randint(1, 3))]
+            skus.append({"code": str(500000 + i * 10 + j),
+                         "categorization": [[{"name": "Tecnología", "slug": "tecnologia", "__typename": "Category"},
+                                             {"name": rng.choice(["Notebooks", "Tablets", "Monitores"]),
+                                              "slug": "sub", "__typename": "Category"}]],
+                         "resolvedBidId": None, "sponsored": False, "campaignId": None,
+                         "pricing": pricing, "netPricing": pricing[:1], "__typename": "Sku"})
+        results.append({"sellers": [{"commercialName": "Fravega", "__typename": "Seller"}], "stockLabels": [],
+                        "id": f"id{i}", "title": f"Producto {i}", "katalogCategoryId": "k1",
+                        "brand": {"id": "b1", "name": "Lenovo", "__typename": "Brand"},
+                        "skus": {"results": skus, "__typename": "SkuResults"},
+                        "images": [f"img{i}-{k}.jpg" for k in range(4)], "slug": f"producto-{i}",
+                        "__typename": "ExtendedItem"})
+    return {"data": {"items": {"total": None, "results": results, "__typename": "Items"}}}
+
+
+def correr_variante(variante: str, ruta: str) -> None:
+    """Modo subproceso: corre una variante e imprime tiempo, filas y RSS máximo en JSON."""
+    from scripts import fravega
+    t0 = time.perf_counter()
+    if variante == "pandas":
+        # Lo que hay que hacer hoy: juntar todas las páginas en un JSON y transformar
+        productos = [r for data in fravega.iter_listados(ruta) for r in data["data"]["items"]["results"]]
+        df = fravega.transformaciones({"data": {"items": {"results": productos}}})
+        df.to_parquet(os.path.join(ruta, "salida-pandas.parquet"))
+        filas = len(df)
+    else:
+        filas = fravega.transformaciones_stream(fravega.iter_listados(ruta), os.path.join(ruta, "salida-stream.parquet"))["filas"]
+    print(json.dumps({"segundos": time.perf_counter() - t0, "filas": filas,
+                      "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+
+
+def medir(variante: str, ruta: str) -> dict:
+    out = subprocess.run([sys.executable, __file__, "--variante", variante, "--dir", ruta],
+                         env=dict(os.environ, PYTHONPATH=ROOT), capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paginas", type=int, nargs="+", default=[20, 200, 800])
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--variante", help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.variante:
+        return correr_variante(args.variante, args.dir)
+
+    import pandas as pd
+
+    print(f"{'páginas':>7} | {'SKUs':>7} | {'pandas (s)':>10} | {'stream (s)':>10} | {'pandas RSS':>10} | {'stream RSS':>10}")
+    for paginas in args.paginas:
+        with tempfile.TemporaryDirectory() as tmp:
+            ruta = tmp + "/"
+            for k in range(paginas):
+                with open(f"{ruta}productos-offset{k * args.page_size}.json", "w", encoding="utf-8") as f:
+                    json.dump(pagina_sintetica(k * args.page_size, args.page_size), f)
+            viejo, nuevo = medir("pandas", ruta), medir("stream", ruta)
+            a = pd.read_parquet(ruta + "salida-pandas.parquet").sort_values("sku_id").reset_index(drop=True)
+            b = pd.read_parquet(ruta + "salida-stream.parquet").sort_values("sku_id").reset_index(drop=True)
+            assert a[["sku_id", "list_price", "sale_price"]].equals(b[["sku_id", "list_price", "sale_price"]])
+            print(f"{paginas:>7} | {nuevo['filas']:>7,} | {viejo['segundos']:>10.2f} | {nuevo['segundos']:>10.2f} | "
+                  f"{viejo['rss_mb']:>7.0f} MB | {nuevo['rss_mb']:>7.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
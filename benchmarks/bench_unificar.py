@@ -0,0 +1,96 @@
+"""
+Resolución de entidades de `scripts/unificar.py` sobre ofertas sintéticas de
+tres tiendas: cada producto aparece en 1-3 tiendas con el título reescrito
+(orden de palabras, "8GB" vs "8 GB", acentos, prefijos como "Notebook") y
+GTIN sólo en algunas. Mide tiempo y precisión/recall de los pares
+mismo-producto contra la verdad conocida.
+Uso: python benchmarks/bench_unificar.py [--ofertas 50000 200000 500000]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+import pandas as pd
+
+from common import MARCAS
+from scripts.unificar import COLUMNAS_OFERTAS, catalogo_unificado, resolver_entidades
+
+TIENDAS = ["fravega", "lenovo", "garbarino"]
+LINEAS = ["IdeaPad", "ThinkPad", "Legion", "Vivobook", "Zenbook", "Pavilion", "Inspiron", "Galaxy", "Bravia", "Aspire"]
+TIPOS = ["Notebook", "Monitor", "Tablet", "Smart TV", "Auriculares", "Celular"]
+
+
+def ean13(base: int) -> str:
+    digitos = f"{base:012d}"
+    suma = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digitos))
+    return digitos + str((10 - suma % 10) % 10)
+
+
+def variante(partes: list, rng: random.Random) -> str:
+    partes = list(partes)
+    if rng.random() < 0.3:
+        partes = partes[1:]  # sin el tipo de producto
+    if rng.random() < 0.3:
+        partes = [p.replace("GB", " GB") for p in partes]
+    if rng.random() < 0.2:
+        partes = [p.replace("pulgadas", "pulg") for p in partes]
+    if rng.random() < 0.3:
+        rng.shuffle(partes)
+    titulo = " ".join(partes)
+    return titulo.upper() if rng.random() < 0.1 else titulo
+
+
+def ofertas_sinteticas(n: int, seed: int = 0) -> tuple:
+    """(DataFrame de ofertas, id de producto real de cada oferta)."""
+    rng = random.Random(seed)
+    filas, verdad = [], []
+    producto = 0
+    while len(filas) < n:
+        marca = rng.choice(MARCAS)
+        codigo = f"{rng.randint(10, 99)}{rng.choice('ABCDEFGHK')}{rng.randint(1000, 9999)}"
+        partes = [rng.choice(TIPOS), marca, rng.choice(LINEAS), str(rng.randint(3, 9)), codigo,
+                  f"{rng.choice([4, 8, 16, 32])}GB", f"{rng.choice([128, 256, 512])}GB SSD",
+                  f"{rng.choice([13, 14, 15.6, 27, 55])} pulgadas", rng.choice(["Negro", "Gris", "Plata"])]
+        gtin = ean13(7_790_000_000 + producto)
+        for tienda in rng.sample(TIENDAS, rng.choice([1, 1, 2, 2, 3])):
+            filas.append((tienda, f"{tienda[:3]}{len(filas)}", variante(partes, rng), marca,
+                          rng.randint(100, 2000) * 1000.0, None, rng.choice(TIPOS),
+                          gtin if rng.random() < 0.4 else None, None, None))
+            verdad.append(producto)
+        producto += 1
+    return pd.DataFrame(filas[:n], columns=COLUMNAS_OFERTAS), np.array(verdad[:n])
+
+
+def pares(grupos: np.ndarray) -> int:
+    _, tam = np.unique(grupos, return_counts=True)
+    return int((tam * (tam - 1) // 2).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ofertas", type=int, nargs="+", default=[50_000, 200_000, 500_000])
+    args = parser.parse_args()
+
+    print(f"{'ofertas':>8} | {'productos':>9} | {'resolver (s)':>12} | {'catálogo (s)':>12} | "
+          f"{'candidatos':>10} | {'precisión':>9} | {'recall':>6}")
+    for n in args.ofertas:
+        ofertas, verdad = ofertas_sinteticas(n)
+        t0 = time.perf_counter()
+        grupos, stats = resolver_entidades(ofertas)
+        t_resolver = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        catalogo_unificado(ofertas, grupos)
+        t_catalogo = time.perf_counter() - t0
+
+        # Pares correctos = pares dentro de la intersección (grupo predicho, producto real)
+        conjunto = pd.factorize(pd.Series(list(zip(grupos, verdad))))[0]
+        correctos = pares(conjunto)
+        precision = correctos / max(1, pares(grupos))
+        recall = correctos / max(1, pares(verdad))
+        print(f"{n:>8,} | {stats['productos']:>9,} | {t_resolver:>12.2f} | {t_catalogo:>12.2f} | "
+              f"{stats['candidatos_lsh']:>10,} | {precision:>9.3f} | {recall:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Helpers compartidos por los benchmarks: catálogo sintético y medición de tiempos.
+Los scripts se corren desde la raíz del repo, p.ej. `python benchmarks/bench_tag_engine.py`.
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+META_PATH = os.path.join(ROOT, "es_ecommerce_classifier", "meta.json")
+MARCAS = ["Lenovo", "HP", "Asus", "Samsung", "Sony", "LG", "Dell", "Acer", "JBL", "Xiaomi"]
+
+
+def labels_modelo() -> list:
+    """Labels del modelo ya limpias (CAT_CAT_X -> CAT_X)."""
+    with open(META_PATH, encoding="utf-8") as f:
+        raw = json.load(f)["labels"]["textcat_multilabel"]
+    return [l.replace("CAT_CAT_", "CAT_").replace("INT_INT_", "INT_").replace("ATTR_ATTR_", "ATTR_") for l in raw]
+
+
+def catalogo_sintetico(n: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Catálogo con el mismo esquema que productos-gemini.csv
+    ('atributos_list' como string, igual que sale de read_csv).
+    """
+    rng = np.random.default_rng(seed)
+    labels = labels_modelo()
+    cats = [l for l in labels if l.startswith("CAT_")]
+    ints = [l for l in labels if l.startswith("INT_")]
+    attrs = np.array([l for l in labels if l.startswith("ATTR_")])
+
+    n_attrs = rng.integers(0, 7, size=n)
+    attr_idx = rng.integers(0, len(attrs), size=int(n_attrs.sum()))
+    cortes = np.concatenate(([0], np.cumsum(n_attrs)))
+    atributos = [str(attrs[attr_idx[cortes[i]:cortes[i + 1]]].tolist()) for i in range(n)]
+
+    cat = np.array(cats)[rng.integers(0, len(cats), size=n)]
+    intencion = np.array(ints)[rng.integers(0, len(ints), size=n)]
+    marca = np.array(MARCAS)[rng.integers(0, len(MARCAS), size=n)]
+    return pd.DataFrame({
+        "title": [f"{c[4:].title()} {m} modelo {i}" for i, (c, m) in enumerate(zip(cat, marca))],
+        "slug": [f"producto-{i}" for i in range(n)],
+        "brand_name": marca,
+        "categories": cat,
+        "list_price": rng.integers(20, 3000, size=n) * 1000.0,
+        "atributos_correctos": [
+            f"{{'categoria': '{c}', 'intencion': '{i}', 'atributos': {a}}}"
+            for c, i, a in zip(cat, intencion, atributos)
+        ],
+        "categoria_detectada": cat,
+        "intencion_detectada": intencion,
+        "atributos_list": atributos,
+    })
+
+
+def query_tags_sintetica(seed: int = 0, n_tags: int = 15) -> list:
+    rng = np.random.default_rng(seed)
+    labels = labels_modelo()
+    return list(rng.choice(labels, size=n_tags, replace=False))
+
+
+def cronometrar(fn, repeticiones: int = 3) -> float:
+    """Mejor tiempo (segundos) de `repeticiones` corridas."""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+
+def cargar_clasificador():
+    """
+    El `es_ecommerce_classifier` empaquetado; si faltan sus pesos, la misma
+    arquitectura (config.cfg: TextCatBOW, mismas labels) inicializada sin entrenar,
+    que tiene el mismo costo por documento.
+    """
+    try:
+        from es_ecommerce_classifier import load
+        return load()
+    except Exception as e:
+        import spacy
+        from spacy.util import load_config
+        print(f"Modelo empaquetado no disponible ({type(e).__name__}); usando arquitectura sin entrenar")
+        base = os.path.join(ROOT, "es_ecommerce_classifier", "es_ecommerce_classifier-1.0.0")
+        config = load_config(os.path.join(base, "config.cfg"))
+        nlp = spacy.blank("es", config={"nlp": {"batch_size": config["nlp"]["batch_size"]}})
+        componente = {k: v for k, v in config["components"]["textcat_multilabel"].items() if k != "factory"}
+        textcat = nlp.add_pipe("textcat_multilabel", config=componente)
+        with open(META_PATH, encoding="utf-8") as f:
+            for label in json.load(f)["labels"]["textcat_multilabel"]:
+                textcat.add_label(label)
+        nlp.initialize()
+        return nlp
@@ -0,0 +1,389 @@
+# catalog.py
+"""
+Carga del catálogo y snapshot binario precompilado.
+
+El CSV (productos-gemini.csv) se compila una vez a un snapshot columnar:
+  - `catalogo.arrow`: tabla Arrow IPC sin comprimir (se abre con memory-map)
+  - `motor/`: arrays del `TagEngine` e índice invertido (.npy memory-mappeables)
+  - `lexico/`: índice BM25 (`LexicalIndex`) para la búsqueda sin modelo
+  - `meta.json`: checksum del CSV de origen y versión del formato
+
+Layout en disco (al lado del CSV):
+  datos/productos-gemini.snapshot/
+      CURRENT            -> {"sha256", "size", "mtime_ns", "dir"}
+      <sha256[:16]>/     -> snapshot de esa versión del CSV
+
+Uso:
+  python catalog.py build-catalog [--csv datos/productos-gemini.csv] [--force]
+  python catalog.py tag-catalog [--csv ...] [--specs atributos.parquet] [--n-process 4] [--batch-size 256]
+"""
+from __future__ import annotations
+import argparse
+import ast
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Optional
+
+import pandas as pd
+
+from facets import FacetIndex
+from lexical_index import LexicalIndex
+from query_constraints import FilterIndex
+from recommender import safe_list, compile_products
+from tag_engine import TagEngine
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    SNAPSHOT_AVAILABLE = True
+except ImportError:
+    SNAPSHOT_AVAILABLE = False
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DATA_PATHS = ['datos/productos-gemini.csv', 'data/productos-gemini.csv', 'productos-gemini.csv']
+SNAPSHOT_VERSION = 2
+
+# Columnas que se guardan como list<string>
+LIST_COLUMNS = ("atributos_list", "atributos_lista")
+# Columnas intermedias que no van al snapshot (dicts heterogéneos)
+SKIP_COLUMNS = ("parsed_attributes",)
+# Columnas que agrega `process_catalog` (no vienen en el CSV)
+DERIVED_COLUMNS = ("parsed_attributes", "categoria_principal", "intencion_principal", "atributos_lista",
+                   "sale_price", "sku_id", "discount_percent", "relevance_score")
+
+
+# -------- CSV --------
+def find_data_path() -> Optional[str]:
+    for path in DATA_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+def parse_attributes(attr_str):
+    """Parsea la cadena JSON de atributos_correctos"""
+    if pd.isna(attr_str) or not attr_str:
+        return {}
+
+    try:
+        # Intentar parsear como diccionario
+        if isinstance(attr_str, str):
+            return ast.literal_eval(attr_str)
+        return attr_str
+    except Exception as e:
+        print(f"Error parseando atributos: {e}")
+        return {}
+
+def process_catalog(df: pd.DataFrame) -> pd.DataFrame:
+    """Columnas derivadas que usan el scoring y el template."""
+    # Procesar la columna atributos_correctos para extraer categorías, intenciones y atributos
+    df['parsed_attributes'] = df['atributos_correctos'].apply(parse_attributes)
+
+    # Agregar campos separados para facilitar el cálculo de scores
+    df['categoria_principal'] = df['parsed_attributes'].apply(lambda x: x.get('categoria', '') if x else '')
+    df['intencion_principal'] = df['parsed_attributes'].apply(lambda x: x.get('intencion', '') if x else '')
+    df['atributos_lista'] = df['parsed_attributes'].apply(lambda x: x.get('atributos', []) if x else [])
+
+    # Agregar columnas que necesita el template (con valores por defecto)
+    if 'list_price' in df.columns:
+        df['sale_price'] = df['list_price'] * 0.9  # Simular 10% descuento
+    else:
+        df['sale_price'] = 100000  # Precio por defecto
+
+    df['sku_id'] = df['slug'] if 'slug' in df.columns else range(len(df))  # Usar slug como SKU
+    df['discount_percent'] = 10.0  # Descuento fijo del 10%
+
+    # Agregar columna de relevance_score inicializada en 0
+    df['relevance_score'] = 0.0
+
+    # Agregar columnas para compatibilidad con el sistema de tags. Se completan
+    # fila por fila: en un delta mixto algunas filas traen la columna y otras no
+    derivadas = {
+        'atributos_list': df['atributos_lista'].apply(safe_list),
+        'categoria_detectada': df['categoria_principal'],
+        'intencion_detectada': df['intencion_principal'],
+    }
+    for col, valores in derivadas.items():
+        if col not in df.columns:
+            df[col] = valores
+            continue
+        faltan = df[col].isna().to_numpy()
+        if faltan.any():
+            df[col] = [v if falta else actual
+                       for actual, v, falta in zip(df[col].tolist(), valores.tolist(), faltan)]
+    return df
+
+def read_csv_catalog(data_path: str) -> pd.DataFrame:
+    df = pd.read_csv(data_path)
+    print(f"SUCCESS: Cargados {len(df)} productos del archivo CSV: {data_path}")
+    print(f"Columnas disponibles: {list(df.columns)}")
+    return process_catalog(df)
+
+
+# -------- Snapshot --------
+class CatalogSnapshot:
+    """Catálogo abierto desde un snapshot: DataFrame respaldado por Arrow + motor memory-mappeado."""
+
+    def __init__(self, df: pd.DataFrame, motor: TagEngine, checksum: str, path: str,
+                 lexico: Optional[LexicalIndex] = None):
+        self.df = df
+        self.motor = motor
+        self.checksum = checksum
+        self.path = path
+        self.lexico = lexico
+        self.filtros = None
+        self.facetas = None
+        # El BM25 vino de la versión anterior (ver `apply_delta`) y no refleja los
+        # textos que cambiaron: `rebuild_lexical` lo rearma
+        self.lexico_pendiente = False
+        # Facetas de la versión anterior cuando el cambio fue sólo de precios
+        self.facetas_previas = None
+
+    def lexical(self) -> LexicalIndex:
+        """Índice BM25 del catálogo; si la versión no lo trae (CSV sin snapshot) se arma acá."""
+        if self.lexico is None or self.lexico.n_docs != len(self.df):
+            self.lexico = LexicalIndex.from_dataframe(self.df)
+            self.lexico_pendiente = False
+        return self.lexico
+
+    def rebuild_lexical(self) -> LexicalIndex:
+        """Rearma el BM25 completo; mientras tanto las búsquedas usan el anterior."""
+        lexico = LexicalIndex.from_dataframe(self.df)
+        self.lexico, self.lexico_pendiente = lexico, False
+        return lexico
+
+    def filters(self) -> FilterIndex:
+        """Precios ordenados + marcas para los filtros de la query (un argsort, se arma al primer uso)."""
+        if self.filtros is None or self.filtros.n_products != len(self.df):
+            self.filtros = FilterIndex.from_catalog(self.df, self.motor)
+        return self.filtros
+
+    def facets(self) -> FacetIndex:
+        """
+        Bitsets de marca/categoría/intención/atributos/precio para los conteos por
+        faceta (se arma al primer uso). Después de un cambio sólo de precios se
+        reusan las de la versión anterior y se rearma la de precio.
+        """
+        if self.facetas is None or self.facetas.n_products != len(self.df):
+            previas = self.facetas_previas
+            if previas is not None and previas.n_products == len(self.df):
+                self.facetas = previas.with_prices(self.filters().precio_fila)
+            else:
+                self.facetas = FacetIndex.from_catalog(self.df, self.motor, self.filters().precio_fila)
+            self.facetas_previas = None
+        return self.facetas
+
+def file_checksum(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def snapshot_root(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".snapshot"
+
+def _arrow_table(df: pd.DataFrame) -> "pa.Table":
+    columnas = {}
+    for col in df.columns:
+        if col in SKIP_COLUMNS:
+            continue
+        serie = df[col]
+        if col in LIST_COLUMNS:
+            valores = [[a for a in safe_list(x) if isinstance(a, str)] for x in serie]
+            columnas[col] = pa.array(valores, type=pa.list_(pa.string()))
+        elif serie.dtype == object:
+            valores = [None if (not isinstance(x, str) and pd.isna(x)) else str(x) for x in serie]
+            columnas[col] = pa.array(valores, type=pa.string())
+        else:
+            columnas[col] = pa.array(serie.to_numpy())
+    return pa.table(columnas)
+
+def _types_mapper(arrow_type):
+    # Strings y listas quedan respaldadas por Arrow (sin materializar objetos Python)
+    if pa.types.is_string(arrow_type) or pa.types.is_list(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+def write_snapshot(df: pd.DataFrame, motor: TagEngine, path: str, source: dict) -> None:
+    os.makedirs(path, exist_ok=True)
+    with pa.OSFile(os.path.join(path, "catalogo.arrow"), "wb") as sink:
+        table = _arrow_table(df)
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    motor.save(os.path.join(path, "motor"))
+    LexicalIndex.from_dataframe(df).save(os.path.join(path, "lexico"))
+    # meta.json se escribe al final: marca el snapshot como completo
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": SNAPSHOT_VERSION, "n_products": len(df), **source}, f, ensure_ascii=False)
+
+def open_snapshot(path: str) -> CatalogSnapshot:
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    source = pa.memory_map(os.path.join(path, "catalogo.arrow"), "r")
+    table = pa.ipc.open_file(source).read_all()
+    # split_blocks evita consolidar columnas numéricas en un bloque nuevo: así las
+    # que no tienen nulos quedan como vistas sobre el archivo mapeado (compartidas
+    # entre workers por el page cache) en vez de copias privadas de cada proceso.
+    df = table.to_pandas(types_mapper=_types_mapper, split_blocks=True)
+    motor = TagEngine.load(os.path.join(path, "motor"), mmap=True)
+    lexico = LexicalIndex.load(os.path.join(path, "lexico"), mmap=True)
+    return CatalogSnapshot(df=df, motor=motor, checksum=meta["sha256"], path=path, lexico=lexico)
+
+def _read_current(root: str) -> dict:
+    try:
+        with open(os.path.join(root, "CURRENT"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_current(root: str, current: dict) -> None:
+    tmp = os.path.join(root, f"CURRENT.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(current, f)
+    os.replace(tmp, os.path.join(root, "CURRENT"))
+
+def _is_complete(path: str) -> bool:
+    try:
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            return json.load(f).get("version") == SNAPSHOT_VERSION
+    except (OSError, ValueError):
+        return False
+
+def build_snapshot(csv_path: str, root: Optional[str] = None, checksum: Optional[str] = None) -> str:
+    """
+    Compila el CSV a un snapshot nuevo y lo publica como CURRENT.
+    Se escribe en un directorio temporal y se renombra al final, así otros
+    procesos nunca ven un snapshot a medio escribir. Devuelve el directorio.
+    """
+    root = root or snapshot_root(csv_path)
+    os.makedirs(root, exist_ok=True)
+    stat = os.stat(csv_path)
+    checksum = checksum or file_checksum(csv_path)
+    destino = os.path.join(root, checksum[:16])
+
+    if not _is_complete(destino):
+        t0 = time.perf_counter()
+        df = read_csv_catalog(csv_path)
+        motor = compile_products(df)
+        motor.build_index()
+        tmp = os.path.join(root, f".build-{os.getpid()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        write_snapshot(df, motor, tmp, {"source": csv_path, "sha256": checksum})
+        if os.path.isdir(destino) and not _is_complete(destino):
+            # Snapshot del mismo CSV con otra versión del formato
+            shutil.rmtree(destino, ignore_errors=True)
+        try:
+            os.rename(tmp, destino)
+        except OSError:
+            # Otro proceso publicó el mismo snapshot mientras compilábamos
+            shutil.rmtree(tmp, ignore_errors=True)
+        print(f"SUCCESS: Snapshot compilado en {time.perf_counter() - t0:.2f}s: {destino}")
+
+    _write_current(root, {"sha256": checksum, "size": stat.st_size,
+                          "mtime_ns": stat.st_mtime_ns, "dir": os.path.basename(destino)})
+
+    # Versiones viejas: los procesos que ya las tienen mapeadas siguen leyendo el inode
+    for nombre in os.listdir(root):
+        viejo = os.path.join(root, nombre)
+        if os.path.isdir(viejo) and viejo != destino and not nombre.startswith("."):
+            shutil.rmtree(viejo, ignore_errors=True)
+    return destino
+
+def load_catalog(csv_path: str) -> CatalogSnapshot:
+    """
+    Abre el snapshot del CSV si está al día; si el CSV cambió (tamaño/mtime y
+    después checksum) o no hay snapshot, lo recompila primero.
+    """
+    root = snapshot_root(csv_path)
+    current = _read_current(root)
+    stat = os.stat(csv_path)
+    path = os.path.join(root, current.get("dir", ""))
+
+    if current and (current.get("size"), current.get("mtime_ns")) == (stat.st_size, stat.st_mtime_ns) \
+            and _is_complete(path):
+        return open_snapshot(path)
+
+    # Cambió la metadata del archivo: sólo recompilar si cambió el contenido
+    checksum = file_checksum(csv_path)
+    if current.get("sha256") == checksum and _is_complete(path):
+        _write_current(root, {**current, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+        return open_snapshot(path)
+
+    return open_snapshot(build_snapshot(csv_path, root, checksum))
+
+
+def memory_report() -> str:
+    """
+    Memoria del proceso: residente total, cuánto es compartido (páginas del
+    snapshot mapeado que ven todos los workers) y cuánto es privado (USS).
+    """
+    if psutil is None:
+        return "Memoria: psutil no disponible"
+    info = psutil.Process().memory_full_info()
+    mb = 1024 * 1024
+    shared = getattr(info, "shared", 0)
+    uss = getattr(info, "uss", info.rss - shared)
+    return f"Memoria: RSS {info.rss / mb:.1f} MB | compartida {shared / mb:.1f} MB | privada (USS) {uss / mb:.1f} MB"
+
+# -------- CLI --------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Herramientas del catálogo")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    build = sub.add_parser("build-catalog", help="Compila el CSV a un snapshot binario")
+    build.add_argument("--csv", default=None, help="CSV de origen (por defecto productos-gemini.csv)")
+    build.add_argument("--force", action="store_true", help="Recompila aunque el checksum no haya cambiado")
+
+    tag = sub.add_parser("tag-catalog", help="Re-etiqueta el catálogo con es_ecommerce_classifier (ver catalog_tagging.py)")
+    tag.add_argument("--csv", default=None, help="CSV de origen (por defecto productos-gemini.csv)")
+    tag.add_argument("--salida", default=None, help="CSV de salida (por defecto se reescribe --csv)")
+    tag.add_argument("--specs", default=None, help="Tabla de specs/atributos de scripts/atributos.py (.parquet o .csv)")
+    tag.add_argument("--clave-specs", default="slug", help="Columna del CSV que corresponde al sku_id de --specs")
+    tag.add_argument("--batch-size", type=int, default=256, help="Documentos por lote de nlp.pipe")
+    tag.add_argument("--n-process", type=int, default=1, help="Procesos de nlp.pipe")
+    tag.add_argument("--tramo", type=int, default=5000, help="Productos por parte del checkpoint")
+    tag.add_argument("--umbral-cat", type=float, default=None)
+    tag.add_argument("--umbral-int", type=float, default=None)
+    tag.add_argument("--umbral-attr", type=float, default=None)
+    tag.add_argument("--no-build", action="store_true", help="No recompila el snapshot al terminar")
+
+    args = parser.parse_args(argv)
+    if args.comando == "tag-catalog":
+        import catalog_tagging
+        csv_path = args.csv or find_data_path()
+        if csv_path is None:
+            parser.error("No se encontró el archivo productos-gemini.csv en ninguna ubicación")
+        try:
+            from es_ecommerce_classifier import load as load_model
+            nlp = load_model()
+        except Exception as e:
+            parser.error(f"No se pudo cargar es_ecommerce_classifier: {e}")
+        umbrales = {k: v for k, v in (("umbral_cat", args.umbral_cat), ("umbral_int", args.umbral_int),
+                                      ("umbral_attr", args.umbral_attr)) if v is not None}
+        stats = catalog_tagging.tag_catalog(csv_path, nlp, specs_path=args.specs, clave_specs=args.clave_specs,
+                                            batch_size=args.batch_size, n_process=args.n_process,
+                                            tramo=args.tramo, salida=args.salida,
+                                            compilar=not args.no_build, **umbrales)
+        print(f"Catálogo re-etiquetado: {stats}")
+    elif args.comando == "build-catalog":
+        if not SNAPSHOT_AVAILABLE:
+            parser.error("pyarrow no está instalado")
+        csv_path = args.csv or find_data_path()
+        if csv_path is None:
+            parser.error("No se encontró el archivo productos-gemini.csv en ninguna ubicación")
+        if args.force:
+            shutil.rmtree(snapshot_root(csv_path), ignore_errors=True)
+        t0 = time.perf_counter()
+        snapshot = open_snapshot(build_snapshot(csv_path))
+        print(f"Snapshot listo: {snapshot.path} ({len(snapshot.df)} productos, {time.perf_counter() - t0:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# catalog_tagging.py
+"""
+Re-etiquetado offline del catálogo con el `es_ecommerce_classifier` empaquetado.
+
+Por cada producto arma un texto (título, marca, categorías y, si se pasa la
+tabla de `scripts/atributos.py`, sus specs/atributos), lo pasa por `nlp.pipe`
+(`batch_size` y `n_process` configurables) y se queda con:
+  - categoria_detectada: el CAT_* de mayor score, si supera `umbral_cat`
+  - intencion_detectada: el INT_* de mayor score, si supera `umbral_int`
+  - atributos_list: los ATTR_* que superan `umbral_attr` (a lo sumo `max_attrs`)
+con los labels normalizados por `normalize_label` (lo mismo que `clean_label`).
+
+Es reanudable: cada tramo de `tramo` productos se guarda en
+`<csv>.tags/parte-<inicio>-<fin>.jsonl` apenas termina; si el proceso se
+corta, la siguiente corrida saltea los tramos ya escritos (mientras no cambien
+el CSV, las specs, el modelo ni los umbrales). Al final escribe las columnas en el CSV y recompila
+el snapshot (`catalog.build_snapshot`).
+
+Uso: python catalog.py tag-catalog [--csv ...] [--specs atributos.parquet] [--n-process 4]
+"""
+from __future__ import annotations
+import json
+import os
+import shutil
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from label_registry import LabelRegistry
+
+TAG_COLUMNS = ("categoria_detectada", "intencion_detectada", "atributos_list")
+UMBRAL_CAT = float(os.getenv("TAG_UMBRAL_CAT", "0.5"))
+UMBRAL_INT = float(os.getenv("TAG_UMBRAL_INT", "0.5"))
+UMBRAL_ATTR = float(os.getenv("TAG_UMBRAL_ATTR", "0.5"))
+MAX_ATTRS = 8
+# Specs por producto que entran al texto (los modelos de BOW no ganan mucho con más)
+MAX_SPECS = 40
+
+
+def _texto(*partes) -> str:
+    return " . ".join(str(p) for p in partes if isinstance(p, str) and p.strip())
+
+
+def cargar_specs(ruta: str, clave: str = "sku_id") -> Dict[str, str]:
+    """Tabla larga de `scripts/atributos.py` -> {sku: "nombre valor . nombre valor ..."}."""
+    tabla = pd.read_parquet(ruta) if ruta.endswith(".parquet") else pd.read_csv(ruta, dtype=str)
+    textos = {}
+    for sku, grupo in tabla.groupby(clave, sort=False):
+        pares = [f"{n} {v}" for n, v in zip(grupo["nombre"], grupo["valor"]) if isinstance(v, str)]
+        textos[str(sku)] = " . ".join(pares[:MAX_SPECS])
+    return textos
+
+
+def textos_productos(df: pd.DataFrame, specs: Optional[Dict[str, str]] = None, clave: str = "slug") -> List[str]:
+    """Texto que ve el clasificador por cada fila del catálogo (`specs` del CSV unificado si la tiene)."""
+    specs = specs or {}
+    columnas = [df[c] if c in df.columns else [None] * len(df) for c in ("title", "brand_name", "categories", "specs")]
+    claves = df[clave].astype(str) if clave in df.columns else [None] * len(df)
+    return [_texto(titulo, marca, categorias, specs.get(k, propias))
+            for titulo, marca, categorias, propias, k in zip(*columnas, claves)]
+
+
+def etiquetar(cats: Dict[str, float], registro: LabelRegistry, umbral_cat: float = UMBRAL_CAT,
+              umbral_int: float = UMBRAL_INT, umbral_attr: float = UMBRAL_ATTR,
+              max_attrs: int = MAX_ATTRS) -> Tuple[str, str, List[str]]:
+    """(categoria, intencion, atributos) de un doc.cats, con labels canónicos y umbrales."""
+    limpios = sorted(registro.clean_scores(cats).items(), key=lambda x: x[1], reverse=True)
+    categoria = next((k for k, v in limpios if k.startswith("CAT_") and v >= umbral_cat), "")
+    intencion = next((k for k, v in limpios if k.startswith("INT_") and v >= umbral_int), "")
+    atributos = [k for k, v in limpios if k.startswith("ATTR_") and v >= umbral_attr][:max_attrs]
+    return categoria, intencion, atributos
+
+
+def _tramos(n: int, tramo: int) -> Iterator[Tuple[int, int]]:
+    for inicio in range(0, n, tramo):
+        yield inicio, min(inicio + tramo, n)
+
+
+def _ruta_parte(directorio: str, inicio: int, fin: int) -> str:
+    # Por rango de filas y no por número de parte: reanudar con otro --tramo no
+    # toma partes que cubren otras filas
+    return os.path.join(directorio, f"parte-{inicio:09d}-{fin:09d}.jsonl")
+
+
+def _firma(csv_path: str, nlp, umbrales: dict, specs_path: Optional[str], clave_specs: str) -> dict:
+    from catalog import file_checksum
+    return {"csv_sha256": file_checksum(csv_path),
+            "specs_sha256": file_checksum(specs_path) if specs_path else None,
+            "clave_specs": clave_specs,
+            "modelo": f"{nlp.meta.get('name')}-{nlp.meta.get('version')}", **umbrales}
+
+
+def _preparar_checkpoint(directorio: str, firma: dict) -> None:
+    """Deja `directorio` listo para reanudar; si la firma no coincide, empieza de cero."""
+    ruta = os.path.join(directorio, "firma.json")
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            if json.load(f) == firma:
+                return
+        print("Checkpoint de otra versión del catálogo/modelo/umbrales: se descarta")
+    except (OSError, ValueError):
+        pass
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.makedirs(directorio)
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(firma, f)
+
+
+def _leer_parte(ruta: str) -> List[list]:
+    with open(ruta, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f]
+
+
+def tag_catalog(csv_path: str, nlp, specs_path: Optional[str] = None, clave_specs: str = "slug",
+                batch_size: int = 256, n_process: int = 1, tramo: int = 5000,
+                umbral_cat: float = UMBRAL_CAT, umbral_int: float = UMBRAL_INT,
+                umbral_attr: float = UMBRAL_ATTR, salida: Optional[str] = None,
+                compilar: bool = True) -> dict:
+    """
+    Re-etiqueta todo el CSV con `nlp` y escribe las columnas de tags en `salida`
+    (por defecto el mismo CSV, reemplazado de forma atómica). Devuelve estadísticas.
+    """
+    t0 = time.perf_counter()
+    df = pd.read_csv(csv_path)
+    specs = cargar_specs(specs_path) if specs_path else None
+    textos = textos_productos(df, specs, clave_specs)
+    umbrales = {"umbral_cat": umbral_cat, "umbral_int": umbral_int, "umbral_attr": umbral_attr}
+    directorio = csv_path + ".tags"
+    _preparar_checkpoint(directorio, _firma(csv_path, nlp, umbrales, specs_path, clave_specs))
+    registro = LabelRegistry.from_sources()
+
+    procesados = reanudados = 0
+    t_modelo = 0.0
+    for inicio, fin in _tramos(len(textos), tramo):
+        ruta = _ruta_parte(directorio, inicio, fin)
+        if os.path.exists(ruta):
+            reanudados += fin - inicio
+            continue
+        t1 = time.perf_counter()
+        filas = [list(etiquetar(doc.cats, registro, **umbrales))
+                 for doc in nlp.pipe(textos[inicio:fin], batch_size=batch_size, n_process=n_process)]
+        t_modelo += time.perf_counter() - t1
+        procesados += fin - inicio
+        # Se escribe en un temporal y se renombra: una parte existe sólo si está completa
+        with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(fila, ensure_ascii=False) + "\n" for fila in filas)
+        os.replace(ruta + ".tmp", ruta)
+        print(f"  {fin:,}/{len(textos):,} productos ({procesados / t_modelo:,.0f} docs/s)")
+
+    filas = [fila for inicio, fin in _tramos(len(textos), tramo)
+             for fila in _leer_parte(_ruta_parte(directorio, inicio, fin))]
+    df["categoria_detectada"] = [f[0] for f in filas]
+    df["intencion_detectada"] = [f[1] for f in filas]
+    df["atributos_list"] = [str(f[2]) for f in filas]
+
+    salida = salida or csv_path
+    tmp = f"{salida}.{os.getpid()}.tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, salida)
+    shutil.rmtree(directorio, ignore_errors=True)
+    snapshot = None
+    if compilar:
+        from catalog import SNAPSHOT_AVAILABLE, build_snapshot
+        snapshot = build_snapshot(salida) if SNAPSHOT_AVAILABLE else None
+
+    segundos = time.perf_counter() - t0
+    return {"productos": len(df), "procesados": procesados, "reanudados": reanudados,
+            "docs_por_segundo": round(procesados / t_modelo, 1) if t_modelo else 0.0,
+            "sin_categoria": int((df["categoria_detectada"] == "").sum()),
+            "sin_intencion": int((df["intencion_detectada"] == "").sum()),
+            "segundos": round(segundos, 2), "salida": salida, "snapshot": snapshot}
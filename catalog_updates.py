@@ -0,0 +1,374 @@
+# catalog_updates.py
+"""
+Actualizaciones incrementales del catálogo (upsert / delete por `sku_id`).
+
+Cada cambio produce una versión nueva del catálogo (copy-on-write): DataFrame,
+`TagEngine` e índice invertido nuevos, armados a partir de los anteriores sólo
+compilando las filas que cambiaron. La versión vieja no se toca, así que las
+búsquedas en curso terminan sobre un catálogo consistente.
+
+Los cambios se anotan en un journal (`<csv>.deltas-<sha16>.jsonl`, ligado a la
+versión del CSV) que todos los procesos leen antes de buscar: así los workers
+de uvicorn y del process pool aplican los mismos cambios en el mismo orden.
+Cuando el CSV cambia, el snapshot se recompila en el próximo arranque y el
+journal de la versión anterior deja de aplicarse.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from catalog import (CatalogSnapshot, DERIVED_COLUMNS, LIST_COLUMNS, SNAPSHOT_AVAILABLE,
+                     file_checksum, process_catalog)
+from lexical_index import FIELD_WEIGHTS
+from recommender import compile_products, safe_list
+from tag_engine import NO_TAG, TagEngine
+
+if SNAPSHOT_AVAILABLE:
+    from catalog import _arrow_table, _types_mapper
+
+# watchdog es opcional: sin él el CSV se vigila con polling de mtime
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+
+KEY_COLUMN = "sku_id"
+# Columnas de compatibilidad que se vuelven a derivar si cambia atributos_correctos
+TAG_COLUMNS = ("atributos_list", "categoria_detectada", "intencion_detectada")
+# Columnas de las que salen las facetas que no son de precio
+FACET_COLUMNS = ("brand_name", "atributos_correctos") + TAG_COLUMNS
+
+
+# -------- Aplicar cambios --------
+def _key_index(cat: CatalogSnapshot) -> pd.Index:
+    """
+    Índice sku_id -> posición, cacheado en la versión del catálogo. Si el
+    catálogo no trae `sku_id` se usa `slug` (de ahí sale el sku_id); ValueError
+    si no tiene ninguna de las dos.
+    """
+    claves = getattr(cat, "_key_index", None)
+    if claves is None:
+        columna = next((c for c in (KEY_COLUMN, "slug") if c in cat.df.columns), None)
+        if columna is None:
+            raise ValueError(f"El catálogo no tiene '{KEY_COLUMN}' ni 'slug': no admite cambios por clave")
+        claves = pd.Index(cat.df[columna].astype(str).to_numpy(dtype=object))
+        cat._key_index = claves
+    return claves
+
+def _native(value):
+    return value.tolist() if isinstance(value, np.ndarray) else value
+
+def _merged_rows(df: pd.DataFrame, upserts: Dict[str, dict], posiciones: np.ndarray) -> List[dict]:
+    """Fila cruda actual (sin columnas derivadas) + los campos enviados."""
+    crudas = [c for c in df.columns if c not in DERIVED_COLUMNS]
+    existentes = [int(p) for p in posiciones if p >= 0]
+    actuales = iter(df.iloc[existentes][crudas].to_dict("records"))
+    filas = []
+    for (clave, cambios), pos in zip(upserts.items(), posiciones):
+        fila = {c: _native(v) for c, v in next(actuales).items()} if pos >= 0 else {}
+        if "atributos_correctos" in cambios:
+            for col in TAG_COLUMNS:
+                if col not in cambios:
+                    fila.pop(col, None)
+        fila.update(cambios)
+        fila["slug"] = clave  # sku_id se deriva del slug
+        fila.setdefault("atributos_correctos", "")
+        filas.append(fila)
+    return filas
+
+def _align(delta: pd.DataFrame, df: pd.DataFrame) -> pd.DataFrame:
+    """Mismas columnas (y, con snapshot, mismos dtypes Arrow) que el catálogo."""
+    delta = delta.reindex(columns=df.columns).reset_index(drop=True)
+    if not any(isinstance(t, pd.ArrowDtype) for t in df.dtypes):
+        return delta
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.ArrowDtype):
+            delta[col] = delta[col].astype(object)
+    for col in LIST_COLUMNS:
+        if col in delta.columns:
+            delta[col] = delta[col].apply(lambda x: _native(x) if isinstance(x, (list, np.ndarray)) else safe_list(x))
+    alineado = _arrow_table(delta).to_pandas(types_mapper=_types_mapper)
+    for col in df.columns:
+        if col in alineado.columns and alineado[col].dtype != df[col].dtype:
+            try:
+                alineado[col] = alineado[col].astype(df[col].dtype)
+            except (TypeError, ValueError):
+                pass
+    return alineado
+
+def _row_tags(motor: TagEngine, rows: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Tags (cat/intención/atributos) y marcas de las filas pedidas."""
+    rows = np.asarray(list(rows), dtype=np.int64)
+    if not len(rows):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    attrs = [motor.attr_indices[motor.attr_indptr[r]:motor.attr_indptr[r + 1]] for r in rows]
+    tags = np.concatenate([motor.cat_ids[rows], motor.intent_ids[rows], *attrs]).astype(np.int64)
+    return tags[tags != NO_TAG], np.asarray(motor.brand_ids[rows], dtype=np.int64)
+
+def delta_key(item: dict) -> str:
+    """Clave de un producto del delta (`sku_id`, o `slug` como en el CSV); ValueError si no tiene."""
+    clave = item.get(KEY_COLUMN, item.get("slug"))
+    if clave is None or (isinstance(clave, float) and np.isnan(clave)):
+        raise ValueError(f"Producto sin '{KEY_COLUMN}' ni 'slug': {item}")
+    return str(clave)
+
+def next_version(version: Optional[str], delta: dict) -> str:
+    """Versión encadenada: misma secuencia de cambios -> misma versión en todos los procesos."""
+    h = hashlib.sha256((version or "").encode("utf-8"))
+    h.update(json.dumps(delta, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+def apply_delta(cat: CatalogSnapshot, upserts: List[dict], deletes: Iterable[str] = ()) -> Tuple[CatalogSnapshot, dict]:
+    """
+    Devuelve (versión nueva del catálogo, resumen). `upserts` son productos con el
+    esquema del CSV identificados por `sku_id` o `slug` (se pueden mandar sólo los
+    campos que cambian); `deletes` son sku_ids. Si una clave viene en los dos,
+    gana el delete.
+    """
+    t0 = time.perf_counter()
+    df, motor = cat.df, cat.motor
+    n = len(df)
+
+    borrar = {str(k) for k in deletes}
+    por_clave: Dict[str, dict] = {}
+    for item in upserts:
+        clave = delta_key(item)
+        if clave not in borrar:
+            cambios = {k: v for k, v in item.items() if k != KEY_COLUMN}
+            por_clave[clave] = {**por_clave.get(clave, {}), **cambios}
+
+    claves = _key_index(cat)
+    pos_upd = claves.get_indexer(list(por_clave)) if por_clave else np.empty(0, dtype=np.int64)
+    pos_del = claves.get_indexer(list(borrar)) if borrar else np.empty(0, dtype=np.int64)
+    no_encontrados = [k for k, p in zip(borrar, pos_del) if p < 0]
+    pos_del = pos_del[pos_del >= 0]
+
+    # Sólo las filas que cambian pasan por process_catalog y el compilador de tags
+    if por_clave:
+        delta_df = _align(process_catalog(pd.DataFrame(_merged_rows(df, por_clave, pos_upd))), df)
+    else:
+        delta_df = df.iloc[:0]
+    delta_motor = compile_products(delta_df)
+
+    # Orden nuevo sobre [filas viejas..., filas del delta...]: las actualizadas
+    # quedan en su lugar, las nuevas al final, las borradas afuera
+    existentes = pos_upd >= 0
+    origen = np.arange(n)
+    origen[pos_upd[existentes]] = n + np.flatnonzero(existentes)
+    keep = np.ones(n, dtype=bool)
+    keep[pos_del] = False
+    sel = np.concatenate((origen[keep], n + np.flatnonzero(~existentes)))
+
+    nuevo_motor = TagEngine.concat_take(motor, delta_motor, sel)
+    old_to_new = np.full(n, -1, dtype=np.int64)
+    old_to_new[keep] = np.arange(int(keep.sum()))
+    if motor.index is not None:
+        filas_delta = np.flatnonzero(sel >= n)
+        tags_viejos, marcas_viejas = _row_tags(motor, np.concatenate((pos_upd[existentes], pos_del)))
+        tags_nuevos, marcas_nuevas = _row_tags(nuevo_motor, filas_delta)
+        nuevo_motor.index = motor.index.updated(
+            nuevo_motor, old_to_new,
+            np.concatenate((tags_viejos, tags_nuevos)),
+            np.concatenate((marcas_viejas, marcas_nuevas)),
+        )
+
+    nuevo_df = pd.concat([df, delta_df], ignore_index=True).iloc[sel].reset_index(drop=True)
+    version = next_version(cat.checksum, {"upserts": upserts, "deletes": sorted(borrar)})
+    resumen = {
+        "version": version,
+        "actualizados": int(existentes.sum()),
+        "insertados": int((~existentes).sum()),
+        "borrados": int(len(pos_del)),
+        "no_encontrados": no_encontrados,
+        "productos": len(nuevo_df),
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+    nuevo = CatalogSnapshot(df=nuevo_df, motor=nuevo_motor, checksum=version, path=cat.path)
+    mismas_filas = not len(pos_del) and bool(existentes.all())
+    _carry_lexical(cat, nuevo, por_clave.values(), old_to_new, mismas_filas)
+    _carry_facets(cat, nuevo, por_clave.values(), mismas_filas)
+    return nuevo, resumen
+
+def _carry_lexical(cat: CatalogSnapshot, nuevo: CatalogSnapshot, cambios: Iterable[dict],
+                   old_to_new: np.ndarray, mismas_filas: bool) -> None:
+    """
+    El BM25 de `cat` pasa a `nuevo` sin rearmarlo: igual si el delta no toca
+    los campos indexados ni las filas (p.ej. sólo precios); si no, renumerado
+    y marcado como pendiente de rearmar (`rebuild_lexical`).
+    """
+    if cat.lexico is None or cat.lexico.n_docs != len(cat.df):
+        return
+    if mismas_filas and not any(campo in c for c in cambios for campo in FIELD_WEIGHTS):
+        nuevo.lexico = cat.lexico
+        nuevo.lexico_pendiente = cat.lexico_pendiente
+    else:
+        nuevo.lexico = cat.lexico.remapped(old_to_new, len(nuevo.df))
+        nuevo.lexico_pendiente = True
+
+def _carry_facets(cat: CatalogSnapshot, nuevo: CatalogSnapshot, cambios: Iterable[dict],
+                  mismas_filas: bool) -> None:
+    """
+    Si el delta no toca filas, marcas ni tags, las facetas de `cat` siguen
+    valiendo salvo la de precio: `nuevo.facets()` rearma sólo ésa.
+    """
+    previas = cat.facetas if cat.facetas is not None else cat.facetas_previas
+    if previas is None or previas.n_products != len(cat.df) or not mismas_filas:
+        return
+    if not any(campo in c for c in cambios for campo in FACET_COLUMNS):
+        nuevo.facetas_previas = previas
+
+
+# -------- Journal --------
+def journal_path(csv_path: str, checksum: str) -> str:
+    return f"{os.path.splitext(csv_path)[0]}.deltas-{checksum[:16]}.jsonl"
+
+class DeltaJournal:
+    """
+    Archivo JSONL append-only con los cambios aplicados sobre una versión del CSV.
+    Cada proceso recuerda hasta qué byte leyó; `pending()` es un stat barato.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.csv_versions = set()
+
+    def append(self, delta: dict) -> None:
+        linea = json.dumps({"ts": time.time(), **delta}, ensure_ascii=False, default=str) + "\n"
+        # Una sola escritura en modo append: las líneas de distintos procesos no se mezclan
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(linea)
+
+    def pending(self) -> bool:
+        try:
+            return os.path.getsize(self.path) > self.offset
+        except OSError:
+            return False
+
+    def read_new(self) -> List[dict]:
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read()
+        except OSError:
+            return []
+        fin = data.rfind(b"\n") + 1  # una línea a medio escribir se lee la próxima vez
+        self.offset += fin
+        deltas = []
+        for linea in data[:fin].splitlines():
+            if linea.strip():
+                delta = json.loads(linea)
+                csv_sha = delta.get("csv_sha256")
+                if csv_sha:
+                    # Con varios workers vigilando el CSV, el mismo cambio se anota más de una vez
+                    if csv_sha in self.csv_versions:
+                        continue
+                    self.csv_versions.add(csv_sha)
+                deltas.append(delta)
+        return deltas
+
+
+# -------- Vigilancia del CSV --------
+def _csv_rows(csv_path: str) -> Tuple[pd.DataFrame, pd.Series]:
+    """CSV crudo indexado por slug y un hash por fila para detectar cambios."""
+    raw = pd.read_csv(csv_path)
+    raw.index = raw["slug"].astype(str) if "slug" in raw.columns else raw.index.astype(str)
+    return raw, pd.Series(pd.util.hash_pandas_object(raw, index=False).to_numpy(), index=raw.index)
+
+def csv_delta(anterior: pd.Series, raw: pd.DataFrame, hashes: pd.Series) -> dict:
+    """Upserts (filas nuevas o modificadas) y deletes entre dos versiones del CSV."""
+    comunes = hashes.index.intersection(anterior.index)
+    cambiadas = comunes[hashes[comunes].to_numpy() != anterior[comunes].to_numpy()]
+    nuevas = hashes.index.difference(anterior.index)
+    filas = raw.loc[cambiadas.append(nuevas)]
+    upserts = [{k: v for k, v in fila.items() if not (isinstance(v, float) and np.isnan(v))}
+               for fila in filas.to_dict("records")]
+    return {"upserts": upserts, "deletes": list(anterior.index.difference(hashes.index))}
+
+class CsvWatcher:
+    """
+    Vigila el CSV y, cuando cambia, llama `on_delta(delta)` sólo con las filas
+    que cambiaron respecto de la versión anterior del archivo. Usa watchdog si
+    está instalado; si no, polling del mtime cada `interval` segundos.
+    """
+
+    def __init__(self, csv_path: str, on_delta: Callable[[dict], None],
+                 interval: float = 2.0, debounce: float = 1.0):
+        self.csv_path = os.path.abspath(csv_path)
+        self.on_delta = on_delta
+        self.interval = interval
+        self.debounce = debounce
+        _, self._hashes = _csv_rows(self.csv_path)
+        self._stat = self._file_stat()
+        self._timer: Optional[threading.Timer] = None
+        self._observer = None
+        self._stop = threading.Event()
+
+    def _file_stat(self):
+        try:
+            st = os.stat(self.csv_path)
+            return st.st_size, st.st_mtime_ns
+        except OSError:
+            return None
+
+    def start(self) -> None:
+        if WATCHDOG_AVAILABLE:
+            watcher = self
+
+            class Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    rutas = {getattr(event, "src_path", ""), getattr(event, "dest_path", "")}
+                    if watcher.csv_path in {os.path.abspath(r) for r in rutas if r}:
+                        watcher._schedule()
+
+            self._observer = Observer()
+            self._observer.schedule(Handler(), os.path.dirname(self.csv_path))
+            self._observer.daemon = True
+            self._observer.start()
+        else:
+            threading.Thread(target=self._poll, daemon=True, name="csv-watch").start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.interval):
+            if self._file_stat() != self._stat:
+                self._schedule()
+
+    def _schedule(self) -> None:
+        # Los editores escriben en varios pasos: se espera a que el archivo se asiente
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.debounce, self._check)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _check(self) -> None:
+        stat = self._file_stat()
+        if stat is None or stat == self._stat:
+            return
+        try:
+            raw, hashes = _csv_rows(self.csv_path)
+        except Exception as e:
+            print(f"ERROR leyendo el CSV modificado: {e}")
+            return
+        self._stat = stat
+        delta = csv_delta(self._hashes, raw, hashes)
+        self._hashes = hashes
+        if delta["upserts"] or delta["deletes"]:
+            delta["csv_sha256"] = file_checksum(self.csv_path)
+            self.on_delta(delta)
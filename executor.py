@@ -0,0 +1,103 @@
+# executor.py
+from __future__ import annotations
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+# Estrategia para correr el pipeline de búsqueda fuera del event loop:
+#   inline  -> en el mismo hilo del loop (comportamiento original)
+#   thread  -> ThreadPoolExecutor (pandas/numpy sueltan el GIL en buena parte del scoring)
+#   process -> ProcessPoolExecutor; cada worker importa la app y queda con el modelo
+#              y el catálogo ya cargados (con snapshot, el catálogo se comparte por mmap)
+SEARCH_EXECUTOR = os.getenv("SEARCH_EXECUTOR", "thread")
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Requests admitidas a la vez (en ejecución + esperando un worker); por encima -> 503
+SEARCH_MAX_PENDING = int(os.getenv("SEARCH_MAX_PENDING", "64"))
+
+MODES = ("inline", "thread", "process")
+
+
+class ExecutorSaturated(Exception):
+    """Se alcanzó `max_pending`: la request se rechaza en vez de encolarse."""
+
+
+class SearchExecutor:
+    """
+    Corre funciones del pipeline de búsqueda según `mode` y acota cuántas
+    requests pueden estar en vuelo a la vez.
+
+    `admit()` reserva un lugar (o lanza `ExecutorSaturated`) y `run()` ejecuta.
+    En modo process, `initializer` corre una vez en cada worker al arrancar; las
+    funciones que se envían tienen que ser de nivel módulo (se picklean por nombre).
+    """
+
+    def __init__(self,
+                 mode: str = SEARCH_EXECUTOR,
+                 workers: int = SEARCH_WORKERS,
+                 max_pending: int = SEARCH_MAX_PENDING,
+                 initializer: Optional[Callable] = None):
+        if mode not in MODES:
+            raise ValueError(f"SEARCH_EXECUTOR inválido: {mode!r} (opciones: {', '.join(MODES)})")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.initializer = initializer
+        self._pool: Optional[Executor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_pool(self) -> Optional[Executor]:
+        if self._pool is None and self.mode == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="search")
+        elif self._pool is None and self.mode == "process":
+            # spawn y no fork: el proceso padre ya tiene hilos (uvicorn, executor del batcher)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.initializer,
+            )
+        return self._pool
+
+    def start(self) -> None:
+        """Levanta los workers ya (en process, cada uno carga modelo y catálogo al arrancar)."""
+        pool = self._get_pool()
+        if self.mode == "process":
+            for f in [pool.submit(os.getpid) for _ in range(self.workers * 2)]:
+                f.result()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @contextmanager
+    def admit(self):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorSaturated(f"{self.pending} búsquedas en curso (máximo {self.max_pending})")
+        self.pending += 1
+        try:
+            yield
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def run(self, fn: Callable, *args):
+        pool = self._get_pool()
+        if pool is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers if self.mode != "inline" else 0,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
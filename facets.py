@@ -0,0 +1,229 @@
+# facets.py
+"""
+Conteos por faceta (marca, categoría, intención, atributos, rango de precio)
+de los candidatos de una query, sin `groupby` de pandas en cada request.
+
+- Cada faceta guarda el valor de cada fila (`codigos`; con `indptr`, CSR de
+  varios valores por fila: atributos) y, para los valores frecuentes (al menos
+  n / DENSE_RATIO productos), un bitset del catálogo: uint64, un bit por fila.
+  A partir de esa frecuencia el bitset no ocupa más que las filas en int64.
+- `counts(filas)`: con muchos candidatos se empaquetan en un bitset y cada
+  valor frecuente se cuenta con AND + popcount (`np.bitwise_count`); los
+  valores raros, mirando sus filas en la máscara de candidatos. Con pocos
+  candidatos es más barato al revés: `bincount` de los valores de esas filas.
+  Se elige por costo estimado; el resultado es el mismo.
+- Sin candidatos (query vacía) se devuelven los totales, calculados al armar.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from query_constraints import effective_prices
+from tag_engine import TagEngine, NO_TAG
+from topk import top_k_indices
+
+DENSE_RATIO = 64
+FACET_LIMIT = 10
+# Costo aproximado (ns) de cada operación, para elegir cómo contar: leer el valor
+# de una fila y sumarlo (en CSR, por valor), AND + popcount de una palabra del
+# bitset, y armar la máscara de candidatos (por producto del catálogo / por candidato)
+COSTO_FILA = 5.0
+COSTO_FILA_CSR = 20.0
+COSTO_PALABRA = 2.0
+COSTO_MASCARA = (0.1, 2.0)
+# Cortes de los rangos de precio (pesos)
+PRICE_BUCKETS = (100_000, 250_000, 500_000, 1_000_000, 2_000_000)
+
+
+def _pesos(x: float) -> str:
+    return "$" + f"{x:,.0f}".replace(",", ".")
+
+
+def price_bucket_labels(cortes: Sequence[float] = PRICE_BUCKETS) -> List[str]:
+    """"Hasta $100.000", "$100.000 - $250.000", ..., "Más de $2.000.000"."""
+    if not len(cortes):
+        return ["Todos"]
+    labels = [f"Hasta {_pesos(cortes[0])}"]
+    labels += [f"{_pesos(a)} - {_pesos(b)}" for a, b in zip(cortes[:-1], cortes[1:])]
+    return labels + [f"Más de {_pesos(cortes[-1])}"]
+
+
+def _empaquetar(mascara: np.ndarray) -> np.ndarray:
+    """Máscara booleana -> bitset uint64 (la fila i es el bit i % 64 de la palabra i // 64)."""
+    octetos = np.packbits(mascara, bitorder="little")
+    relleno = (-len(octetos)) % 8
+    if relleno:
+        octetos = np.concatenate((octetos, np.zeros(relleno, dtype=np.uint8)))
+    return octetos.view("<u8")
+
+
+def _compactar(ids: np.ndarray, vocab: List[str]) -> Tuple[List[str], np.ndarray]:
+    """IDs del vocabulario del motor -> códigos 0..k-1 de los valores presentes (-1 = sin valor)."""
+    ids = np.asarray(ids)
+    presentes = [int(t) for t in np.unique(ids[ids != NO_TAG]) if vocab[t]]
+    mapa = np.full(len(vocab) + 1, -1, dtype=np.int32)  # el último casillero es NO_TAG
+    mapa[presentes] = np.arange(len(presentes), dtype=np.int32)
+    return [vocab[t] for t in presentes], mapa[ids]
+
+
+def _faceta_precio(precios: np.ndarray, cortes: Sequence[float]) -> "Facet":
+    precios = np.asarray(precios)
+    rango = np.where(np.isfinite(precios), np.searchsorted(np.asarray(cortes), precios, side="right"), -1)
+    return Facet(price_bucket_labels(cortes), rango, ordenada=True)
+
+
+class Facet:
+    """Valores de una faceta por fila + bitsets de los valores frecuentes."""
+
+    def __init__(self, valores: List[str], codigos: np.ndarray, indptr: Optional[np.ndarray] = None,
+                 ordenada: bool = False):
+        self.valores = list(valores)
+        self.codigos = np.asarray(codigos, dtype=np.int32)
+        self.indptr = indptr
+        self.ordenada = ordenada  # rangos de precio: se listan en su orden, no por cantidad
+        n = len(self.codigos) if indptr is None else len(indptr) - 1
+        self.n_products = n
+
+        filas = np.arange(n) if indptr is None else np.repeat(np.arange(n), np.diff(indptr))
+        validos = self.codigos >= 0
+        filas, cods = filas[validos], self.codigos[validos]
+        self.totales = np.bincount(cods, minlength=len(self.valores))
+        self.densos = np.flatnonzero(self.totales * DENSE_RATIO >= max(n, 1))
+
+        orden = np.argsort(cods, kind="stable")
+        filas, cods = filas[orden], cods[orden]
+        cortes = np.searchsorted(cods, np.arange(len(self.valores) + 1))
+        self.bits = np.zeros((len(self.densos), (n + 63) // 64), dtype=np.uint64)
+        mascara = np.zeros(n, dtype=bool)
+        for i, v in enumerate(self.densos):
+            mascara[:] = False
+            mascara[filas[cortes[v]:cortes[v + 1]]] = True
+            self.bits[i] = _empaquetar(mascara)
+        es_denso = np.zeros(len(self.valores) + 1, dtype=bool)
+        es_denso[self.densos] = True
+        raros = ~es_denso[cods]
+        self.raros_filas, self.raros_codigos = filas[raros], cods[raros]
+
+    # Costo estimado de cada forma de contar (ver COSTO_*)
+    def costo_filas(self, n_filas: int) -> float:
+        if self.indptr is None:
+            return n_filas * COSTO_FILA
+        return n_filas * COSTO_FILA_CSR * len(self.codigos) / max(self.n_products, 1)
+
+    def costo_bits(self) -> float:
+        return self.bits.size * COSTO_PALABRA + len(self.raros_filas) * COSTO_FILA
+
+    def contar_filas(self, filas: np.ndarray) -> np.ndarray:
+        if self.indptr is None:
+            cods = self.codigos[filas]
+        else:
+            ini = self.indptr[filas]
+            largos = self.indptr[filas + 1] - ini
+            # Posiciones de todos los rangos [ini, ini + largo) en una sola indexación
+            pos = np.repeat(ini - np.cumsum(largos) + largos, largos) + np.arange(largos.sum())
+            cods = self.codigos[pos]
+        return np.bincount(cods[cods >= 0], minlength=len(self.valores))
+
+    def contar_bits(self, bits: np.ndarray, mascara: np.ndarray) -> np.ndarray:
+        cuenta = np.zeros(len(self.valores), dtype=np.int64)
+        if len(self.densos):
+            cuenta[self.densos] = np.bitwise_count(self.bits & bits).sum(axis=1, dtype=np.int64)
+        if len(self.raros_filas):
+            cuenta += np.bincount(self.raros_codigos[mascara[self.raros_filas]], minlength=len(self.valores))
+        return cuenta
+
+    def top(self, cuenta: np.ndarray, limit: int) -> List[Dict[str, Any]]:
+        if self.ordenada:
+            idx = np.flatnonzero(cuenta)
+        else:
+            idx = top_k_indices(cuenta, limit)
+            idx = idx[cuenta[idx] > 0]
+        return [{"value": self.valores[i], "count": int(cuenta[i])} for i in idx]
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.codigos, self.bits, self.raros_filas, self.raros_codigos, self.indptr)
+        return int(sum(a.nbytes for a in arrays if a is not None))
+
+
+class FacetIndex:
+    """Facetas del catálogo; `counts(filas)` para los candidatos de una query."""
+
+    def __init__(self, facetas: Dict[str, Facet], n_products: int, cortes: Sequence[float] = PRICE_BUCKETS):
+        self.facetas = facetas
+        self.n_products = int(n_products)
+        self.cortes = tuple(cortes)
+
+    @classmethod
+    def from_catalog(cls, df: pd.DataFrame, motor: TagEngine, precios: Optional[np.ndarray] = None,
+                     cortes: Sequence[float] = PRICE_BUCKETS) -> "FacetIndex":
+        """
+        Marca (las del motor, con el nombre tal como está en el catálogo),
+        categoría, intención, atributos (sin repetir dentro de una fila) y rango
+        de precio efectivo (`precios`, p.ej. los de `FilterIndex`; si no, se calculan).
+        """
+        n = motor.n_products
+        facetas = {}
+        if motor.brand_vocab and "brand_name" in df.columns:
+            nombres = df["brand_name"].astype(object)
+            con_marca = nombres.notna().to_numpy() & (nombres.astype(str).str.strip() != "").to_numpy()
+            brand_ids = np.where(con_marca, np.asarray(motor.brand_ids), NO_TAG)
+            ids, primera = np.unique(brand_ids, return_index=True)
+            primera = primera[ids != NO_TAG]
+            # Nombre visible de cada marca: el de su primera fila
+            vocab = [""] * len(motor.brand_vocab)
+            for fila in primera.tolist():
+                vocab[brand_ids[fila]] = str(nombres.iloc[fila]).strip()
+            facetas["brand_name"] = Facet(*_compactar(brand_ids, vocab))
+        facetas["categoria_detectada"] = Facet(*_compactar(motor.cat_ids, motor.vocab))
+        facetas["intencion_detectada"] = Facet(*_compactar(motor.intent_ids, motor.vocab))
+
+        # Atributos: CSR propio sólo con la primera aparición de cada tag en su fila
+        primeros = np.asarray(motor.attr_first)
+        fila_attr = np.repeat(np.arange(n), np.diff(motor.attr_indptr))[primeros]
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(fila_attr, minlength=n), out=indptr[1:])
+        valores, codigos = _compactar(np.asarray(motor.attr_indices)[primeros], motor.vocab)
+        facetas["atributos_list"] = Facet(valores, codigos, indptr)
+
+        facetas["precio"] = _faceta_precio(effective_prices(df) if precios is None else precios, cortes)
+        return cls(facetas, n, cortes)
+
+    def with_prices(self, precios: np.ndarray) -> "FacetIndex":
+        """Las mismas facetas (compartidas, no se copian) con la de precio rearmada para `precios`."""
+        return FacetIndex({**self.facetas, "precio": _faceta_precio(precios, self.cortes)},
+                          self.n_products, self.cortes)
+
+    def counts(self, filas: Optional[np.ndarray] = None, limit: int = FACET_LIMIT,
+               metodo: str = "auto") -> Dict[str, List[Dict[str, Any]]]:
+        """
+        {faceta: [{"value", "count"}, ...]} de los candidatos `filas` (None = todo
+        el catálogo): los `limit` valores con más productos, sólo los que tienen
+        alguno; los rangos de precio van todos y en orden.
+        `metodo`: "auto", "bits" o "filas" (forzar uno, p.ej. para medirlos).
+        """
+        if filas is None:
+            return {nombre: f.top(f.totales, limit) for nombre, f in self.facetas.items()}
+        filas = np.asarray(filas, dtype=np.int64)
+        mascara = bits = None
+        res = {}
+        for nombre, f in self.facetas.items():
+            # La máscara de candidatos se arma una vez (n bytes + empaquetarla) y sirve para todas
+            armar = 0.0 if bits is not None else COSTO_MASCARA[0] * self.n_products + COSTO_MASCARA[1] * len(filas)
+            if metodo == "filas" or (metodo == "auto" and f.costo_filas(len(filas)) <= f.costo_bits() + armar):
+                cuenta = f.contar_filas(filas)
+            else:
+                if bits is None:
+                    mascara = np.zeros(self.n_products, dtype=bool)
+                    mascara[filas] = True
+                    bits = _empaquetar(mascara)
+                cuenta = f.contar_bits(bits, mascara)
+            res[nombre] = f.top(cuenta, limit)
+        return res
+
+    def stats(self) -> Dict[str, Any]:
+        return {"facetas": {nombre: {"valores": len(f.valores), "bitsets": len(f.densos)}
+                            for nombre, f in self.facetas.items()},
+                "bytes": sum(f.nbytes for f in self.facetas.values())}
@@ -0,0 +1,275 @@
+# inverted_index.py
+from __future__ import annotations
+import json
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+
+def _smallest_uint(max_value: int) -> np.dtype:
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+class PostingList:
+    """
+    Lista ordenada de IDs de producto comprimida por deltas.
+    Guarda el primer ID y las diferencias en el dtype entero más chico que alcance
+    (en catálogos densos casi siempre uint8).
+    """
+    __slots__ = ("first", "deltas", "size")
+
+    def __init__(self, rows: np.ndarray):
+        rows = np.asarray(rows, dtype=np.int64)
+        self.size = len(rows)
+        self.first = int(rows[0]) if self.size else 0
+        diffs = np.diff(rows)
+        self.deltas = diffs.astype(_smallest_uint(int(diffs.max()) if len(diffs) else 0))
+
+    @classmethod
+    def from_parts(cls, first: int, deltas: np.ndarray) -> "PostingList":
+        pl = cls.__new__(cls)
+        pl.first, pl.deltas, pl.size = int(first), deltas, len(deltas) + 1
+        return pl
+
+    def __len__(self) -> int:
+        return self.size
+
+    def decode(self) -> np.ndarray:
+        if not self.size:
+            return np.empty(0, dtype=np.int64)
+        out = np.empty(self.size, dtype=np.int64)
+        out[0] = self.first
+        np.cumsum(self.deltas, dtype=np.int64, out=out[1:])
+        out[1:] += self.first
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return self.deltas.nbytes + 8
+
+
+class InvertedIndex:
+    """
+    Índice invertido tag -> productos construido desde un `TagEngine`.
+
+    Un producto aparece en la posting de un tag si lo tiene como categoría,
+    intención o atributo. También indexa marcas normalizadas (`brand_ids`).
+    `attr_max_mult` guarda cuántas veces como máximo se repite un tag dentro
+    de un mismo `atributos_list` (sirve para las cotas de MaxScore).
+    """
+
+    def __init__(self,
+                 tag_postings: Dict[int, PostingList],
+                 brand_postings: Dict[int, PostingList],
+                 n_products: int,
+                 in_cat: np.ndarray,
+                 in_intent: np.ndarray,
+                 attr_max_mult: np.ndarray):
+        self.tag_postings = tag_postings
+        self.brand_postings = brand_postings
+        self.n_products = n_products
+        self.in_cat = in_cat
+        self.in_intent = in_intent
+        self.attr_max_mult = attr_max_mult
+
+    @staticmethod
+    def _group(keys: np.ndarray, rows: np.ndarray) -> Dict[int, PostingList]:
+        """Agrupa pares (key, row) en postings ordenadas y sin duplicados."""
+        validos = keys >= 0
+        keys, rows = keys[validos].astype(np.int64), rows[validos].astype(np.int64)
+        if not len(keys):
+            return {}
+        n = int(rows.max()) + 1
+        pares = np.unique(keys * n + rows)
+        keys, rows = pares // n, pares % n
+        cortes = np.flatnonzero(np.diff(keys)) + 1
+        return {
+            int(k[0]): PostingList(r)
+            for k, r in zip(np.split(keys, cortes), np.split(rows, cortes))
+        }
+
+    @classmethod
+    def _tag_stats(cls, motor, tags: Optional[np.ndarray] = None) -> Tuple[Dict[int, PostingList], np.ndarray]:
+        """
+        Postings y multiplicidad máxima en atributos de los tags de `motor`
+        (sólo los marcados en la máscara `tags`, de largo n_tags+1, si se pasa).
+        """
+        n = motor.n_products
+        fila_attr = np.repeat(np.arange(n), np.diff(motor.attr_indptr))
+        primeros = motor.attr_first
+        attr_indices = np.asarray(motor.attr_indices)
+
+        keys = np.concatenate((motor.cat_ids, motor.intent_ids, attr_indices[primeros]))
+        rows = np.concatenate((np.arange(n), np.arange(n), fila_attr[primeros]))
+        validos = attr_indices >= 0
+        if tags is not None:
+            sel = tags[keys]
+            keys, rows = keys[sel], rows[sel]
+            validos &= tags[attr_indices]
+
+        # Multiplicidad máxima de cada tag dentro de una fila de atributos
+        attr_max_mult = np.zeros(motor.n_tags + 1, dtype=np.int64)
+        if validos.any():
+            pares, cuenta = np.unique(
+                attr_indices[validos].astype(np.int64) * max(n, 1) + fila_attr[validos],
+                return_counts=True,
+            )
+            np.maximum.at(attr_max_mult, pares // max(n, 1), cuenta)
+        return cls._group(keys, rows), attr_max_mult
+
+    @staticmethod
+    def _blocks(motor) -> Tuple[np.ndarray, np.ndarray]:
+        """Máscaras de tags que aparecen como categoría / intención en algún producto."""
+        in_cat = np.zeros(motor.n_tags + 1, dtype=bool)
+        in_cat[motor.cat_ids] = True
+        in_intent = np.zeros(motor.n_tags + 1, dtype=bool)
+        in_intent[motor.intent_ids] = True
+        in_cat[-1] = in_intent[-1] = False
+        return in_cat, in_intent
+
+    @classmethod
+    def from_engine(cls, motor) -> "InvertedIndex":
+        tag_postings, attr_max_mult = cls._tag_stats(motor)
+        in_cat, in_intent = cls._blocks(motor)
+        return cls(
+            tag_postings=tag_postings,
+            brand_postings=cls._group(motor.brand_ids, np.arange(motor.n_products)),
+            n_products=motor.n_products,
+            in_cat=in_cat,
+            in_intent=in_intent,
+            attr_max_mult=attr_max_mult,
+        )
+
+    def updated(self, motor, old_to_new: np.ndarray, tags: np.ndarray, brands: np.ndarray) -> "InvertedIndex":
+        """
+        Índice de `motor` (una versión nueva del catálogo) reutilizando este.
+
+        `old_to_new`: fila vieja -> fila nueva (-1 si se borró). `tags` / `brands`:
+        IDs tocados por el cambio (los de las filas borradas o reemplazadas, antes
+        y después). Sólo esas postings se recalculan; el resto se comparte tal cual
+        o, si hubo borrados, se renumera. No modifica este índice.
+        """
+        tocados = np.zeros(motor.n_tags + 1, dtype=bool)
+        tocados[np.asarray(tags, dtype=np.int64)] = True
+        tocados[-1] = False
+        n_viejo = len(old_to_new)
+        identidad = bool(np.array_equal(old_to_new, np.arange(n_viejo)))
+
+        def renumerar(pl: PostingList) -> PostingList:
+            return pl if identidad else PostingList(old_to_new[pl.decode()])
+
+        nuevas, attr_max_mult = self._tag_stats(motor, tocados)
+        tag_postings = {t: renumerar(pl) for t, pl in self.tag_postings.items() if not tocados[t]}
+        tag_postings.update(nuevas)
+
+        marcas = set(int(b) for b in brands if b >= 0)
+        brand_postings = {b: renumerar(pl) for b, pl in self.brand_postings.items() if b not in marcas}
+        if marcas:
+            filas = np.flatnonzero(np.isin(motor.brand_ids, list(marcas)))
+            brand_postings.update(self._group(motor.brand_ids[filas], filas))
+
+        n_tags_viejo = len(self.attr_max_mult) - 1
+        attr_max_mult[:n_tags_viejo] = np.where(tocados[:n_tags_viejo], attr_max_mult[:n_tags_viejo],
+                                                self.attr_max_mult[:n_tags_viejo])
+        in_cat, in_intent = self._blocks(motor)
+        return InvertedIndex(
+            tag_postings=tag_postings,
+            brand_postings=brand_postings,
+            n_products=motor.n_products,
+            in_cat=in_cat,
+            in_intent=in_intent,
+            attr_max_mult=attr_max_mult,
+        )
+
+    # ---------- Persistencia ----------
+    def save(self, path: str) -> None:
+        """
+        Todas las postings concatenadas en `postings.bin` (bytes crudos de los deltas)
+        más una tabla con (grupo, clave, primer ID, offset, largo, dtype) por posting.
+        """
+        os.makedirs(path, exist_ok=True)
+        tabla, offset = [], 0
+        with open(os.path.join(path, "postings.bin"), "wb") as f:
+            for grupo, postings in (("tag", self.tag_postings), ("brand", self.brand_postings)):
+                for key, pl in postings.items():
+                    f.write(pl.deltas.tobytes())
+                    tabla.append([grupo, key, pl.first, offset, len(pl.deltas), pl.deltas.dtype.str])
+                    offset += pl.deltas.nbytes
+        with open(os.path.join(path, "postings.json"), "w", encoding="utf-8") as f:
+            json.dump({"n_products": self.n_products, "postings": tabla}, f)
+        np.save(os.path.join(path, "in_cat.npy"), self.in_cat)
+        np.save(os.path.join(path, "in_intent.npy"), self.in_intent)
+        np.save(os.path.join(path, "attr_max_mult.npy"), self.attr_max_mult)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "InvertedIndex":
+        with open(os.path.join(path, "postings.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        bin_path = os.path.join(path, "postings.bin")
+        if mmap and os.path.getsize(bin_path):
+            buffer = np.memmap(bin_path, dtype=np.uint8, mode="r")
+        else:
+            buffer = np.fromfile(bin_path, dtype=np.uint8)
+        grupos: Dict[str, Dict[int, PostingList]] = {"tag": {}, "brand": {}}
+        for grupo, key, first, offset, count, dtype in meta["postings"]:
+            deltas = buffer[offset:offset + count * np.dtype(dtype).itemsize].view(dtype)
+            grupos[grupo][key] = PostingList.from_parts(first, deltas)
+        mode = "r" if mmap else None
+        return cls(
+            tag_postings=grupos["tag"],
+            brand_postings=grupos["brand"],
+            n_products=meta["n_products"],
+            in_cat=np.load(os.path.join(path, "in_cat.npy"), mmap_mode=mode),
+            in_intent=np.load(os.path.join(path, "in_intent.npy"), mmap_mode=mode),
+            attr_max_mult=np.load(os.path.join(path, "attr_max_mult.npy"), mmap_mode=mode),
+        )
+
+    # ---------- Consultas ----------
+    def postings(self, tag_id: int) -> np.ndarray:
+        pl = self.tag_postings.get(tag_id)
+        return pl.decode() if pl is not None else np.empty(0, dtype=np.int64)
+
+    def brand_rows(self, brand_id: int) -> np.ndarray:
+        pl = self.brand_postings.get(brand_id)
+        return pl.decode() if pl is not None else np.empty(0, dtype=np.int64)
+
+    def posting_size(self, tag_ids: Iterable[int]) -> int:
+        """Cota superior de la cantidad de candidatos (suma de largos, sin decodificar)."""
+        return sum(len(self.tag_postings[t]) for t in tag_ids if t in self.tag_postings)
+
+    def union(self, tag_ids: Iterable[int]) -> np.ndarray:
+        """Productos que tienen al menos uno de los tags (ordenados, sin duplicados)."""
+        listas = [self.postings(t) for t in tag_ids if t in self.tag_postings]
+        if not listas:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(listas))
+
+    def stats(self) -> Tuple[int, int]:
+        """(cantidad de postings, bytes que ocupan)"""
+        todas = list(self.tag_postings.values()) + list(self.brand_postings.values())
+        return len(todas), sum(pl.nbytes for pl in todas)
+
+
+# Por encima de esta fracción del catálogo, decodificar y unir postings cuesta
+# más que el scan vectorizado completo.
+MAX_CANDIDATE_FRACTION = 0.3
+
+
+def fill_with_zero_rows(positivos: np.ndarray, k: int, universo_n: int,
+                        universo: np.ndarray | None = None) -> np.ndarray:
+    """
+    Completa hasta k con las primeras filas (en orden de catálogo) que no están
+    en `positivos`: son las que tendrían score 0 en un scan completo.
+    """
+    falta = k - len(positivos)
+    if falta <= 0:
+        return np.empty(0, dtype=np.int64)
+    if universo is None:
+        primeras = np.arange(min(universo_n, falta + len(positivos)))
+    else:
+        primeras = universo[:falta + len(positivos)]
+    return np.setdiff1d(primeras, positivos, assume_unique=True)[:falta]
@@ -0,0 +1,104 @@
+# json_api.py
+from __future__ import annotations
+import base64
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# orjson es opcional: serializa bastante más rápido que json (y devuelve bytes)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Campos que devuelve /api/search si no se pide `fields`
+DEFAULT_FIELDS = ["title", "brand_name", "list_price", "categoria_detectada",
+                  "intencion_detectada", "relevance_score"]
+# Campos calculados por la búsqueda (no son columnas del catálogo)
+SCORE_FIELDS = ("relevance_score", "similitud")
+# Columnas del catálogo que no se exponen (dicts intermedios, pesados)
+HIDDEN_FIELDS = ("parsed_attributes",)
+
+
+def dumps(obj) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def parse_fields(fields: Optional[str], available: Iterable[str]) -> List[str]:
+    """'title,list_price' -> ['title', 'list_price']; ValueError si alguno no existe."""
+    if not fields:
+        return [f for f in DEFAULT_FIELDS if f in available or f in SCORE_FIELDS]
+    pedidos = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    disponibles = (set(available) | set(SCORE_FIELDS)) - set(HIDDEN_FIELDS)
+    invalidos = [f for f in pedidos if f not in disponibles]
+    if invalidos:
+        raise ValueError(f"Campos desconocidos: {', '.join(invalidos)}")
+    return pedidos
+
+
+def _column_values(col: pd.Series) -> list:
+    """Valores de una columna como tipos nativos (NaN -> None, arrays -> listas)."""
+    if col.dtype.kind == "f":
+        return col.astype(object).where(col.notna(), None).tolist()
+    valores = col.tolist()
+    if valores and isinstance(valores[0], np.ndarray):
+        valores = [v.tolist() for v in valores]
+    return valores
+
+
+def project_records(df: pd.DataFrame, rows: np.ndarray, fields: List[str],
+                    scores: Optional[Dict[str, np.ndarray]] = None) -> list:
+    """
+    Arma los registros de las filas `rows` (posiciones en `df`) leyendo sólo las
+    columnas pedidas: un take por columna, sin convertir filas enteras. Los campos
+    calculados (`relevance_score`, ...) salen de `scores`.
+    """
+    scores = scores or {}
+    columnas = []
+    for field in fields:
+        if field in scores:
+            col = pd.Series(scores[field])
+        elif field in SCORE_FIELDS or field not in df.columns:
+            col = pd.Series([None] * len(rows), dtype=object)
+        else:
+            col = df[field].iloc[rows]
+        columnas.append(_column_values(col))
+    return [dict(zip(fields, fila)) for fila in zip(*columnas)]
+
+
+def encode_cursor(state: dict) -> str:
+    """Cursor opaco (base64 url-safe) con el estado de la paginación."""
+    return base64.urlsafe_b64encode(dumps(state)).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        state = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+    if not isinstance(state, dict):
+        raise ValueError("Cursor inválido")
+    return state
+
+
+def etag_for(*parts) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return f'"{h.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Compara contra If-None-Match (lista de ETags, '*' o prefijo débil W/)."""
+    if not if_none_match:
+        return False
+    candidatos = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidatos or any(c.removeprefix("W/") == etag for c in candidatos)
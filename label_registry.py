@@ -0,0 +1,106 @@
+# label_registry.py
+from __future__ import annotations
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List
+from unicodedata import normalize as uni_normalize
+
+from tag_engine import NO_TAG
+
+META_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "es_ecommerce_classifier", "meta.json")
+# Strings desconocidos (ni del modelo ni del catálogo) que se recuerdan ya normalizados
+LABEL_MEMO_SIZE = int(os.getenv("LABEL_MEMO_SIZE", "4096"))
+
+
+def normalize_label(label) -> str:
+    """
+    Normaliza labels del modelo:
+    - Mayúsculas
+    - Sin acentos
+    - Espacios/guiones -> _
+    - Colapsa prefijos duplicados (CAT_CAT_ -> CAT_, INT_INT_ -> INT_, ATTR_ATTR_ -> ATTR_)
+    - Colapsa underscores repetidos
+    """
+    if not isinstance(label, str):
+        label = str(label)
+    s = label.strip().upper()
+    s = uni_normalize("NFKD", s).encode("ascii", "ignore").decode("ascii")
+    s = re.sub(r"[ \-./:;,]+", "_", s)            # separadores -> _
+    s = re.sub(r"^(CAT_)+", "CAT_", s)            # CAT_CAT_... -> CAT_
+    s = re.sub(r"^(INT_)+", "INT_", s)            # INT_INT_... -> INT_
+    s = re.sub(r"^(ATTR_)+", "ATTR_", s)          # ATTR_ATTR_... -> ATTR_
+    s = re.sub(r"_+", "_", s)                     # varios __ -> _
+    s = s.strip("_")
+    return s
+
+
+def model_labels(meta_path: str = META_PATH) -> List[str]:
+    """Labels crudos del clasificador (p.ej. 'CAT_CAT_NOTEBOOK') según su meta.json."""
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return list(json.load(f)["labels"]["textcat_multilabel"])
+    except (OSError, KeyError, ValueError):
+        return []
+
+
+class LabelRegistry:
+    """
+    Tabla precalculada label crudo -> label canónico (`normalize_label`) y
+    -> ID de tag del motor.
+
+    Se arma una vez con los labels del modelo y el vocabulario del catálogo, así
+    que en el camino caliente normalizar es un lookup en un dict, sin regex ni
+    NFKD. Lo que no está en la tabla pasa por un memo LRU acotado.
+    """
+
+    def __init__(self, labels: Iterable[str] = (), memo_size: int = LABEL_MEMO_SIZE):
+        self.canonical: Dict[str, str] = {}
+        self.ids: Dict[str, int] = {}
+        self.motor = None
+        self._normalize = lru_cache(maxsize=memo_size)(normalize_label)
+        self.add(labels)
+
+    @classmethod
+    def from_sources(cls, vocab: Iterable[str] = (), meta_path: str = META_PATH) -> "LabelRegistry":
+        """Labels del modelo (meta.json) + vocabulario de tags del catálogo."""
+        registro = cls(model_labels(meta_path))
+        registro.add(vocab)
+        return registro
+
+    def add(self, labels: Iterable[str]) -> None:
+        for raw in labels:
+            if isinstance(raw, str) and raw not in self.canonical:
+                canon = normalize_label(raw)
+                self.canonical[raw] = canon
+                # El label canónico también se resuelve con un lookup directo
+                self.canonical.setdefault(canon, canon)
+
+    def bind(self, motor) -> None:
+        """Resuelve cada label conocido al ID de tag de `motor` (NO_TAG si no está)."""
+        self.motor = motor
+        self.ids = {raw: motor.tag_id(canon) for raw, canon in self.canonical.items()}
+
+    def clean(self, label) -> str:
+        canon = self.canonical.get(label) if isinstance(label, str) else None
+        if canon is None:
+            canon = self._normalize(label if isinstance(label, str) else str(label))
+        return canon
+
+    def tag_id(self, label: str) -> int:
+        """ID en el motor de `bind` (NO_TAG si no hay motor o el tag no está en el catálogo)."""
+        tid = self.ids.get(label)
+        if tid is None:
+            tid = self.motor.tag_id(self.clean(label)) if self.motor is not None else NO_TAG
+        return tid
+
+    def clean_scores(self, raw_predictions: Dict[str, float]) -> Dict[str, float]:
+        """doc.cats con los labels ya canónicos."""
+        canonical = self.canonical
+        return {canonical.get(k) or self.clean(k): float(v) for k, v in raw_predictions.items()}
+
+    def stats(self) -> Dict[str, int]:
+        memo = self._normalize.cache_info()
+        return {"known": len(self.canonical), "memo_size": memo.currsize,
+                "memo_hits": memo.hits, "memo_misses": memo.misses}
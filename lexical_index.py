@@ -0,0 +1,234 @@
+# lexical_index.py
+from __future__ import annotations
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from unicodedata import normalize as uni_normalize
+
+import numpy as np
+import pandas as pd
+
+from topk import top_k_indices
+
+# Peso de cada campo en la frecuencia del término (BM25F simplificado)
+FIELD_WEIGHTS = {"title": 1.0, "brand_name": 2.0, "categories": 0.5}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = frozenset("""
+a al con de del el en la las lo los para por sin su sus un una unos unas y o e u que
+""".split())
+_NO_ALNUM = re.compile(r"[^a-z0-9]+")
+# Unidades que se pegan al número: "8 GB" y "8GB" dan el mismo token
+UNIDADES = ("gb", "tb", "mb", "ghz", "hz", "mah", "mp", "w")
+_UNIDADES = re.compile(rf"(\d)\s+({'|'.join(UNIDADES)})\b")
+
+
+@lru_cache(maxsize=65536)
+def stem(token: str) -> str:
+    """
+    Stemmer liviano de plurales: saca la "s" final y después una "e" tras r/l/n/d/z.
+    No es un stemmer lingüístico; lo que importa es que singular y plural caigan
+    en el mismo token (monitor/monitores -> monitor, notebook/notebooks -> notebook).
+    """
+    if len(token) <= 3 or not token.isalpha():
+        return token
+    if token.endswith("s") and not token.endswith("ss"):
+        token = token[:-1]
+    if len(token) > 3 and token.endswith("e") and token[-2] in "rlndz":
+        token = token[:-1]
+    return token
+
+
+def tokenize(text) -> List[str]:
+    """Minúsculas, sin acentos, sin stopwords, plurales al singular."""
+    if not isinstance(text, str) or not text:
+        return []
+    s = uni_normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    s = _UNIDADES.sub(r"\1\2", s)
+    return [stem(t) for t in _NO_ALNUM.sub(" ", s).split() if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    Índice BM25 sobre `title`, `brand_name` y `categories`.
+
+    - Postings en CSR por término: `indptr` + `doc_ids` (uint32, ordenados) +
+      `impacts` (uint8): el peso BM25 de cada (término, producto) ya calculado
+      y cuantizado a 255 niveles con una escala global (`scale`). 5 bytes por posting.
+    - `order`: las mismas postings de cada término ordenadas por impacto
+      descendente (4 bytes más por posting), para cortar temprano: se leen
+      prefijos cada vez más largos de cada término (threshold algorithm) y se
+      frena cuando ningún producto sin leer puede superar al k-ésimo.
+    """
+
+    _ARRAYS = ("indptr", "doc_ids", "impacts", "order")
+
+    def __init__(self, vocab: List[str], indptr: np.ndarray, doc_ids: np.ndarray,
+                 impacts: np.ndarray, order: np.ndarray, n_docs: int, scale: float):
+        self.vocab = list(vocab)
+        self.term_to_id = {t: i for i, t in enumerate(self.vocab)}
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.impacts = impacts
+        self.order = order
+        self.n_docs = int(n_docs)
+        self.scale = float(scale)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, fields: Optional[Dict[str, float]] = None,
+                       k1: float = BM25_K1, b: float = BM25_B) -> "LexicalIndex":
+        fields = fields or FIELD_WEIGHTS
+        n = len(df)
+        vocab: Dict[str, int] = {}
+        terms, docs, pesos = [], [], []
+        largos = np.zeros(n, dtype=np.float64)
+        for campo, peso in fields.items():
+            if campo not in df.columns:
+                continue
+            for fila, texto in enumerate(df[campo].tolist()):
+                tokens = tokenize(texto)
+                largos[fila] += peso * len(tokens)
+                for t in tokens:
+                    terms.append(vocab.setdefault(t, len(vocab)))
+                docs.extend([fila] * len(tokens))
+                pesos.extend([peso] * len(tokens))
+
+        terms = np.asarray(terms, dtype=np.int64)
+        docs = np.asarray(docs, dtype=np.int64)
+        # tf ponderado por campo de cada par (término, producto), ordenado por término y producto
+        pares, inversa = np.unique(terms * max(n, 1) + docs, return_inverse=True)
+        tf = np.bincount(inversa, weights=np.asarray(pesos, dtype=np.float64), minlength=len(pares))
+        term_ids, doc_ids = pares // max(n, 1), pares % max(n, 1)
+
+        df_term = np.bincount(term_ids, minlength=len(vocab))
+        idf = np.log1p((n - df_term + 0.5) / (df_term + 0.5))
+        promedio = largos.mean() if n and largos.mean() > 0 else 1.0
+        norma = k1 * (1 - b + b * largos[doc_ids] / promedio)
+        pesos_bm25 = idf[term_ids] * tf * (k1 + 1) / (tf + norma)
+
+        scale = float(pesos_bm25.max()) / 255 if len(pesos_bm25) else 1.0
+        impacts = np.clip(np.rint(pesos_bm25 / scale), 1, 255).astype(np.uint8) if len(pesos_bm25) else np.empty(0, np.uint8)
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df_term, out=indptr[1:])
+        # Dentro de cada término: impacto descendente y, a igual impacto, orden de catálogo
+        order = np.lexsort((doc_ids, -impacts.astype(np.int64), term_ids)).astype(np.uint32)
+        return cls(vocab=sorted(vocab, key=vocab.get), indptr=indptr, doc_ids=doc_ids.astype(np.uint32),
+                   impacts=impacts, order=order, n_docs=n, scale=scale)
+
+    def remapped(self, old_to_new: np.ndarray, n_docs: int) -> "LexicalIndex":
+        """
+        Las mismas postings con las filas renumeradas (`old_to_new`, -1 = borrada,
+        sin cambiar el orden relativo) para un catálogo de `n_docs` filas. Los pesos
+        BM25 no se recalculan y las filas que no estaban no tienen postings: sirve
+        mientras se rearma el índice completo.
+        """
+        old_to_new = np.asarray(old_to_new, dtype=np.int64)
+        nuevas = old_to_new[self.doc_ids]
+        quedan = nuevas >= 0
+        # Posición de cada posting que queda en los arrays nuevos
+        posicion = np.cumsum(quedan) - 1
+        termino = np.repeat(np.arange(len(self.vocab)), np.diff(self.indptr))
+        indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(termino[quedan], minlength=len(self.vocab)), out=indptr[1:])
+        order = np.asarray(self.order)
+        order = posicion[order[quedan[order]]].astype(np.uint32)
+        return LexicalIndex(vocab=self.vocab, indptr=indptr, doc_ids=nuevas[quedan].astype(np.uint32),
+                            impacts=np.asarray(self.impacts)[quedan], order=order, n_docs=n_docs,
+                            scale=self.scale)
+
+    # ---------- Persistencia ----------
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        for name in self._ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump({"terms": self.vocab, "n_docs": self.n_docs, "scale": self.scale}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "LexicalIndex":
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in cls._ARRAYS}
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(vocab=meta["terms"], n_docs=meta["n_docs"], scale=meta["scale"], **arrays)
+
+    # ---------- Consultas ----------
+    def term_ids(self, query: str) -> List[int]:
+        ids = {self.term_to_id.get(t) for t in tokenize(query)}
+        ids.discard(None)
+        return sorted(ids)
+
+    def _postings(self, tid: int) -> Tuple[np.ndarray, np.ndarray]:
+        ini, fin = self.indptr[tid], self.indptr[tid + 1]
+        return self.doc_ids[ini:fin], self.impacts[ini:fin]
+
+    def _score(self, cand: np.ndarray, tids: List[int]) -> np.ndarray:
+        """Score (en unidades de impacto) de los productos `cand` (ordenados) para los términos `tids`."""
+        total = np.zeros(len(cand), dtype=np.int64)
+        for tid in tids:
+            docs, impacts = self._postings(tid)
+            pos = np.searchsorted(docs, cand)
+            pos[pos == len(docs)] = 0
+            hit = docs[pos] == cand if len(docs) else np.zeros(len(cand), dtype=bool)
+            total += np.where(hit, impacts[pos], 0)
+        return total
+
+    def score_rows(self, query: str, rows: np.ndarray) -> np.ndarray:
+        """Score BM25 de la query para las filas `rows` (ordenadas de menor a mayor)."""
+        return self._score(np.asarray(rows), self.term_ids(query)) * self.scale
+
+    def matching_rows(self, query: str) -> np.ndarray:
+        """Productos con al menos un término de la query (ordenados, sin duplicados)."""
+        listas = [self._postings(tid)[0] for tid in self.term_ids(query)]
+        if not listas:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(listas)).astype(np.int64)
+
+    def search(self, query: str, k: int = 10, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (filas, scores BM25) de los k mejores productos para la query, de mayor a
+        menor; empates en orden de catálogo. Sólo aparecen productos con algún término.
+        Con `rows` (ordenadas, p.ej. ya filtradas por precio) se puntúan sólo esas.
+
+        Lee de cada término los `prof` postings de mayor impacto, puntúa esos
+        candidatos completos y corta si el k-ésimo le gana a cualquier producto
+        no leído; si no, cuadruplica `prof`.
+        """
+        tids = self.term_ids(query)
+        if not tids or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            scores = self._score(rows, tids)
+            top = top_k_indices(scores, k)
+            top = top[scores[top] > 0]
+            return rows[top], scores[top] * self.scale
+        inicios = self.indptr[tids]
+        largos = self.indptr[np.asarray(tids) + 1] - inicios
+        prof = k
+        while True:
+            leidos = [self.order[ini:ini + min(prof, largo)] for ini, largo in zip(inicios, largos)]
+            cand = np.unique(self.doc_ids[np.concatenate(leidos)])
+            scores = self._score(cand, tids)
+            top = top_k_indices(scores, k)
+            if prof >= largos.max():
+                break
+            # Un producto no leído tiene en cada término a lo sumo el impacto siguiente
+            # (`umbral` en total), y si lo iguala en todos está después en el catálogo
+            # que el siguiente de cada término (`despues`)
+            siguientes = [self.order[ini + prof] for ini, largo in zip(inicios, largos) if prof < largo]
+            umbral = int(self.impacts[siguientes].astype(np.int64).sum())
+            despues = int(self.doc_ids[siguientes].max())
+            if len(top) == k:
+                s_k, fila_k = scores[top[-1]], cand[top[-1]]
+                if s_k > umbral or (s_k == umbral and fila_k < despues):
+                    break
+            prof *= 4
+        return cand[top].astype(np.int64), scores[top] * self.scale
+
+    def stats(self) -> Dict[str, int]:
+        return {"terms": len(self.vocab), "postings": int(len(self.doc_ids)),
+                "bytes": int(sum(getattr(self, name).nbytes for name in self._ARRAYS))}
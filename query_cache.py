@@ -0,0 +1,180 @@
+# query_cache.py
+from __future__ import annotations
+import copy
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, Hashable, Optional, Tuple
+from unicodedata import normalize as uni_normalize
+
+import numpy as np
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+RANKING_CACHE_SIZE = int(os.getenv("RANKING_CACHE_SIZE", "2048"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "512"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "600"))
+
+_MISSING = object()
+
+
+def normalize_query(query: str) -> str:
+    """Minúsculas, sin acentos (NFKD como `clean_label`) y espacios colapsados."""
+    s = uni_normalize("NFKD", str(query).lower()).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"\s+", " ", s).strip()
+
+
+class TTLCache:
+    """
+    LRU acotado a `max_size` entradas, con vencimiento por `ttl` segundos.
+
+    Si se pasa `version_fn` (p.ej. el checksum del catálogo en uso), cada acceso
+    la consulta y, si cambió, vacía el cache: nunca se sirve un resultado de
+    otra versión del catálogo. Es thread-safe (se usa desde el thread pool).
+    """
+
+    def __init__(self, max_size: int, ttl: float, version_fn: Optional[Callable[[], Hashable]] = None):
+        self.max_size = max(0, max_size)
+        self.ttl = ttl
+        self.version_fn = version_fn
+        self._data: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = version_fn() if version_fn is not None else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_version(self) -> None:
+        if self.version_fn is None:
+            return
+        version = self.version_fn()
+        if version != self._version:
+            self._version = version
+            if self._data:
+                self._data.clear()
+                self.invalidations += 1
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            self._check_version()
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            vence, value = item
+            if vence < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value, version=_MISSING) -> None:
+        """Con `version`, no guarda si el resultado se calculó sobre otra versión."""
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._check_version()
+            if version is not _MISSING and version != self._version:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, float]:
+        consultas = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / consultas if consultas else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class QueryCache:
+    """
+    Cache de dos niveles para /search:
+      1. query normalizada -> `doc.cats` ya limpio (evita correr el modelo)
+      2. (tags, top_k, min_coincidencias) -> (filas, similitud) del ranking
+         (evita el scoring sobre el catálogo)
+    Más los rankings profundos de la paginación (query, profundidad) ->
+    (filas, scores), para servir cada página sin volver a rankear.
+    Todo se invalida cuando cambia `version_fn()`; `pinned(version)` da una vista
+    que descarta lo calculado sobre una versión que ya no es la vigente.
+    """
+
+    _pin = _MISSING
+
+    def __init__(self,
+                 version_fn: Optional[Callable[[], Hashable]] = None,
+                 query_size: int = QUERY_CACHE_SIZE,
+                 ranking_size: int = RANKING_CACHE_SIZE,
+                 result_size: int = RESULT_CACHE_SIZE,
+                 ttl: float = QUERY_CACHE_TTL):
+        self.cats = TTLCache(query_size, ttl, version_fn)
+        self.rankings = TTLCache(ranking_size, ttl, version_fn)
+        self.results = TTLCache(result_size, ttl, version_fn)
+
+    def pinned(self, version: Hashable) -> "QueryCache":
+        """Mismo cache, pero los `put_*` sólo guardan si `version` sigue vigente."""
+        vista = copy.copy(self)
+        vista._pin = version
+        return vista
+
+    def get_cats(self, query: str) -> Optional[Dict[str, float]]:
+        return self.cats.get(normalize_query(query))
+
+    def put_cats(self, query: str, cats: Dict[str, float]) -> None:
+        self.cats.put(normalize_query(query), cats, self._pin)
+
+    @staticmethod
+    def _ranking_key(tags: FrozenSet[str], top_k: Optional[int], min_coincidencias: int) -> tuple:
+        return (frozenset(tags), top_k, min_coincidencias)
+
+    def get_ranking(self, tags, top_k, min_coincidencias) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        return self.rankings.get(self._ranking_key(tags, top_k, min_coincidencias))
+
+    def put_ranking(self, tags, top_k, min_coincidencias, idx: np.ndarray, similitud: np.ndarray) -> None:
+        # Copias de sólo lectura: el resultado se comparte entre requests
+        idx, similitud = np.array(idx), np.array(similitud)
+        idx.flags.writeable = similitud.flags.writeable = False
+        self.rankings.put(self._ranking_key(tags, top_k, min_coincidencias), (idx, similitud), self._pin)
+
+    def get_results(self, query: str, depth: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        return self.results.get((query, depth))
+
+    def put_results(self, query: str, depth: int, idx: np.ndarray, scores: np.ndarray) -> None:
+        # Arrays compactos: posiciones en int32 y conteos enteros en int32
+        idx = np.asarray(idx, dtype=np.int32)
+        scores = np.asarray(scores)
+        if scores.dtype.kind in "iu":
+            scores = scores.astype(np.int32)
+        idx.flags.writeable = scores.flags.writeable = False
+        self.results.put((query, depth), (idx, scores), self._pin)
+
+    def clear(self) -> None:
+        self.cats.clear()
+        self.rankings.clear()
+        self.results.clear()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {"queries": self.cats.stats(), "rankings": self.rankings.stats(),
+                "results": self.results.stats()}
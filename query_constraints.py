@@ -0,0 +1,256 @@
+# query_constraints.py
+"""
+Restricciones estructuradas de la query: rango de precio y marcas.
+
+- `parse_price` / `parse_query`: "notebook gamer hasta 800 mil",
+  "monitor entre 200000 y 300000", "celular samsung de 300 a 500 lucas",
+  "tablet alrededor de 1,5 millones". Devuelven el rango y la query sin la
+  expresión de precio (para el clasificador léxico); las marcas se detectan
+  contra las del catálogo (n-gramas de la query normalizados con `slugify_tag`).
+- `FilterIndex`: precios del catálogo ordenados (`precios` + `orden`) para
+  resolver un rango con dos búsquedas binarias, y las postings de marca del
+  índice invertido para enumerar una marca. El cruce de los dos se hace por
+  el lado más chico: se recorre el rango de precio y se mira la marca de cada
+  fila (`brand_ids`), o se recorren las filas de la marca y se mira su precio.
+  Así un filtro angosto deja menos filas que puntuar, no más trabajo.
+"""
+from __future__ import annotations
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from unicodedata import normalize as uni_normalize
+
+import numpy as np
+import pandas as pd
+
+from lexical_index import UNIDADES
+from recommender import slugify_tag
+from tag_engine import TagEngine, NO_TAG
+
+# Un monto por debajo de esto no es un precio ("hasta 16 gb", "de 15 a 17 pulgadas")
+MIN_PRECIO = 1000
+# "alrededor de X": X +- 15%
+MARGEN_APROX = 0.15
+# Marcas de hasta 3 palabras ("hewlett packard", "western digital")
+MAX_PALABRAS_MARCA = 3
+
+_MULTIPLICADORES = {
+    "mil": 1e3, "k": 1e3, "luca": 1e3, "lucas": 1e3, "luquitas": 1e3,
+    "millon": 1e6, "millones": 1e6, "palo": 1e6, "palos": 1e6, "m": 1e6,
+}
+_NUM = r"\d+(?:[.,]\d+)*"
+_MULT = r"(?:millones|millon|mil|luquitas|lucas|luca|palos|palo|k|m)"
+# Expresiones que introducen un precio, por tipo (en el orden en que se prueban)
+_EXPRESIONES = {
+    "rango": ("entre", "de", "desde"),
+    "max": ("hasta", "menos de", "maximo", "max", "no mas de", "por debajo de", "debajo de", "menor a",
+            "menor que", "tope", "tope de", "como mucho", "que no pase de", "que no supere"),
+    "min": ("desde", "mas de", "minimo", "min", "a partir de", "arriba de", "por encima de", "encima de",
+            "mayor a", "mayor que", "como minimo"),
+    "aprox": ("alrededor de", "cerca de", "unos", "aprox", "aproximadamente", "tipo"),
+}
+_CONECTORES_RANGO = ("y", "a", "hasta", "-")
+_MONEDAS = ("pesos", "ars")
+# Un número seguido de una unidad es una especificación, no un precio: "hasta 16000 dpi"
+_UNIDADES = UNIDADES + ("dpi", "rpm", "mhz", "kg", "cm", "mm", "pulgadas", "pulgada", "pulg")
+# (y el número va entero: "1.500.000 w" no puede cortarse en "1.500")
+_NO_UNIDAD = rf"(?![.,]?\d|\s*(?:(?:{'|'.join(_UNIDADES)})\b|\"|''))"
+# Palabras que usa el parser de precios: el corrector de typos no las toca
+PRICE_WORDS = frozenset(
+    palabra for grupo in (*_EXPRESIONES.values(), _CONECTORES_RANGO, _MONEDAS, _MULTIPLICADORES)
+    for expresion in grupo for palabra in expresion.split() if palabra.isalpha()
+)
+
+
+def _monto(nombre: str) -> str:
+    return rf"\$?\s*(?P<{nombre}>{_NUM}){_NO_UNIDAD}\s*(?P<{nombre}_mult>{_MULT})?\b(?:\s*(?:{'|'.join(_MONEDAS)}))?"
+
+
+def _alternativas(expresiones: Iterable[str]) -> str:
+    return "|".join(re.escape(e).replace(r"\ ", " ") for e in expresiones)
+
+
+_PATRONES = [
+    ("rango", re.compile(rf"\b(?:{_alternativas(_EXPRESIONES['rango'])})\s+{_monto('a')}"
+                         rf"\s+(?:{_alternativas(_CONECTORES_RANGO)})\s+{_monto('b')}")),
+    ("max", re.compile(rf"\b(?:{_alternativas(_EXPRESIONES['max'])})\s+(?:de\s+)?{_monto('a')}")),
+    ("min", re.compile(rf"\b(?:{_alternativas(_EXPRESIONES['min'])})\s+(?:de\s+)?{_monto('a')}")),
+    ("aprox", re.compile(rf"\b(?:{_alternativas(_EXPRESIONES['aprox'])})\s+{_monto('a')}")),
+]
+_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin acentos (la ñ también queda como n)."""
+    return uni_normalize("NFKD", texto.lower()).encode("ascii", "ignore").decode("ascii")
+
+
+def _numero(texto: str, mult: Optional[str]) -> float:
+    """'800.000' -> 800000, '1,5' -> 1.5, '1.234,5' -> 1234.5 (separadores de miles de 3 dígitos)."""
+    partes = re.split(r"[.,]", texto)
+    if len(partes) > 1 and all(len(p) == 3 for p in partes[1:]) and not (mult and len(partes) == 2):
+        valor = float("".join(partes))
+    elif len(partes) > 1:
+        valor = float("".join(partes[:-1]) + "." + partes[-1])
+    else:
+        valor = float(texto)
+    return valor * _MULTIPLICADORES.get(mult or "", 1.0)
+
+
+def parse_price(texto: str) -> Tuple[Optional[float], Optional[float], str]:
+    """
+    (precio_min, precio_max, resto): el rango de precio de la query (None si no
+    dice) y la query normalizada sin las expresiones de precio reconocidas.
+    """
+    resto = normalizar(texto)
+    precio_min = precio_max = None
+    for tipo, patron in _PATRONES:
+        for m in list(patron.finditer(resto)):
+            mult_a = m.group("a_mult")
+            if tipo == "rango":
+                # "entre 200 y 300 mil": el multiplicador del segundo vale para los dos
+                mult_b = m.group("b_mult")
+                a, b = _numero(m.group("a"), mult_a or mult_b), _numero(m.group("b"), mult_b or mult_a)
+                if min(a, b) < MIN_PRECIO:
+                    continue
+                precio_min, precio_max = min(a, b), max(a, b)
+            else:
+                a = _numero(m.group("a"), mult_a)
+                if a < MIN_PRECIO:
+                    continue
+                if tipo == "max":
+                    precio_max = a
+                elif tipo == "min":
+                    precio_min = a
+                else:
+                    precio_min, precio_max = a * (1 - MARGEN_APROX), a * (1 + MARGEN_APROX)
+            resto = resto.replace(m.group(0), " ", 1)
+    return precio_min, precio_max, _ESPACIOS.sub(" ", resto).strip()
+
+
+def parse_brands(texto: str, marcas: Iterable[str]) -> List[str]:
+    """Marcas del catálogo (ya en formato `slugify_tag`) mencionadas en la query, en orden de aparición."""
+    marcas = marcas if isinstance(marcas, (set, frozenset)) else set(marcas)
+    palabras = normalizar(texto).split()
+    encontradas = []
+    i = 0
+    while i < len(palabras):
+        # Primero el n-grama más largo: "hewlett packard" antes que "hewlett"
+        for largo in range(min(MAX_PALABRAS_MARCA, len(palabras) - i), 0, -1):
+            slug = slugify_tag(" ".join(palabras[i:i + largo]))
+            if slug in marcas:
+                if slug not in encontradas:
+                    encontradas.append(slug)
+                i += largo
+                break
+        else:
+            i += 1
+    return encontradas
+
+
+def parse_query(texto: str, marcas: Iterable[str] = ()) -> Dict[str, Any]:
+    """
+    {"precio_min", "precio_max", "marcas", "texto"}: lo que la query restringe
+    y el texto sin el precio (las marcas se dejan: también sirven para el BM25).
+    """
+    precio_min, precio_max, resto = parse_price(texto)
+    return {"precio_min": precio_min, "precio_max": precio_max,
+            "marcas": parse_brands(resto, marcas), "texto": resto}
+
+
+def has_filters(parsed: Dict[str, Any]) -> bool:
+    return parsed.get("precio_min") is not None or parsed.get("precio_max") is not None or bool(parsed.get("marcas"))
+
+
+def effective_prices(df: pd.DataFrame) -> np.ndarray:
+    """Precio de cada fila: `sale_price` si está, si no `list_price`; inf si no tiene (queda fuera de todo rango)."""
+    precio = np.full(len(df), np.nan)
+    for col in ("list_price", "sale_price"):
+        if col in df.columns:
+            valores = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+            precio = np.where(np.isnan(valores), precio, valores)
+    return np.where(np.isnan(precio), np.inf, precio)
+
+
+class FilterIndex:
+    """Precios ordenados + marcas del catálogo, para filtrar antes de puntuar."""
+
+    def __init__(self, precios: np.ndarray, orden: np.ndarray, motor: TagEngine):
+        self.precios = precios  # precio de cada fila, ordenado de menor a mayor
+        self.orden = orden      # fila de cada posición de `precios`
+        self.precio_fila = np.empty(len(orden), dtype=np.float64)
+        self.precio_fila[orden] = precios
+        self.motor = motor
+        self.marcas = frozenset(motor.brand_vocab)
+
+    @classmethod
+    def from_catalog(cls, df: pd.DataFrame, motor: TagEngine) -> "FilterIndex":
+        precio = effective_prices(df)
+        orden = np.argsort(precio, kind="stable")
+        return cls(precio[orden], orden.astype(np.int64), motor)
+
+    @property
+    def n_products(self) -> int:
+        return len(self.orden)
+
+    def parse(self, query: str) -> Dict[str, Any]:
+        """`parse_query` contra las marcas de este catálogo."""
+        return parse_query(query, self.marcas)
+
+    def _brand_ids(self, marcas: Iterable[str]) -> List[int]:
+        return [b for b in (self.motor.brand_id(m) for m in marcas) if b != NO_TAG]
+
+    def _brand_rows(self, bid: int) -> np.ndarray:
+        if self.motor.index is not None:
+            return self.motor.index.brand_rows(bid)
+        return np.flatnonzero(self.motor.brand_ids == bid)
+
+    def _ordenadas(self, filas: np.ndarray) -> np.ndarray:
+        """`filas` en orden de catálogo: con muchas, marcar en una máscara es más barato que ordenarlas."""
+        if len(filas) * 4 < self.n_products:
+            return np.sort(filas)
+        marcadas = np.zeros(self.n_products, dtype=bool)
+        marcadas[filas] = True
+        return np.flatnonzero(marcadas)
+
+    def rows(self, precio_min: Optional[float] = None, precio_max: Optional[float] = None,
+             marcas: Iterable[str] = ()) -> Optional[np.ndarray]:
+        """
+        Filas (ordenadas) que cumplen el rango de precio y alguna de las marcas;
+        None si no hay restricción. Una marca que no está en el catálogo no filtra nada.
+        """
+        marcas = list(marcas)
+        bids = self._brand_ids(marcas)
+        hay_precio = precio_min is not None or precio_max is not None
+        if not hay_precio and not bids:
+            return None
+
+        lo, hi = 0, self.n_products
+        if precio_min is not None:
+            lo = int(np.searchsorted(self.precios, precio_min, side="left"))
+        if precio_max is not None:
+            hi = int(np.searchsorted(self.precios, precio_max, side="right"))
+        hi = min(hi, int(np.searchsorted(self.precios, np.inf, side="left")))  # sin precio: nunca
+        n_rango = max(0, hi - lo) if hay_precio else self.n_products
+
+        if not bids:
+            return self._ordenadas(self.orden[lo:hi])
+        n_marca = sum(len(self.motor.index.brand_postings.get(b, ())) for b in bids) \
+            if self.motor.index is not None else None
+
+        if hay_precio and (n_marca is None or n_rango <= n_marca):
+            # Rango más chico: marca de cada fila del rango
+            filas = self.orden[lo:hi]
+            filas = filas[np.isin(self.motor.brand_ids[filas], bids)]
+            return self._ordenadas(filas)
+        # Marca más chica: precio de cada fila de la marca
+        filas = np.concatenate([self._brand_rows(b) for b in bids]) if len(bids) > 1 else self._brand_rows(bids[0])
+        filas = np.sort(filas) if len(bids) > 1 else filas
+        if hay_precio:
+            p = self.precio_fila[filas]
+            dentro = np.isfinite(p)
+            if precio_min is not None:
+                dentro &= p >= precio_min
+            if precio_max is not None:
+                dentro &= p <= precio_max
+            filas = filas[dentro]
+        return filas.astype(np.int64)
@@ -1,10 +1,16 @@
 # recommender.py
 from __future__ import annotations
 import ast
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 from typing import Dict, Any, List, Optional
 from unicodedata import normalize as uni_normalize
 
+from tag_engine import TagEngine, NO_TAG
+from topk import top_k_indices
+from inverted_index import fill_with_zero_rows
+
 # -------- Utils --------
 def safe_list(x) -> List[str]:
     if isinstance(x, list):
@@ -22,6 +28,11 @@ def slugify_tag(s: str) -> str:
     """
     if not isinstance(s, str):
         return ""
+    return _slugify(s)
+
+@lru_cache(maxsize=4096)
+def _slugify(s: str) -> str:
+    # Memoizado: las marcas del catálogo se repiten muchísimo
     s = s.strip().upper()
     s = uni_normalize("NFKD", s).encode("ascii", "ignore").decode("ascii")
     for ch in [" ", "-", ".", "/", ":", ";", ","]:
@@ -31,8 +42,12 @@ def slugify_tag(s: str) -> str:
 def build_query_constraints(parsed_query: Dict[str, Any]) -> Dict[str, Any]:
     """
     Convierte la query del usuario en tags estándar (CAT_*, INT_*, ATTR_*).
+    `precio_min` / `precio_max` / `marcas` (ver `query_constraints.parse_query`)
+    no suman score: filtran el catálogo antes de puntuar.
     """
-    out = {"category_tag": None, "intent_tag": None, "attrs_tags": [], "brand": None}
+    out = {"category_tag": None, "intent_tag": None, "attrs_tags": [], "brand": None,
+           "price_min": parsed_query.get("precio_min"), "price_max": parsed_query.get("precio_max"),
+           "brands": [slugify_tag(m) for m in parsed_query.get("marcas") or []]}
     if parsed_query.get("categoria"):
         out["category_tag"] = f"CAT_{slugify_tag(parsed_query['categoria'])}"
     if parsed_query.get("intencion"):
@@ -70,6 +85,14 @@ def prepare_dataframe(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
+def compile_products(products_df: pd.DataFrame) -> TagEngine:
+    """
+    Precompila el catálogo para `rank_products`: matriz productos×labels (CSR)
+    y marcas normalizadas con `slugify_tag`. Conviene hacerlo una sola vez y
+    pasar el resultado como `motor`.
+    """
+    return TagEngine.from_dataframe(products_df, brand_key=slugify_tag)
+
 # -------- Core Ranking --------
 def rank_products(
     model_scores: Dict[str, float],
@@ -78,6 +101,9 @@ def rank_products(
     weights: Optional[Dict[str, float]] = None,
     top_k: int = 5,
     prefer_query_category: bool = True,
+    motor: Optional[TagEngine] = None,
+    early_termination: bool = False,
+    filters=None,
 ) -> pd.DataFrame:
     """
     Calcula un score por producto sumando:
@@ -100,79 +126,362 @@ def rank_products(
         Cantidad de ítems a devolver.
     prefer_query_category: bool
         Si True, prioriza la categoría pedida (si hay suficientes productos).
+    motor: TagEngine | None
+        Catálogo precompilado con `compile_products(products_df)`. Si no se pasa
+        (o no tiene marcas), se compila en el momento.
+    early_termination: bool
+        Si True, recorre el índice invertido del motor con MaxScore y corta cuando
+        el top-k ya no puede cambiar, en vez de puntuar todo el catálogo.
+    filters: query_constraints.FilterIndex | None
+        Precios ordenados y marcas del catálogo, para los filtros de precio/marcas
+        de `parsed_query`; si hacen falta y no se pasa, se arma en el momento.
+        Con filtros sólo se puntúan (y se devuelven) las filas que los cumplen.
 
     Returns
     -------
     pd.DataFrame con columna 'similitud_total' y columnas clave del producto.
     """
     weights = weights or {"category": 1.0, "intent": 1.0, "attr": 1.0}
-    df = prepare_dataframe(products_df)
     constraints = build_query_constraints(parsed_query or {})
+    if motor is None or motor.n_products != len(products_df) or not motor.brand_vocab:
+        motor = compile_products(products_df)
 
-    def score_row(row) -> float:
-        score = 0.0
-
-        # Categoria
-        cat = row.get("categoria_detectada", "")
-        if isinstance(cat, str) and cat in model_scores:
-            score += model_scores[cat] * weights["category"]
-
-        # Intencion
-        intent = row.get("intencion_detectada", "")
-        if isinstance(intent, str) and intent in model_scores:
-            score += model_scores[intent] * weights["intent"]
-
-        # Atributos
-        attrs = row.get("atributos_list", [])
-        for a in attrs:
-            if a in model_scores:
-                score += model_scores[a] * weights["attr"]
-
-        # --- Bonuses suaves por constraints de la query ---
-        # Marca exacta (no excluyente)
-        if constraints["brand"]:
-            brand_norm = slugify_tag(str(row.get("brand_name", "")))
-            if constraints["brand"] == brand_norm:
-                score += 0.25
-
-        # Categoría/Intención pedidas explícitamente
-        if constraints["category_tag"] and constraints["category_tag"] == cat:
-            score += 0.15
-        if constraints["intent_tag"] and constraints["intent_tag"] == intent:
-            score += 0.15
-
-        # Atributos requeridos en la query presentes en el producto
-        if constraints["attrs_tags"]:
-            inter = len(set(constraints["attrs_tags"]).intersection(set(attrs)))
-            score += 0.05 * inter
-
-        return score
+    # Vector de scores del modelo (se escala por bloque en `_score_rows`)
+    base = motor.score_vector(model_scores)
 
-    df = df.copy()
-    df["similitud_total"] = df.apply(score_row, axis=1)
+    universo = filter_rows(constraints, products_df, motor, filters)
+    if universo is not None and (len(universo) <= FILTER_SCAN_MAX or not early_termination
+                                 or not _max_score_applicable(base, weights)):
+        rows = universo
+        if prefer_query_category and constraints["category_tag"]:
+            sub = universo[motor.cat_ids[universo] == motor.tag_id(constraints["category_tag"])]
+            if len(sub) >= top_k:
+                rows = sub
+        score = _score_rows(motor, base, weights, constraints, rows)
+        top = top_k_indices(score, top_k)
+        return _build_result(products_df, motor, rows[top], score[top])
+
+    if early_termination and _max_score_applicable(base, weights):
+        if motor.index is None:
+            motor.build_index()
+        top, top_scores = _rank_max_score(motor, base, weights, constraints, top_k, prefer_query_category,
+                                          universo)
+        return _build_result(products_df, motor, top, top_scores)
+
+    score = _score_rows(motor, base, weights, constraints)
 
     # Preferencia por la categoría pedida (si hay suficientes resultados)
+    rows = np.arange(motor.n_products)
     if prefer_query_category and constraints["category_tag"]:
-        sub = df[df["categoria_detectada"] == constraints["category_tag"]]
+        sub = motor.rows_with_category(constraints["category_tag"])
         if len(sub) >= top_k:
-            df = sub
-
-    cols_show = [
-        "title",
-        "brand_name",
-        "categories",
-        "list_price",
-        "categoria_detectada",
-        "intencion_detectada",
-        "atributos_list",
-        "similitud_total",
-    ]
-    cols_show = [c for c in cols_show if c in df.columns]  # por si faltan en el catálogo
-
-    return (df.sort_values("similitud_total", ascending=False)
-              .head(top_k)
-              .loc[:, cols_show]
-              .reset_index(drop=True))
+            rows = sub
+
+    # Selección parcial de los top_k (a igual score se respeta el orden del catálogo)
+    top = rows[top_k_indices(score[rows], top_k)]
+    return _build_result(products_df, motor, top, score[top])
+
+# Con hasta tantas filas filtradas conviene puntuarlas todas; con más, MaxScore restringido a ellas
+FILTER_SCAN_MAX = 20_000
+
+def filter_rows(constraints: Dict[str, Any], products_df: pd.DataFrame, motor: TagEngine,
+                filters=None) -> Optional[np.ndarray]:
+    """Filas que cumplen los filtros de precio/marcas de `constraints` (None si no hay filtros)."""
+    if constraints["price_min"] is None and constraints["price_max"] is None and not constraints["brands"]:
+        return None
+    if filters is None or filters.n_products != motor.n_products:
+        from query_constraints import FilterIndex
+        filters = FilterIndex.from_catalog(products_df, motor)
+    return filters.rows(constraints["price_min"], constraints["price_max"], constraints["brands"])
+
+def _score_rows(motor: TagEngine, base: np.ndarray, weights: Dict[str, float],
+                constraints: Dict[str, Any], rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    similitud_total de las filas pedidas (todas si `rows` es None): mat-vec por
+    bloques + bonuses como máscaras vectorizadas.
+    """
+    score = motor.weighted_scores(
+        base * weights["category"],
+        base * weights["intent"],
+        base * weights["attr"],
+        rows,
+    )
+    sel = slice(None) if rows is None else rows
+
+    # --- Bonuses suaves por constraints de la query ---
+    # Marca exacta (no excluyente)
+    if constraints["brand"]:
+        score += np.where(motor.brand_ids[sel] == motor.brand_id(constraints["brand"]), 0.25, 0.0)
+
+    # Categoría/Intención pedidas explícitamente
+    cat_tid = motor.tag_id(constraints["category_tag"]) if constraints["category_tag"] else NO_TAG
+    if cat_tid != NO_TAG:
+        score += np.where(motor.cat_ids[sel] == cat_tid, 0.15, 0.0)
+    if constraints["intent_tag"]:
+        int_tid = motor.tag_id(constraints["intent_tag"])
+        if int_tid != NO_TAG:
+            score += np.where(motor.intent_ids[sel] == int_tid, 0.15, 0.0)
+
+    # Atributos requeridos en la query presentes en el producto
+    if constraints["attrs_tags"]:
+        inter = motor.attr_match_counts(motor.query_mask(constraints["attrs_tags"]), rows)
+        score += 0.05 * inter
+
+    return score
+
+def _max_score_applicable(base: np.ndarray, weights: Dict[str, float]) -> bool:
+    """Las cotas de MaxScore sólo valen si ningún aporte puede ser negativo."""
+    return bool(np.all(base >= 0)) and all(weights[k] >= 0 for k in ("category", "intent", "attr"))
+
+def _rank_max_score(motor: TagEngine, base: np.ndarray, weights: Dict[str, float],
+                    constraints: Dict[str, Any], top_k: int, prefer_query_category: bool,
+                    filas_filtro: Optional[np.ndarray] = None):
+    """
+    Top-k exacto recorriendo postings del índice invertido (estrategia MaxScore).
+
+    Cada término (tag con score > 0, tag pedido en la query o marca) tiene una
+    cota superior de lo que puede aportar a un producto. Se procesan de mayor a
+    menor cota y se puntúan sólo los productos nuevos; cuando el k-ésimo score
+    visto supera la suma de cotas de los términos restantes, ningún producto sin
+    ver puede entrar al top-k y se corta. Los productos fuera de toda posting
+    tienen score 0 y completan el top-k en orden de catálogo, igual que el scan completo.
+    Con `filas_filtro` (filas ordenadas que cumplen los filtros de precio/marca)
+    sólo se consideran esas.
+    """
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    index = motor.index
+    wc, wi, wa = weights["category"], weights["intent"], weights["attr"]
+
+    cat_tid = motor.tag_id(constraints["category_tag"]) if constraints["category_tag"] else NO_TAG
+    int_tid = motor.tag_id(constraints["intent_tag"]) if constraints["intent_tag"] else NO_TAG
+    attr_tids = {motor.tag_id(t) for t in constraints["attrs_tags"]} - {NO_TAG}
+
+    # Universo: la categoría pedida si tiene suficientes productos
+    universo = filas_filtro
+    if prefer_query_category and cat_tid != NO_TAG:
+        sub = index.postings(cat_tid)
+        sub = sub[motor.cat_ids[sub] == cat_tid]
+        if filas_filtro is not None:
+            sub = np.intersect1d(sub, filas_filtro, assume_unique=True)
+        if len(sub) >= max(top_k, 1):
+            universo = sub
+
+    terminos = []
+    for tid in set(np.flatnonzero(base[:-1] > 0).tolist()) | {cat_tid, int_tid} | attr_tids:
+        if tid == NO_TAG:
+            continue
+        cota = base[tid] * (wc * index.in_cat[tid] + wi * index.in_intent[tid] + wa * index.attr_max_mult[tid])
+        cota += 0.15 * (tid == cat_tid) + 0.15 * (tid == int_tid) + 0.05 * (tid in attr_tids)
+        if cota > 0:
+            terminos.append((float(cota), tid))
+    brand_bid = motor.brand_id(constraints["brand"]) if constraints["brand"] else NO_TAG
+    if brand_bid != NO_TAG:
+        terminos.append((0.25, None))
+    terminos.sort(key=lambda t: -t[0])
+
+    restantes = np.cumsum([c for c, _ in terminos][::-1])[::-1]
+    vistos = np.empty(0, dtype=np.int64)
+    scores = np.empty(0, dtype=np.float64)
+    for i, (_, tid) in enumerate(terminos):
+        filas = index.brand_rows(brand_bid) if tid is None else index.postings(tid)
+        if universo is not None:
+            pos = np.minimum(np.searchsorted(universo, filas), len(universo) - 1)
+            filas = filas[universo[pos] == filas]
+        nuevas = np.setdiff1d(filas, vistos, assume_unique=True)
+        if len(nuevas):
+            vistos = np.concatenate((vistos, nuevas))
+            scores = np.concatenate((scores, _score_rows(motor, base, weights, constraints, nuevas)))
+
+        cota_restante = restantes[i + 1] if i + 1 < len(terminos) else 0.0
+        if len(vistos) >= top_k:
+            kth = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+            # Margen por redondeo: la suma real puede diferir en algunos ulp de la cota
+            if kth > cota_restante * (1 + 1e-9) + 1e-12:
+                break
+
+    positivos = scores > 0
+    vistos, scores = vistos[positivos], scores[positivos]
+    orden = top_k_indices(scores, top_k, tiebreak=vistos)
+    top, top_scores = vistos[orden], scores[orden]
+
+    ceros = fill_with_zero_rows(top, top_k, motor.n_products, universo)
+    return np.concatenate((top, ceros)), np.concatenate((top_scores, np.zeros(len(ceros))))
+
+# -------- Ranking híbrido (tags + léxico) --------
+HYBRID_FUSIONS = ("weighted", "rrf")
+# Constante de reciprocal-rank fusion: cuánto pesan los primeros puestos frente al resto
+RRF_K = 60
+# Largo inicial de la lista de tags en la fusión "weighted"
+HYBRID_TAG_DEPTH = 200
+
+def _top_tags(motor: TagEngine, base: np.ndarray, weights: Dict[str, float],
+              constraints: Dict[str, Any], depth: int):
+    """Los `depth` mejores por score de tags (sólo score > 0): MaxScore si se puede, si no scan."""
+    if motor.index is not None and _max_score_applicable(base, weights):
+        filas, scores = _rank_max_score(motor, base, weights, constraints, depth, False)
+    else:
+        score = _score_rows(motor, base, weights, constraints)
+        filas = top_k_indices(score, depth)
+        scores = score[filas]
+    return filas[scores > 0], scores[scores > 0]
+
+def rank_hybrid_rows(
+    model_scores: Dict[str, float],
+    query: str,
+    motor: TagEngine,
+    lexico,
+    parsed_query: Optional[Dict[str, Any]] = None,
+    weights: Optional[Dict[str, float]] = None,
+    top_k: int = 5,
+    fusion: str = "weighted",
+    alpha: float = 0.5,
+    candidates: Optional[int] = None,
+    rows: Optional[np.ndarray] = None,
+):
+    """
+    Top-k que combina el score de tags de `rank_products` con el BM25 del
+    título/marca (`lexico`, un `LexicalIndex` del mismo catálogo), así las
+    marcas y modelos de la query que el clasificador no conoce también cuentan.
+
+    Candidatos: los mejores de cada índice (`candidates`, por defecto 2*top_k
+    y mínimo 20, del léxico; de tags, al menos HYBRID_TAG_DEPTH, porque MaxScore
+    cuesta casi lo mismo para 25 que para 200), sin puntuar todo el catálogo
+    dos veces; sobre la unión se calculan los dos scores completos y se fusionan:
+      - "weighted": alpha * tags/max(tags) + (1 - alpha) * bm25/max(bm25).
+        Exacto: un producto fuera de las dos listas tiene a lo sumo el score
+        siguiente de cada una, y si con eso puede superar al k-ésimo, las
+        listas se cuadruplican.
+      - "rrf": suma de 1 / (RRF_K + puesto) en las dos listas (las dos de largo `candidates`).
+    Con `rows` (filas ya filtradas por precio/marca, ordenadas) se puntúan
+    directamente esas filas con los dos scores: con un filtro angosto es lo más barato.
+
+    Devuelve (filas, score fusionado, score de tags, score léxico); si hay
+    menos de top_k candidatos se completa con el resto en orden de catálogo y score 0.
+    """
+    if fusion not in HYBRID_FUSIONS:
+        raise ValueError(f"fusion debe ser una de {HYBRID_FUSIONS}: {fusion!r}")
+    weights = weights or {"category": 1.0, "intent": 1.0, "attr": 1.0}
+    constraints = build_query_constraints(parsed_query or {})
+    base = motor.score_vector(model_scores)
+    if rows is not None:
+        return _rank_hybrid_subset(base, query, motor, lexico, weights, constraints, top_k, fusion, alpha,
+                                   np.asarray(rows, dtype=np.int64))
+    depth = candidates or max(2 * top_k, 20)
+    depth_tags = depth if fusion == "rrf" else max(depth, HYBRID_TAG_DEPTH)
+    por_tags = tags_lista = None
+    pedida = 0
+
+    while True:
+        # Uno de más en cada lista: el siguiente a la lista acota a los no leídos
+        if pedida != depth_tags:
+            por_tags, tags_lista = _top_tags(motor, base, weights, constraints, depth_tags + 1)
+            pedida = depth_tags
+        por_texto, lex_lista = lexico.search(query, depth + 1)
+        cand = np.union1d(por_tags, por_texto).astype(np.int64)
+        s_tags = _score_rows(motor, base, weights, constraints, cand)
+        s_lex = lexico.score_rows(query, cand)
+        if fusion == "rrf":
+            fused = np.zeros(len(cand))
+            for lista in (por_tags[:depth], por_texto[:depth]):
+                fused[np.searchsorted(cand, lista)] += 1.0 / (RRF_K + np.arange(1, len(lista) + 1))
+            break
+
+        max_tags = tags_lista[0] if len(tags_lista) else 0.0
+        max_lex = lex_lista[0] if len(lex_lista) else 0.0
+        fused = np.zeros(len(cand))
+        cota, despues = 0.0, -1
+        if max_tags > 0:
+            fused = fused + alpha * s_tags / max_tags
+            if len(por_tags) > depth_tags:
+                cota += alpha * tags_lista[depth_tags] / max_tags
+                despues = max(despues, int(por_tags[depth_tags]))
+        if max_lex > 0:
+            fused = fused + (1 - alpha) * s_lex / max_lex
+            if len(por_texto) > depth:
+                cota += (1 - alpha) * lex_lista[depth] / max_lex
+                despues = max(despues, int(por_texto[depth]))
+        if despues < 0 or min(depth, depth_tags) >= motor.n_products:
+            break  # las dos listas completas
+        top = top_k_indices(fused, top_k)
+        if len(top) == top_k:
+            # A igual score, un producto no leído está después (en el catálogo) del siguiente de cada lista
+            kth, fila_k = fused[top[-1]], cand[top[-1]]
+            if kth > cota or (kth == cota and fila_k < despues):
+                break
+        # Se alarga primero el léxico (barato); la de tags cuando ya es la más corta
+        if depth < depth_tags:
+            depth *= 4
+        else:
+            depth, depth_tags = depth * 4, depth_tags * 4
+
+    top = top_k_indices(fused, top_k)
+    filas = cand[top]
+    ceros = fill_with_zero_rows(filas, top_k, motor.n_products)
+    relleno = np.zeros(len(ceros))
+    return (np.concatenate((filas, ceros)), np.concatenate((fused[top], relleno)),
+            np.concatenate((s_tags[top], relleno)), np.concatenate((s_lex[top], relleno)))
+
+def _rank_hybrid_subset(base, query, motor, lexico, weights, constraints, top_k, fusion, alpha, rows):
+    """`rank_hybrid_rows` sobre un subconjunto de filas: scores completos de todas, sin candidatos."""
+    s_tags = _score_rows(motor, base, weights, constraints, rows)
+    s_lex = lexico.score_rows(query, rows)
+    fused = np.zeros(len(rows))
+    for s, peso in ((s_tags, alpha), (s_lex, 1 - alpha)):
+        if not len(rows) or s.max() <= 0:
+            continue
+        if fusion == "weighted":
+            fused += peso * s / s.max()
+        else:
+            puesto = np.empty(len(rows), dtype=np.int64)
+            puesto[top_k_indices(s, len(rows))] = np.arange(1, len(rows) + 1)
+            fused += np.where(s > 0, 1.0 / (RRF_K + puesto), 0.0)
+    top = top_k_indices(fused, top_k)
+    return rows[top], fused[top], s_tags[top], s_lex[top]
+
+def rank_hybrid(
+    model_scores: Dict[str, float],
+    products_df: pd.DataFrame,
+    query: str,
+    lexico,
+    parsed_query: Optional[Dict[str, Any]] = None,
+    weights: Optional[Dict[str, float]] = None,
+    top_k: int = 5,
+    fusion: str = "weighted",
+    alpha: float = 0.5,
+    motor: Optional[TagEngine] = None,
+    filters=None,
+) -> pd.DataFrame:
+    """
+    `rank_hybrid_rows` como DataFrame (mismas columnas que `rank_products`, con
+    `similitud_total` = score fusionado, más `similitud_tags` y `similitud_lexica`).
+    Los filtros de precio/marcas de `parsed_query` se aplican como en `rank_products`.
+    """
+    if motor is None or motor.n_products != len(products_df) or not motor.brand_vocab:
+        motor = compile_products(products_df)
+        motor.build_index()
+    rows = filter_rows(build_query_constraints(parsed_query or {}), products_df, motor, filters)
+    filas, fused, s_tags, s_lex = rank_hybrid_rows(model_scores, query, motor, lexico, parsed_query,
+                                                   weights, top_k, fusion, alpha, rows=rows)
+    out = _build_result(products_df, motor, filas, fused)
+    out["similitud_tags"] = s_tags
+    out["similitud_lexica"] = s_lex
+    return out
+
+def _build_result(products_df: pd.DataFrame, motor: TagEngine,
+                  rows: np.ndarray, scores: np.ndarray) -> pd.DataFrame:
+    """Arma el DataFrame de salida sólo con las filas seleccionadas."""
+    out = pd.DataFrame(index=pd.RangeIndex(len(rows)))
+    for col in ("title", "brand_name", "categories", "list_price"):
+        if col in products_df.columns:
+            out[col] = products_df[col].iloc[rows].values
+        elif col == "brand_name":
+            out[col] = ""
+    for col in ("categoria_detectada", "intencion_detectada"):
+        out[col] = products_df[col].iloc[rows].fillna("").values if col in products_df.columns else ""
+    out["atributos_list"] = motor.attr_lists(rows)
+    out["similitud_total"] = scores
+    return out
 
 # -------- Helper de alto nivel --------
 def recommend_top_k_from_csv(
@@ -0,0 +1,175 @@
+"""
+Extracción masiva de especificaciones y atributos de los JSON de detalle de
+Fravega (lo mismo que `get_product_attributes`, pero para todo un directorio).
+
+- Reparte los archivos entre procesos (`workers`) en lotes de `chunk`.
+- No arma el `__APOLLO_STATE__` completo: busca en el texto la clave
+  `sku({"code":"<sku>"})` y decodifica sólo ese subárbol. Si no la encuentra,
+  parsea el documento entero (orjson si está) con el camino de siempre.
+- Escribe una sola tabla larga (sku_id, product_id, tipo, nombre, valor) en
+  Parquet (CSV sin pyarrow) y cuenta los errores por archivo en `<destino>.errores.csv`.
+
+El origen puede ser un directorio de `{sku}.json` o un ResponseStore
+(`scripts/response_store.py`).
+Uso: python -m scripts.atributos datos/lenovo/productos datos/lenovo/atributos.parquet [--workers 4]
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from .response_store import INDEX_NAME, PACK_NAME, ResponseStore, read_entry
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+COLUMNAS = ["sku_id", "product_id", "tipo", "nombre", "valor"]
+CLAVE_SPECS = 'specifications({"tagged":["detailed"]})'
+
+_DECODER = json.JSONDecoder()
+_SEPARADOR = re.compile(r"\s*:\s*")
+
+
+def _clave_sku(sku: str) -> str:
+    return 'sku({"code":"' + str(sku) + '"})'
+
+
+def _subarbol(texto: str, clave: str):
+    """Valor de la primera aparición de `clave` como clave JSON, decodificando sólo ese valor."""
+    literal = json.dumps(clave)
+    i = texto.find(literal)
+    if i < 0:
+        return None
+    m = _SEPARADOR.match(texto, i + len(literal))
+    if m is None or not m.group(0).strip():
+        return None
+    valor, _ = _DECODER.raw_decode(texto, m.end())
+    return valor
+
+
+def _item_completo(raw: bytes, sku: str) -> dict:
+    data = orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+    sku = str(data["pageProps"].get("sku", sku))
+    return data["pageProps"]["__APOLLO_STATE__"]["ROOT_QUERY"][_clave_sku(sku)]["item"]
+
+
+def extraer_producto(raw: bytes, sku: str) -> Tuple[str, List[tuple], List[tuple]]:
+    """(product_id, specs, atributos) de un JSON de detalle; levanta si falta algo."""
+    nodo = _subarbol(raw.decode("utf-8"), _clave_sku(sku))
+    item = nodo.get("item") if isinstance(nodo, dict) else None
+    if not isinstance(item, dict):
+        item = _item_completo(raw, sku)
+    specs = [(s["name"], s["value"]) for s in item[CLAVE_SPECS]]
+    atributos = [(a["name"], a["value"]) for a in item["attributes"] if "imagen" not in a["name"]]
+    return item["id"], specs, atributos
+
+
+def _valor(v) -> Optional[str]:
+    if v is None or isinstance(v, str):
+        return v
+    return json.dumps(v, ensure_ascii=False)
+
+
+def _procesar_lote(lote: List[tuple]) -> tuple:
+    """Corre en los workers: columnas de la tabla larga + errores (sku, origen, tipo, mensaje)."""
+    columnas = {c: [] for c in COLUMNAS}
+    errores = []
+    for sku, origen, entry in lote:
+        try:
+            raw = read_entry(origen, entry) if entry is not None else open(origen, "rb").read()
+            product_id, specs, atributos = extraer_producto(raw, sku)
+        except Exception as e:
+            errores.append((sku, origen, type(e).__name__, str(e)[:200]))
+            continue
+        for tipo, pares in (("spec", specs), ("attr", atributos)):
+            for nombre, valor in pares:
+                columnas["sku_id"].append(str(sku))
+                columnas["product_id"].append(str(product_id))
+                columnas["tipo"].append(tipo)
+                columnas["nombre"].append(nombre)
+                columnas["valor"].append(_valor(valor))
+    return columnas, errores, len(lote) - len(errores)
+
+
+def listar_origen(origen: str) -> List[tuple]:
+    """(sku, archivo o pack, entrada del índice) de cada producto del directorio o del ResponseStore."""
+    if os.path.exists(os.path.join(origen, INDEX_NAME)):
+        with ResponseStore(origen) as store:
+            pack = os.path.join(origen, PACK_NAME)
+            return [(key, pack, store.meta(key)) for key in store.keys()]
+    return [(nombre[:-len(".json")], os.path.join(origen, nombre), None)
+            for nombre in sorted(os.listdir(origen)) if nombre.endswith(".json")]
+
+
+def _lotes(items: List[tuple], chunk: int) -> Iterator[List[tuple]]:
+    for i in range(0, len(items), chunk):
+        yield items[i:i + chunk]
+
+
+def extraer_atributos(origen: str, destino: str, workers: Optional[int] = None, chunk: int = 256) -> dict:
+    """
+    Tabla larga de specs/atributos de todos los productos de `origen`, escrita en
+    `destino` lote a lote. `workers=1` corre en este proceso (sin pool).
+    """
+    t0 = time.perf_counter()
+    items = listar_origen(origen)
+    workers = workers or os.cpu_count() or 1
+    errores, tipos_error = [], Counter()
+    ok = filas = 0
+    writer = None
+    esquema = pa.schema([(c, pa.string()) for c in COLUMNAS]) if PYARROW_AVAILABLE else None
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        resultados = pool.map(_procesar_lote, _lotes(items, chunk)) if pool else map(_procesar_lote, _lotes(items, chunk))
+        for columnas, errores_lote, ok_lote in resultados:
+            ok += ok_lote
+            errores += errores_lote
+            tipos_error.update(e[2] for e in errores_lote)
+            if PYARROW_AVAILABLE:
+                if writer is None:
+                    writer = pq.ParquetWriter(destino, esquema, compression="zstd")
+                writer.write_table(pa.Table.from_pydict(columnas, schema=esquema))
+            else:
+                pd.DataFrame(columnas, columns=COLUMNAS).to_csv(destino, mode="a" if filas else "w",
+                                                                header=not filas, index=False)
+            filas += len(columnas["sku_id"])
+        if writer is None and PYARROW_AVAILABLE:
+            pq.write_table(pa.Table.from_pydict({c: [] for c in COLUMNAS}, schema=esquema), destino)
+    finally:
+        if writer is not None:
+            writer.close()
+        if pool is not None:
+            pool.shutdown()
+    if errores:
+        pd.DataFrame(errores, columns=["sku_id", "origen", "error", "detalle"]).to_csv(destino + ".errores.csv", index=False)
+    segundos = time.perf_counter() - t0
+    return {"archivos": len(items), "ok": ok, "errores": dict(tipos_error), "filas": filas,
+            "segundos": round(segundos, 2), "archivos_por_segundo": round(len(items) / segundos, 1) if segundos else 0.0,
+            "workers": workers, "destino": destino}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Specs y atributos de los JSON de detalle de Fravega")
+    parser.add_argument("origen", help="directorio de {sku}.json o carpeta de un ResponseStore")
+    parser.add_argument("destino", help="archivo de salida (.parquet, o .csv sin pyarrow)")
+    parser.add_argument("--workers", type=int, default=None, help="procesos (default: cantidad de CPUs)")
+    parser.add_argument("--chunk", type=int, default=256, help="archivos por lote")
+    args = parser.parse_args()
+    print(extraer_atributos(args.origen, args.destino, args.workers, args.chunk))
@@ -0,0 +1,294 @@
+"""
+Motor de crawling asíncrono para los scrapers de `scripts/`.
+
+- Un solo `httpx.AsyncClient` (conexiones keep-alive reutilizadas).
+- Rate limit por host con token bucket y concurrencia acotada (`concurrency` tareas).
+- Reintentos con backoff exponencial con jitter ante 429/5xx y errores de red
+  (respeta `Retry-After`).
+- Checkpoint JSONL con los jobs terminados: al relanzar se retoma donde quedó.
+- Con `refresh=True`, lo que ya está guardado se vuelve a pedir con un request
+  condicional (ETag / Last-Modified): un 304 no baja ni reprocesa nada. Los
+  jobs terminados en el checkpoint también se refrescan (el checkpoint sólo
+  evita volver a pedir lo que no tiene copia guardada).
+
+Cada sitio define sus tipos de job (subclases de `JobType`): cómo armar el request,
+dónde guardar la respuesta y qué jobs nuevos salen de ella (p.ej. las páginas
+siguientes de un listado).
+"""
+from __future__ import annotations
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """`rate` requests por segundo en promedio, con ráfagas de hasta `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                ahora = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (ahora - self.updated) * self.rate)
+                self.updated = ahora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Job:
+    """Una unidad de trabajo: `kind` elige el `JobType`, `key` la identifica en el checkpoint."""
+
+    def __init__(self, kind: str, key: str, **params):
+        self.kind = kind
+        self.key = f"{kind}:{key}"
+        self.params = params
+
+    def __repr__(self) -> str:
+        return f"Job({self.key})"
+
+
+class JobType:
+    """
+    Interfaz de un tipo de job. `request` devuelve los kwargs de `client.request`
+    (method, url, params, json, ...); `parse` recibe el JSON y devuelve jobs nuevos.
+    Por defecto la respuesta se guarda en `path(job)`, y si ese archivo ya existe
+    no se vuelve a pedir. Un tipo que guarde validadores (ETag, Last-Modified)
+    redefine `validators` y `not_modified` para los refrescos condicionales.
+    """
+
+    def request(self, job: Job) -> dict:
+        raise NotImplementedError
+
+    def path(self, job: Job) -> Optional[str]:
+        return None
+
+    def load(self, job: Job):
+        ruta = self.path(job)
+        if ruta and os.path.exists(ruta):
+            with open(ruta, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return None
+
+    def save(self, job: Job, data, response: Optional[httpx.Response] = None) -> bool:
+        """Guarda la respuesta; devuelve True si cambió respecto de la copia anterior."""
+        ruta = self.path(job)
+        if not ruta:
+            return True
+        if self.load(job) == data:
+            return False
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        tmp = ruta + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, ruta)
+        return True
+
+    def validators(self, job: Job) -> dict:
+        """Headers condicionales (If-None-Match, If-Modified-Since) para refrescar la copia guardada."""
+        return {}
+
+    def not_modified(self, job: Job, response: httpx.Response) -> None:
+        """El servidor respondió 304: la copia guardada sigue vigente."""
+
+    def parse(self, job: Job, data) -> Iterable[Job]:
+        return ()
+
+
+class Checkpoint:
+    """Archivo JSONL con el estado final de cada job (`ok` / `failed`)."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.estado: Dict[str, str] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        r = json.loads(linea)
+                    except ValueError:
+                        continue  # línea cortada por una interrupción
+                    self.estado[r["key"]] = r["status"]
+        self._f = None
+
+    def done(self, key: str, retry_failed: bool = False) -> bool:
+        status = self.estado.get(key)
+        return status == "ok" or (status == "failed" and not retry_failed)
+
+    def mark(self, key: str, status: str, **extra) -> None:
+        self.estado[key] = status
+        if not self.path:
+            return
+        if self._f is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._f = open(self.path, "a", encoding="utf-8")
+        self._f.write(json.dumps({"key": key, "status": status, "ts": time.time(), **extra}, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+class RetryableError(Exception):
+    pass
+
+
+class Crawler:
+    """
+    Procesa jobs con `concurrency` tareas sobre un cliente HTTP compartido. Uso:
+        crawler = Crawler({"listado": ListadoJob()}, concurrency=8, rate=2, checkpoint="datos/ckpt.jsonl")
+        stats = asyncio.run(crawler.run([Job("listado", "0", offset=0)]))
+    """
+
+    def __init__(self, job_types: Dict[str, JobType], concurrency: int = 8, rate: float = 2.0,
+                 burst: int = 1, max_retries: int = 5, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0, timeout: float = 20.0, checkpoint: Optional[str] = None,
+                 retry_failed: bool = False, headers: Optional[dict] = None,
+                 cookies: Optional[dict] = None, refresh: bool = False, verbose: bool = True):
+        self.job_types = job_types
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.checkpoint = Checkpoint(checkpoint)
+        self.retry_failed = retry_failed
+        self.headers = headers or {}
+        self.cookies = cookies or {}
+        self.refresh = refresh
+        self.verbose = verbose
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.stats = {"requests": 0, "retries": 0, "ok": 0, "failed": 0, "cached": 0, "skipped": 0,
+                      "changed": 0, "unchanged": 0, "not_modified": 0}
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return self._buckets[host]
+
+    def _backoff(self, intento: int, response: Optional[httpx.Response] = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(self.backoff_max, float(retry_after))
+        # "Full jitter": espera al azar entre 0 y el backoff exponencial
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** intento))
+
+    async def fetch(self, client: httpx.AsyncClient, kwargs: dict) -> httpx.Response:
+        """Request con rate limit por host y reintentos; levanta si se agotan los intentos."""
+        for intento in range(self.max_retries + 1):
+            await self._bucket(kwargs["url"]).acquire()
+            self.stats["requests"] += 1
+            try:
+                response = await client.request(**kwargs)
+                if response.status_code == 304:
+                    return response
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response
+                error = RetryableError(f"HTTP {response.status_code}")
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                response, error = None, e
+            if intento == self.max_retries:
+                raise error
+            self.stats["retries"] += 1
+            await asyncio.sleep(self._backoff(intento, response))
+
+    async def _process(self, client: httpx.AsyncClient, job: Job) -> List[Job]:
+        job_type = self.job_types[job.kind]
+        terminado = self.checkpoint.done(job.key, self.retry_failed)
+        data = job_type.load(job)
+        if data is None and terminado:
+            self.stats["skipped"] += 1
+            return []
+        if data is not None and not self.refresh:
+            self.stats["cached"] += 1
+        else:
+            kwargs = job_type.request(job)
+            if data is not None:
+                kwargs["headers"] = {**kwargs.get("headers", {}), **job_type.validators(job)}
+            response = await self.fetch(client, kwargs)
+            if response.status_code == 304 and data is not None:
+                job_type.not_modified(job, response)
+                self.stats["not_modified"] += 1
+            else:
+                try:
+                    data = response.json()
+                except ValueError:
+                    raise ValueError("No se pudo convertir a JSON la respuesta.")
+                self.stats["changed" if job_type.save(job, data, response) else "unchanged"] += 1
+        # Aunque el job ya esté en el checkpoint se re-parsea su respuesta guardada:
+        # así un listado interrumpido vuelve a generar las páginas que faltaban
+        nuevos = list(job_type.parse(job, data))
+        if not terminado:
+            self.checkpoint.mark(job.key, "ok")
+            self.stats["ok"] += 1
+        return nuevos
+
+    async def run(self, jobs: Iterable[Job]) -> dict:
+        t0 = time.perf_counter()
+        cola: asyncio.Queue = asyncio.Queue()
+        vistos = set()
+
+        def encolar(nuevos):
+            for job in nuevos:
+                if job.key not in vistos:
+                    vistos.add(job.key)
+                    cola.put_nowait(job)
+
+        async def worker(client):
+            while True:
+                job = await cola.get()
+                try:
+                    encolar(await self._process(client, job))
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    self.checkpoint.mark(job.key, "failed", error=str(e)[:200])
+                    print(f"ERROR en {job.key}: {e}")
+                finally:
+                    cola.task_done()
+                    hechos = self.stats["ok"] + self.stats["failed"]
+                    if self.verbose and hechos and hechos % 50 == 0:
+                        print(f"{hechos} jobs procesados ({cola.qsize()} en cola) - {self.stats}")
+
+        encolar(jobs)
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(headers=self.headers, cookies=self.cookies, timeout=self.timeout,
+                                     limits=limits, follow_redirects=True) as client:
+            tareas = [asyncio.create_task(worker(client)) for _ in range(self.concurrency)]
+            try:
+                await cola.join()
+            finally:
+                for tarea in tareas:
+                    tarea.cancel()
+                await asyncio.gather(*tareas, return_exceptions=True)
+                self.checkpoint.close()
+
+        segundos = time.perf_counter() - t0
+        self.stats["segundos"] = round(segundos, 2)
+        self.stats["jobs_por_segundo"] = round(self.stats["ok"] / segundos, 2) if segundos else 0.0
+        if self.verbose:
+            print(f"Crawl terminado: {self.stats}")
+        return self.stats
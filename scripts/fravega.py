@@ -4,18 +4,47 @@ import os
 # Agrega la carpeta 'scripts' al path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'scripts'))
 
-from .env import HEADERS, FRAVEGA_COOKIES
+try:
+    from .env import HEADERS, FRAVEGA_COOKIES
+except ImportError:
+    # env.py (headers y cookies de la sesión) no se versiona
+    HEADERS, FRAVEGA_COOKIES = {}, {}
 from .utils import obtener_json, guardar_json, make_request
+from .crawler import Crawler, Job, JobType
+from .response_store import ResponseStore
+import argparse
+import asyncio
+import glob
+import re
 import requests
 import time
 import random
 import pandas as pd
 import json     
 
+# pyarrow y orjson son opcionales: Parquet como salida columnar y un parser JSON más rápido
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 page_size = 50
 
-def obtener_productos(offset=0, page_size=50, brand='lenovo'):
-    json_data = {
+# Se puede apuntar a otro host (p.ej. `scripts/stub_server.py`) con FRAVEGA_BASE_URL
+FRAVEGA_BASE_URL = os.getenv('FRAVEGA_BASE_URL', 'https://www.fravega.com')
+FRAVEGA_BUILD_ID = '8henYVaMxxJpVLpcaFKz2'
+
+def payload_productos(offset=0, page_size=50, brand='lenovo'):
+    """Body GraphQL de una página del listado de productos."""
+    return {
         'operationName': 'listProducts_Shopping',
         'variables': {
             'customSorted': False,
@@ -41,7 +70,9 @@ def obtener_productos(offset=0, page_size=50, brand='lenovo'):
         'query': 'query listProducts_Shopping($size: PositiveInt!, $isSingleCategory: Boolean!, $offset: Int, $sorting: [SortOption!], $customSorted: Boolean = false, $filtering: ItemFilteringInputType, $isGeoLocated: Boolean = false) {\n  items(filtering: $filtering) {\n    total\n    recommendations {\n      keywords: products\n      __typename\n    }\n    results(\n      size: $size\n      buckets: [{sorting: $sorting, customSorted: $customSorted, offset: $offset}]\n    ) {\n      ...extendedItemFragment\n      __typename\n    }\n    aggregations {\n      availableStock @include(if: $isGeoLocated) {\n        ...availabilityStockAggregation\n        __typename\n      }\n      sellerCondition(size: $size) {\n        cardinality\n        values {\n          count\n          filtered\n          condition\n          __typename\n        }\n        __typename\n      }\n      collections(aggregable: true) {\n        values {\n          ...collectionAggregationFragment\n          __typename\n        }\n        __typename\n      }\n      installments {\n        values {\n          ...collectionAggregationFragment\n          __typename\n        }\n        __typename\n      }\n      categories(market: "fravega", flattened: $isSingleCategory) {\n        ...categoryAggregationFragment\n        children {\n          ...categoryAggregationFragment\n          __typename\n        }\n        __typename\n      }\n      attributes {\n        ...attributeAggregationFragment\n        __typename\n      }\n      salePrice {\n        ...rangedSalePriceAggregationFragment\n        __typename\n      }\n      brands {\n        cardinality\n        values(size: 6, sorting: FREQUENCY) {\n          ...brandAggregationFragment\n          __typename\n        }\n        __typename\n      }\n      __typename\n    }\n    listUniqueId\n    __typename\n  }\n}\n\nfragment extendedItemFragment on ExtendedItem {\n  sellers {\n    commercialName\n    __typename\n  }\n  stockLabels\n  id\n  title\n  katalogCategoryId\n  brand {\n    id\n    name\n    __typename\n  }\n  skus {\n    results {\n      code\n      categorization(market: "fravega") {\n        name\n        slug\n        __typename\n      }\n      resolvedBidId\n      sponsored\n      campaignId\n      pricing(channel: "fravega-ecommerce") {\n        channel\n        listPrice\n        salePrice\n        discount\n        __typename\n      }\n      netPricing: pricing(channel: "net-price") {\n        channel\n        listPrice\n        salePrice\n        discount\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n  gtin {\n    __typename\n    ... on EAN {\n      number\n      __typename\n    }\n  }\n  id\n  images\n  collections(onlyThoseWithCockade: true) {\n    cardinality\n    values {\n      id\n      name\n      slug\n      count\n      cockade(tag: "listing") {\n        position\n        image\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n  installments {\n    cardinality\n    values {\n      id\n      name\n      slug\n      count\n      cockade(tag: "listing") {\n        position\n        image\n        __typename\n      }\n      __typename\n    }\n    __typename\n  }\n  listPrice {\n    amounts {\n      min\n      max\n      __typename\n    }\n    __typename\n  }\n  salePrice {\n    amounts {\n      min\n      max\n      __typename\n    }\n    discounts {\n      min\n      max\n      __typename\n    }\n    __typename\n  }\n  slug\n  __typename\n}\n\nfragment availabilityStockAggregation on AvailabilityStockAggregation {\n  deliveryTerms {\n    value\n    count\n    __typename\n  }\n  types {\n    value\n    count\n    __typename\n  }\n  costs {\n    value\n    count\n    __typename\n  }\n  __typename\n}\n\nfragment collectionAggregationFragment on CollectionAggregation {\n  id\n  name\n  count\n  slug\n  filtered\n  __typename\n}\n\nfragment categoryAggregationFragment on CategoryAggregation {\n  name\n  slug\n  count\n  path {\n    id\n    name\n    slug\n    __typename\n  }\n  children {\n    name\n    slug\n    count\n    path {\n      id\n      name\n      slug\n      __typename\n    }\n    __typename\n  }\n  __typename\n}\n\nfragment attributeAggregationFragment on AttributeAggregation {\n  name\n  slug\n  tags\n  measureUnit {\n    name\n    symbol\n    __typename\n  }\n  values(size: 20) {\n    type\n    value\n    slug\n    count\n    seo\n    filtered\n    __typename\n  }\n  ranges {\n    from\n    to\n    count\n    value\n    slug\n    seo\n    filtered {\n      from\n      to\n      value\n      slug\n      seo\n      __typename\n    }\n    __typename\n  }\n  __typename\n}\n\nfragment rangedSalePriceAggregationFragment on RangedSalePriceAggregation {\n  amounts {\n    ranges(size: 3) {\n      from\n      to\n      count\n      value\n      slug\n      __typename\n    }\n    min\n    max\n    __typename\n  }\n  discounts {\n    ranges(interval: 10) {\n      from\n      count\n      value\n      slug\n      __typename\n    }\n    __typename\n  }\n  __typename\n}\n\nfragment brandAggregationFragment on BrandAggregation {\n  name\n  count\n  slug\n  image\n  filtered\n  __typename\n}\n',
     }
 
-    response = requests.post('https://www.fravega.com/api/v1', cookies=FRAVEGA_COOKIES, headers=HEADERS, json=json_data)
+def obtener_productos(offset=0, page_size=50, brand='lenovo'):
+    json_data = payload_productos(offset=offset, page_size=page_size, brand=brand)
+    response = requests.post(f'{FRAVEGA_BASE_URL}/api/v1', cookies=FRAVEGA_COOKIES, headers=HEADERS, json=json_data)
     return response
 
 def generar_json(response: requests.Response):
@@ -115,6 +146,110 @@ def transformaciones(data_json: dict):
 
     return df.merge(df_skus, on='id').drop('skus_results', axis=1)
 
+# --- Transformación en streaming (todos los productos-offset*.json) ---
+
+COLUMNAS_SKUS = ['id', 'title', 'katalogCategoryId', 'slug', 'brand_id', 'brand_name',
+                 'sku_id', 'categories', 'list_price', 'sale_price', 'gtin']
+
+def cargar_json(archivo):
+    with open(archivo, 'rb') as f:
+        return orjson.loads(f.read()) if ORJSON_AVAILABLE else json.load(f)
+
+def iter_listados(ruta):
+    """Los `productos-offset<N>.json` guardados por `scraping` (mismo prefijo `ruta`), de a uno y por offset."""
+    archivos = glob.glob(ruta + 'productos-offset*.json')
+    archivos.sort(key=lambda a: int(re.search(r'offset(\d+)\.json$', a).group(1)))
+    for archivo in archivos:
+        yield cargar_json(archivo)
+
+def _pricing_preferido(pricing):
+    """Mismo criterio que `transformaciones`: el canal 'fravega-ecommerce' si está, si no el primero."""
+    if not isinstance(pricing, list) or not pricing:
+        return {}
+    for p in pricing:
+        if isinstance(p, dict) and p.get('channel') == 'fravega-ecommerce':
+            return p
+    return pricing[0] if isinstance(pricing[0], dict) else {}
+
+def filas_skus(data_json: dict, vistos: set = None):
+    """
+    Una fila por SKU (columnas `COLUMNAS_SKUS`) en una sola pasada sobre el JSON,
+    sin DataFrames intermedios. `vistos` descarta SKUs repetidos entre páginas
+    (como el `drop_duplicates` sobre `sku_code`).
+    """
+    vistos = set() if vistos is None else vistos
+    for producto in ((data_json.get('data') or {}).get('items') or {}).get('results') or []:
+        brand = producto.get('brand') or {}
+        skus = (producto.get('skus') or {}).get('results') or []
+        # Un producto sin SKUs no genera filas
+        for sku in sorted((s for s in skus if isinstance(s, dict)), key=lambda s: str(s.get('code'))):
+            codigo = sku.get('code')
+            if codigo in vistos:
+                continue
+            vistos.add(codigo)
+            categ = sku.get('categorization')
+            ruta_cat = categ[0] if isinstance(categ, list) and categ and isinstance(categ[0], list) else []
+            precio = _pricing_preferido(sku.get('pricing'))
+            gtin = producto.get('gtin') or {}
+            yield (producto.get('id'), producto.get('title'), producto.get('katalogCategoryId'),
+                   producto.get('slug'), brand.get('id'), brand.get('name'), codigo,
+                   [c.get('name') for c in ruta_cat if isinstance(c, dict)],
+                   precio.get('listPrice'), precio.get('salePrice'),
+                   gtin.get('number') if isinstance(gtin, dict) else None)
+
+def _esquema_skus():
+    texto = pa.string()
+    return pa.schema([(c, texto) for c in COLUMNAS_SKUS[:7]] +
+                     [('categories', pa.list_(texto)), ('list_price', pa.float64()), ('sale_price', pa.float64()),
+                      ('gtin', texto)])
+
+def _str_o_none(v):
+    return None if v is None else str(v)
+
+def transformaciones_stream(listados, destino, chunk_rows=20_000):
+    """
+    Como `transformaciones` sobre todas las páginas de `listados` (iterable de JSON,
+    p.ej. `iter_listados(ruta)`), escribiendo de a `chunk_rows` filas en `destino`:
+    Parquet si está pyarrow, si no CSV. La memoria no crece con el número de
+    páginas (salvo el set de sku_ids vistos, para descartar repetidos).
+    """
+    t0 = time.perf_counter()
+    vistos = set()
+    buffer = []
+    filas = paginas = 0
+    writer = None
+    try:
+        def volcar():
+            nonlocal writer
+            if PYARROW_AVAILABLE:
+                columnas = list(zip(*buffer)) or [()] * len(COLUMNAS_SKUS)
+                arrays = [pa.array([_str_o_none(v) for v in columnas[i]], pa.string()) for i in range(7)]
+                arrays += [pa.array(columnas[7], pa.list_(pa.string())),
+                           pa.array(columnas[8], pa.float64(), from_pandas=True),
+                           pa.array(columnas[9], pa.float64(), from_pandas=True),
+                           pa.array([_str_o_none(v) for v in columnas[10]], pa.string())]
+                if writer is None:
+                    writer = pq.ParquetWriter(destino, _esquema_skus(), compression='zstd')
+                writer.write_table(pa.Table.from_arrays(arrays, schema=_esquema_skus()))
+            else:
+                pd.DataFrame(buffer, columns=COLUMNAS_SKUS).to_csv(
+                    destino, mode='a' if filas > len(buffer) else 'w', header=filas <= len(buffer), index=False)
+            buffer.clear()
+
+        for data_json in listados:
+            paginas += 1
+            for fila in filas_skus(data_json, vistos):
+                buffer.append(fila)
+                filas += 1
+                if len(buffer) >= chunk_rows:
+                    volcar()
+        if buffer or filas == 0:
+            volcar()
+    finally:
+        if writer is not None:
+            writer.close()
+    return {'paginas': paginas, 'filas': filas, 'segundos': round(time.perf_counter() - t0, 2), 'destino': destino}
+
 def scraping(ruta, max_productos=500, page_size=50, start_offset=0, max_offset=None, delay=5):
     """
     Descarga páginas de productos y guarda cada respuesta JSON en un archivo.
@@ -172,27 +307,40 @@ def scraping(ruta, max_productos=500, page_size=50, start_offset=0, max_offset=N
 
 # --- Fase 2: Productos individuales ---
 
-def get_product_data(output_dir_path, product_slug, product_sku):
+def url_producto(product_slug, product_sku):
+    """URL y params del JSON de detalle de un producto (datos de la página de Next.js)."""
+    product_url = f'{FRAVEGA_BASE_URL}/_next/data/{FRAVEGA_BUILD_ID}/es-AR/p/{product_slug}-{str(product_sku)}.json'
+    product_params = {
+        'slug': str(product_slug),
+        'sku': str(product_sku),
+        'productSlug': str(product_slug) + '-' + str(product_sku),
+    }
+    return product_url, product_params
+
+def get_product_data(output_dir_path, product_slug, product_sku, store: ResponseStore = None):
+    """Detalle de un producto; con `store` se lee/guarda en el ResponseStore en vez de `{sku}.json`."""
     try:
         # comprobación de existencia
-
-        output_path = f'{output_dir_path}/{product_sku}.json'
-        if os.path.exists(output_path):
-            with open(output_path, 'r', encoding='utf-8') as archivo:
-                return json.load(archivo)
+        if store is not None:
+            data_json = store.get(product_sku)
+            if data_json is not None:
+                return data_json
+        else:
+            output_path = f'{output_dir_path}/{product_sku}.json'
+            if os.path.exists(output_path):
+                with open(output_path, 'r', encoding='utf-8') as archivo:
+                    return json.load(archivo)
         
         # requests en caso de no haberse hecho anteriormente
-        product_url = f'https://www.fravega.com/_next/data/8henYVaMxxJpVLpcaFKz2/es-AR/p/{product_slug}-{str(product_sku)}.json'    
-        product_params = {
-            'slug': str(product_slug),
-            'sku': str(product_sku),
-            'productSlug': str(product_slug) + '-' + str(product_sku),
-        }
+        product_url, product_params = url_producto(product_slug, product_sku)
 
         response = make_request('GET', url=product_url, headers=HEADERS, params=product_params)
         if response.status_code == 200:
             data_json = generar_json(response)
-            guardar_json(data_json, nombre_archivo=output_path)
+            if store is not None:
+                store.put(product_sku, data_json, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            else:
+                guardar_json(data_json, nombre_archivo=output_path)
             return data_json
 
     except Exception as e:
@@ -233,10 +381,129 @@ def scrape_products(products_info: list[tuple[str, int]]):
         time.sleep(random_sleep)
         continue
         
+# --- Versión asíncrona (scripts/crawler.py) ---
+
+class ListadoJob(JobType):
+    """
+    Una página del listado (`obtener_productos`). La primera página trae el total,
+    así que genera de una vez los jobs de las demás y se bajan en paralelo. Con
+    `detalle=True` cada producto del listado genera además su `ProductoJob`.
+    """
+
+    def __init__(self, ruta, page_size=50, brand='lenovo', max_productos=None, detalle=False):
+        self.ruta = ruta
+        self.page_size = page_size
+        self.brand = brand
+        self.max_productos = max_productos
+        self.detalle = detalle
+
+    def request(self, job):
+        return {'method': 'POST', 'url': f'{FRAVEGA_BASE_URL}/api/v1',
+                'json': payload_productos(job.params['offset'], self.page_size, self.brand)}
+
+    def path(self, job):
+        return self.ruta + f'productos-offset{job.params["offset"]}.json'
+
+    def parse(self, job, data):
+        items = (data.get('data') or {}).get('items') or {}
+        results = items.get('results') or []
+        offset = job.params['offset']
+        limite = items.get('total')
+        if self.max_productos is not None:
+            limite = min(limite, self.max_productos) if limite is not None else self.max_productos
+        if limite is not None and offset == 0:
+            siguientes = range(self.page_size, limite, self.page_size)
+        elif limite is None and len(results) == self.page_size:
+            # Sin total conocido se sigue página a página hasta una incompleta
+            siguientes = [offset + self.page_size]
+        else:
+            siguientes = []
+        for o in siguientes:
+            yield Job('listado', str(o), offset=o)
+        if self.detalle:
+            for producto in results:
+                for sku in (producto.get('skus') or {}).get('results') or []:
+                    yield Job('producto', str(sku['code']), slug=producto['slug'], sku=sku['code'])
+
+class ProductoJob(JobType):
+    """
+    El JSON de detalle de un producto (`get_product_data`): en el ResponseStore si
+    se pasa `store` (con ETag / Last-Modified para refrescar con requests
+    condicionales), si no como `<sku>.json` en `output_dir_path`.
+    """
+
+    def __init__(self, output_dir_path, store: ResponseStore = None):
+        self.output_dir_path = output_dir_path
+        self.store = store
+
+    def request(self, job):
+        url, params = url_producto(job.params['slug'], job.params['sku'])
+        return {'method': 'GET', 'url': url, 'params': params}
+
+    def path(self, job):
+        return None if self.store is not None else f'{self.output_dir_path}/{job.params["sku"]}.json'
+
+    def load(self, job):
+        return self.store.get(job.params['sku']) if self.store is not None else super().load(job)
+
+    def save(self, job, data, response=None):
+        if self.store is None:
+            return super().save(job, data, response)
+        headers = response.headers if response is not None else {}
+        return self.store.put(job.params['sku'], data, headers.get('ETag'), headers.get('Last-Modified'))
+
+    def validators(self, job):
+        return self.store.conditional_headers(job.params['sku']) if self.store is not None else {}
+
+    def not_modified(self, job, response):
+        if self.store is not None:
+            self.store.touch(job.params['sku'], response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+def crear_crawler(ruta='datos/fravega/', output_dir_path='datos/lenovo/productos', page_size=50,
+                  brand='lenovo', max_productos=None, detalle=False, store: ResponseStore = None, **kwargs):
+    """Crawler con los dos tipos de job de Fravega; `kwargs` van a `Crawler` (concurrency, rate, checkpoint, refresh...)."""
+    kwargs.setdefault('headers', HEADERS)
+    kwargs.setdefault('cookies', FRAVEGA_COOKIES)
+    return Crawler({'listado': ListadoJob(ruta, page_size, brand, max_productos, detalle),
+                    'producto': ProductoJob(output_dir_path, store)}, **kwargs)
+
+async def scraping_async(ruta, max_productos=500, page_size=50, start_offset=0, detalle=False, **kwargs):
+    """Como `scraping`, pero las páginas (y con `detalle` los productos) se bajan en paralelo."""
+    crawler = crear_crawler(ruta=ruta, page_size=page_size, max_productos=max_productos, detalle=detalle, **kwargs)
+    return await crawler.run([Job('listado', str(start_offset), offset=start_offset)])
+
+async def scrape_products_async(products_info: list[tuple[str, int]], output_dir_path='datos/lenovo/productos', **kwargs):
+    """Como `scrape_products`, con concurrencia acotada y rate limit en lugar de esperas fijas."""
+    crawler = crear_crawler(output_dir_path=output_dir_path, **kwargs)
+    return await crawler.run(Job('producto', str(sku), slug=slug, sku=sku) for slug, sku in products_info)
+
+def atributos_cambiados(store: ResponseStore, desde: float) -> list[dict]:
+    """`get_product_attributes` sólo de los productos nuevos o que cambiaron desde `desde` (timestamp)."""
+    return [get_product_attributes(store.get(sku)) for sku in store.changed_since(desde)]
+
 if __name__ == '__main__':
-   df = pd.read_csv('datos/lenovo/productos-lenovo-fravega.csv')
+   parser = argparse.ArgumentParser(description='Detalle de los productos de Fravega')
+   parser.add_argument('--csv', default='datos/lenovo/productos-lenovo-fravega.csv')
+   parser.add_argument('--output', default='datos/lenovo/productos')
+   parser.add_argument('--concurrency', type=int, default=4)
+   parser.add_argument('--rate', type=float, default=1.0, help='requests por segundo por host')
+   parser.add_argument('--checkpoint', default='datos/lenovo/productos.checkpoint.jsonl')
+   parser.add_argument('--retry-failed', action='store_true')
+   parser.add_argument('--store', help='carpeta del ResponseStore (en lugar de un {sku}.json por producto)')
+   parser.add_argument('--refresh', action='store_true',
+                       help='volver a pedir lo ya guardado con requests condicionales (incluso los ya terminados en el checkpoint)')
+   args = parser.parse_args()
+
+   df = pd.read_csv(args.csv)
    tuplas = list(
        (df.iloc[x].slug, df.iloc[x].sku_id) for x in range(len(df))
    )
 
-   scrape_products(tuplas)
\ No newline at end of file
+   store = ResponseStore(args.store) if args.store else None
+   inicio = time.time()
+   asyncio.run(scrape_products_async(tuplas, args.output, concurrency=args.concurrency, rate=args.rate,
+                                     checkpoint=args.checkpoint, retry_failed=args.retry_failed,
+                                     store=store, refresh=args.refresh))
+   if store is not None:
+       print(f'{len(store.changed_since(inicio))} productos nuevos o modificados - {store.summary()}')
+       store.close()
\ No newline at end of file
@@ -1,58 +1,159 @@
-import time, os, json
-import requests
-from utils import obtener_json, guardar_json, HEADERS
-from urllib.parse import quote, unquote
+"""
+Listados por categoría de la tienda de Lenovo (openapi.lenovo.com), con el
+motor de `scripts/crawler.py`.
 
+- Cada página se pide con su propio número (`page` dentro de `params`).
+- Las páginas se bajan en paralelo con rate limit por host. Si la primera
+  página trae el total (`pageCount` / `count`) se encolan todas de una; si no,
+  cada página completa encola las `ventana` siguientes, y el crawl termina
+  cuando una página trae menos de `pageSize` productos.
+- Cada categoría tiene su checkpoint (`datos/lenovo/<categoria>/checkpoint.jsonl`)
+  y sus páginas en `datos/lenovo/<categoria>/<categoria>-<page>.json`: al
+  relanzar sólo se piden las páginas que faltan.
 
-def crear_carpeta_categoria(categoria: str):
-    full_path = 'datos/lenovo/{}'.format(categoria)
+Uso: python -m scripts.lenovo [--categorias notebooks] [--concurrency 4] [--rate 1]
+"""
+import argparse
+import asyncio
+import json
+import os
+from urllib.parse import unquote
+
+from .utils import HEADERS
+from .crawler import Crawler, Job, JobType
+
+LENOVO_URL = os.getenv("LENOVO_URL", "https://openapi.lenovo.com/ar/es/ofp/search/dlp/product/query/get/_tsc")
+DATOS_LENOVO = 'datos/lenovo'
+MAX_PAGES = 50
+# Páginas que se piden por adelantado cuando la API no informa el total
+VENTANA = 4
+
+dict_categorias = [
+    {
+        'categoria': 'notebooks',
+        'page_id': '0a64ace1-c4e1-4520-9197-5eecc03402cc',
+        'decoded_params': '%7B%22classificationGroupIds%22%3A%22400001%22%2C%22pageFilterId%22%3A%2285803b1e-5106-4453-9710-26ed58925af3%22%2C%22facets%22%3A%5B%5D%2C%22page%22%3A%221%22%2C%22pageSize%22%3A20%2C%22groupCode%22%3A%22%22%2C%22init%22%3Atrue%2C%22sorts%22%3A%5B%22priceUp%22%5D%2C%22version%22%3A%22v2%22%2C%22enablePreselect%22%3Atrue%2C%22subseriesCode%22%3A%22%22%7D'
+    },
+    # Computadoras escritorio: falta el `decoded_params` de su listado
+    # {'categoria': 'pc-escritorio', 'page_id': '85803b1e-5106-4453-9710-26ed58925af3', 'decoded_params': ...},
+]
+
+
+def crear_carpeta_categoria(categoria: str, root: str = DATOS_LENOVO):
+    full_path = '{}/{}'.format(root, categoria)
     if not os.path.exists(full_path):
         os.makedirs(full_path)
 
     return full_path
 
-def encoding(url_encoded, page):
-    url_params = unquote(url_encoded)
-    return quote(url_params.replace('"page":"1"', f'"page":"{page}"'), safe='')
+def params_pagina(decoded_params: str, page: int) -> dict:
+    """Los `params` del listado (JSON, url-encoded en `dict_categorias`) con el número de página."""
+    params = json.loads(unquote(decoded_params))
+    params['page'] = str(page)
+    return params
 
 def make_params(pageId, params):
     return {
         'pageFilterId': pageId,
         'subSeriesCode': '',
         'loyalty': 'false',
-        'params': quote(str(params), safe=''),
+        'params': json.dumps(params, ensure_ascii=False, separators=(',', ':')),
     }
 
-def obtener_datos(categoria, page_id, decoded_params, max_page=20, time_sleep=2):
-    path_categoria = crear_carpeta_categoria(categoria)
-    url = "https://openapi.lenovo.com/ar/es/ofp/search/dlp/product/query/get/_tsc"
+def productos_pagina(data) -> list:
+    """Productos de una respuesta del listado (`data.data`, o `data.data[*].products` agrupados)."""
+    cuerpo = data.get('data') if isinstance(data, dict) else None
+    if isinstance(cuerpo, dict):
+        cuerpo = cuerpo.get('data') or cuerpo.get('products') or []
+    if not isinstance(cuerpo, list):
+        return []
+    if cuerpo and all(isinstance(x, dict) and isinstance(x.get('products'), list) for x in cuerpo):
+        return [p for grupo in cuerpo for p in grupo['products']]
+    return cuerpo
+
+def total_paginas(data, page_size: int):
+    """Cantidad de páginas según la respuesta (None si no lo informa)."""
+    cuerpo = data.get('data') if isinstance(data, dict) else None
+    if not isinstance(cuerpo, dict):
+        return None
+    if str(cuerpo.get('pageCount', '')).isdigit():
+        return int(cuerpo['pageCount'])
+    total = cuerpo.get('count', cuerpo.get('total'))
+    if str(total).isdigit():
+        return -(-int(total) // page_size)
+    return None
+
+
+class PaginaLenovoJob(JobType):
+    """Una página del listado de una categoría de `dict_categorias`."""
 
-    for page in range(0, MAX_PAGES):
+    def __init__(self, categoria: dict, root: str = DATOS_LENOVO, max_page: int = MAX_PAGES, ventana: int = VENTANA):
+        self.categoria = categoria
+        self.carpeta = crear_carpeta_categoria(categoria['categoria'], root)
+        self.page_size = int(params_pagina(categoria['decoded_params'], 1).get('pageSize', 20))
+        self.max_page = max_page
+        self.ventana = max(1, ventana)
 
-        params = make_params(page_id, decoded_params)
-        response = requests.get(url=url, headers=HEADERS, params=params)
-        if response.status_code == 200:
-            json_data = response.json()
-            if json_data.get('status') == 200:
-                with open(f'{path_categoria}/{categoria}-{page}.json', 'w', encoding="utf-8") as f:
-                    json.dump(json_data, fp=f, ensure_ascii=False, indent=2)
-                time.sleep(time_sleep)
+    def request(self, job):
+        params = params_pagina(self.categoria['decoded_params'], job.params['page'])
+        return {'method': 'GET', 'url': LENOVO_URL, 'params': make_params(self.categoria['page_id'], params)}
+
+    def path(self, job):
+        return f'{self.carpeta}/{self.categoria["categoria"]}-{job.params["page"]}.json'
+
+    def save(self, job, data, response=None):
+        # La API responde HTTP 200 con el error en el body
+        if isinstance(data, dict) and data.get('status') not in (200, '200', None):
+            raise ValueError(f'status {data.get("status")}: {data.get("msg") or data.get("message")}')
+        return super().save(job, data, response)
+
+    def parse(self, job, data):
+        page = job.params['page']
+        if len(productos_pagina(data)) < self.page_size:
+            return  # última página
+        total = total_paginas(data, self.page_size)
+        if total is not None:
+            siguientes = range(page + 1, min(total, self.max_page) + 1)
         else:
-            break
+            siguientes = range(page + 1, min(page + self.ventana, self.max_page) + 1)
+        for p in siguientes:
+            yield Job(self.categoria['categoria'], str(p), page=p)
 
-dict_categorias = [
-    {
-        'categoria': 'notebooks',
-        'page_id': '0a64ace1-c4e1-4520-9197-5eecc03402cc',
-        'decoded_params': '%7B%22classificationGroupIds%22%3A%22400001%22%2C%22pageFilterId%22%3A%2285803b1e-5106-4453-9710-26ed58925af3%22%2C%22facets%22%3A%5B%5D%2C%22page%22%3A%221%22%2C%22pageSize%22%3A20%2C%22groupCode%22%3A%22%22%2C%22init%22%3Atrue%2C%22sorts%22%3A%5B%22priceUp%22%5D%2C%22version%22%3A%22v2%22%2C%22enablePreselect%22%3Atrue%2C%22subseriesCode%22%3A%22%22%7D'
-    }
-]
 
-### Notebooks
-URL = ""
-MAX_PAGES = 50
-TIME_SLEEP = 2
+async def obtener_datos_async(categoria: dict, root: str = DATOS_LENOVO, max_page: int = MAX_PAGES,
+                              ventana: int = VENTANA, **kwargs) -> dict:
+    """Baja todas las páginas de una categoría; `kwargs` van a `Crawler` (concurrency, rate, retry_failed...)."""
+    job_type = PaginaLenovoJob(categoria, root, max_page, ventana)
+    kwargs.setdefault('headers', HEADERS)
+    kwargs.setdefault('checkpoint', os.path.join(job_type.carpeta, 'checkpoint.jsonl'))
+    crawler = Crawler({categoria['categoria']: job_type}, **kwargs)
+    return await crawler.run([Job(categoria['categoria'], '1', page=1)])
+
+def obtener_datos(categoria, page_id, decoded_params, max_page=MAX_PAGES, **kwargs):
+    """Versión sincrónica para una categoría suelta (misma firma que antes)."""
+    return asyncio.run(obtener_datos_async({'categoria': categoria, 'page_id': page_id,
+                                            'decoded_params': decoded_params}, max_page=max_page, **kwargs))
+
+async def obtener_categorias(categorias=None, **kwargs) -> dict:
+    """Crawl de las categorías de `dict_categorias` (todas o las nombradas), una después de otra."""
+    stats = {}
+    for categoria in dict_categorias:
+        if categorias and categoria['categoria'] not in categorias:
+            continue
+        stats[categoria['categoria']] = await obtener_datos_async(categoria, **kwargs)
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Listados por categoría de la tienda de Lenovo')
+    parser.add_argument('--categorias', nargs='+', default=None, help='por defecto todas las de dict_categorias')
+    parser.add_argument('--root', default=DATOS_LENOVO)
+    parser.add_argument('--max-page', type=int, default=MAX_PAGES)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=0.5, help='requests por segundo por host')
+    parser.add_argument('--retry-failed', action='store_true')
+    args = parser.parse_args()
 
-# Computadoras escritorio
-crear_carpeta_categoria('pc-escritorio')
-escritorio_page_id = "85803b1e-5106-4453-9710-26ed58925af3"
+    print(asyncio.run(obtener_categorias(args.categorias, root=args.root, max_page=args.max_page,
+                                         concurrency=args.concurrency, rate=args.rate,
+                                         retry_failed=args.retry_failed)))
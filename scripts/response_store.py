@@ -0,0 +1,261 @@
+"""
+Almacén de respuestas de los scrapers, direccionado por contenido.
+
+En lugar de miles de `{sku}.json` con indentación:
+- `<root>/respuestas.pack`: archivo append-only con los bodies comprimidos
+  (zstd si está `zstandard`, si no gzip). Un body idéntico a uno ya guardado no
+  se vuelve a escribir (dedup por hash del contenido).
+- `<root>/respuestas.index.jsonl`: índice append-only, una línea por
+  actualización: clave (SKU) -> hash, posición en el pack, ETag / Last-Modified
+  y cuándo se bajó, se verificó y cambió por última vez. Gana la última línea.
+
+Con el ETag / Last-Modified guardado, una pasada de refresco manda requests
+condicionales (If-None-Match / If-Modified-Since): lo que no cambió vuelve como
+304 o con el mismo hash, y `changed_since` dice qué hay que reprocesar.
+
+Uso: python -m scripts.response_store import datos/lenovo/productos datos/lenovo/respuestas
+     python -m scripts.response_store stats datos/lenovo/respuestas
+     python -m scripts.response_store compact datos/lenovo/respuestas
+"""
+from __future__ import annotations
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+# zstandard es opcional: comprime mejor y más rápido que gzip
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+PACK_NAME = "respuestas.pack"
+INDEX_NAME = "respuestas.index.jsonl"
+
+
+def _compress(raw: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(raw)
+    return gzip.compress(raw, compresslevel=6, mtime=0)
+
+
+def _decompress(blob: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("El pack tiene bodies zstd y `zstandard` no está instalado")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+
+def read_entry(pack_path: str, entry: dict) -> bytes:
+    """Body (JSON sin parsear) de una entrada del índice, leyendo directo del pack (sirve desde otro proceso)."""
+    with open(pack_path, "rb") as f:
+        f.seek(entry["offset"])
+        return _decompress(f.read(entry["length"]), entry["codec"])
+
+
+def content_hash(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+
+def encode_body(data) -> bytes:
+    """JSON compacto (sin indentación): lo que se hashea y se comprime."""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ResponseStore:
+    """Pack + índice de respuestas JSON por clave. Thread-safe."""
+
+    def __init__(self, root: str, codec: Optional[str] = None):
+        self.root = root
+        self.codec = codec or ("zstd" if ZSTD_AVAILABLE else "gzip")
+        os.makedirs(root, exist_ok=True)
+        self.pack_path = os.path.join(root, PACK_NAME)
+        self.index_path = os.path.join(root, INDEX_NAME)
+        self.entries: Dict[str, dict] = {}
+        self.blobs: Dict[str, dict] = {}   # hash -> {"offset", "length", "codec"}
+        self._lock = threading.Lock()
+        self._load_index()
+        self._pack = open(self.pack_path, "ab+")
+        self._index = open(self.index_path, "a", encoding="utf-8")
+        self.stats = {"writes": 0, "dedup": 0, "bytes_raw": 0, "bytes_packed": 0}
+
+    def _load_index(self) -> None:
+        if not os.path.exists(self.index_path):
+            return
+        tam_pack = os.path.getsize(self.pack_path) if os.path.exists(self.pack_path) else 0
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    entry = json.loads(linea)
+                except ValueError:
+                    continue  # línea cortada por una interrupción
+                if entry["offset"] + entry["length"] > tam_pack:
+                    continue  # el body no llegó a escribirse completo
+                self.entries[entry["key"]] = entry
+                self.blobs.setdefault(entry["hash"], {k: entry[k] for k in ("offset", "length", "codec")})
+
+    def close(self) -> None:
+        with self._lock:
+            self._pack.close()
+            self._index.close()
+
+    def __enter__(self) -> "ResponseStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __contains__(self, key) -> bool:
+        return str(key) in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def keys(self) -> List[str]:
+        return list(self.entries)
+
+    def meta(self, key) -> Optional[dict]:
+        return self.entries.get(str(key))
+
+    def get_raw(self, key) -> Optional[bytes]:
+        entry = self.entries.get(str(key))
+        if entry is None:
+            return None
+        with self._lock:
+            self._pack.seek(entry["offset"])
+            blob = self._pack.read(entry["length"])
+        return _decompress(blob, entry["codec"])
+
+    def get(self, key):
+        raw = self.get_raw(key)
+        return json.loads(raw) if raw is not None else None
+
+    def conditional_headers(self, key) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since con lo que devolvió el servidor la última vez."""
+        entry = self.entries.get(str(key)) or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _append_index(self, entry: dict) -> None:
+        self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._index.flush()
+
+    def put(self, key, data, etag: Optional[str] = None, last_modified: Optional[str] = None) -> bool:
+        """Guarda la respuesta de `key`; devuelve True si el contenido cambió (o es nueva)."""
+        key = str(key)
+        raw = encode_body(data)
+        h = content_hash(raw)
+        ahora = time.time()
+        with self._lock:
+            anterior = self.entries.get(key)
+            cambio = anterior is None or anterior["hash"] != h
+            blob = self.blobs.get(h)
+            if blob is None:
+                comprimido = _compress(raw, self.codec)
+                self._pack.seek(0, os.SEEK_END)
+                blob = {"offset": self._pack.tell(), "length": len(comprimido), "codec": self.codec}
+                self._pack.write(comprimido)
+                self._pack.flush()
+                self.blobs[h] = blob
+                self.stats["writes"] += 1
+                self.stats["bytes_raw"] += len(raw)
+                self.stats["bytes_packed"] += len(comprimido)
+            else:
+                self.stats["dedup"] += 1
+            entry = {"key": key, "hash": h, **blob, "etag": etag, "last_modified": last_modified,
+                     "fetched": ahora, "checked": ahora,
+                     "changed": ahora if cambio else anterior.get("changed", ahora)}
+            self.entries[key] = entry
+            self._append_index(entry)
+        return cambio
+
+    def touch(self, key, etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """Registra un 304: el contenido sigue igual, sólo se actualizan los validadores."""
+        key = str(key)
+        with self._lock:
+            entry = dict(self.entries[key])
+            entry["checked"] = time.time()
+            entry["etag"] = etag or entry.get("etag")
+            entry["last_modified"] = last_modified or entry.get("last_modified")
+            self.entries[key] = entry
+            self._append_index(entry)
+
+    def changed_since(self, ts: float) -> List[str]:
+        """Claves nuevas o cuyo contenido cambió desde `ts` (lo que hay que reprocesar)."""
+        return [k for k, e in self.entries.items() if e.get("changed", 0) >= ts]
+
+    def items(self) -> Iterator[tuple]:
+        for key in list(self.entries):
+            yield key, self.get(key)
+
+    def import_files(self, directory: str) -> int:
+        """Migra un directorio de `{sku}.json` sueltos al store (los archivos no se borran)."""
+        n = 0
+        for nombre in sorted(os.listdir(directory)):
+            if nombre.endswith(".json"):
+                with open(os.path.join(directory, nombre), "r", encoding="utf-8") as f:
+                    self.put(nombre[:-len(".json")], json.load(f))
+                n += 1
+        return n
+
+    def compact(self) -> dict:
+        """Reescribe pack e índice con sólo los bodies en uso y la última línea por clave."""
+        with self._lock:
+            tmp_pack, tmp_index = self.pack_path + ".tmp", self.index_path + ".tmp"
+            nuevos_blobs: Dict[str, dict] = {}
+            with open(tmp_pack, "wb") as pack, open(tmp_index, "w", encoding="utf-8") as index:
+                for key, entry in self.entries.items():
+                    blob = nuevos_blobs.get(entry["hash"])
+                    if blob is None:
+                        self._pack.seek(entry["offset"])
+                        datos = self._pack.read(entry["length"])
+                        blob = {"offset": pack.tell(), "length": len(datos), "codec": entry["codec"]}
+                        pack.write(datos)
+                        nuevos_blobs[entry["hash"]] = blob
+                    entry.update(blob)
+                    index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            antes = os.path.getsize(self.pack_path)
+            self._pack.close()
+            self._index.close()
+            os.replace(tmp_pack, self.pack_path)
+            os.replace(tmp_index, self.index_path)
+            self.blobs = nuevos_blobs
+            self._pack = open(self.pack_path, "ab+")
+            self._index = open(self.index_path, "a", encoding="utf-8")
+            return {"antes": antes, "despues": os.path.getsize(self.pack_path)}
+
+    def summary(self) -> dict:
+        return {"claves": len(self.entries), "bodies": len(self.blobs),
+                "pack_bytes": os.path.getsize(self.pack_path),
+                "index_bytes": os.path.getsize(self.index_path), "codec": self.codec}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store de respuestas de los scrapers")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="Migra un directorio de {sku}.json al store")
+    imp.add_argument("directorio")
+    imp.add_argument("store")
+    sub.add_parser("stats").add_argument("store")
+    sub.add_parser("compact").add_argument("store")
+    args = parser.parse_args()
+
+    with ResponseStore(args.store) as store:
+        if args.cmd == "import":
+            t0 = time.perf_counter()
+            n = store.import_files(args.directorio)
+            print(f"{n} archivos importados en {time.perf_counter() - t0:.1f}s - {store.summary()}")
+        elif args.cmd == "compact":
+            print(store.compact())
+        else:
+            print(store.summary())
@@ -0,0 +1,130 @@
+"""
+Servidor HTTP local que imita la API de Fravega reproduciendo JSON guardados,
+para probar `scripts/crawler.py` sin tocar el sitio real.
+
+- POST /api/v1                        -> <dir>/productos-offset<offset>.json
+                                         (sin archivo: página vacía)
+- GET  /_next/data/.../p/<slug>-<sku>.json -> <dir>/productos/<sku>.json (404 si no está)
+
+Los productos llevan ETag (hash del archivo) y Last-Modified (mtime), y responden
+304 a un If-None-Match que coincide. `latency` simula la demora del sitio y
+`fail_rate` responde 429/503 al azar (con Retry-After) para ejercitar los reintentos.
+
+Uso: FRAVEGA_BASE_URL=http://127.0.0.1:8765 python -m scripts.fravega ...
+     python -m scripts.stub_server datos/fravega --port 8765 --latency 0.2 --fail-rate 0.1
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RUTA_PRODUCTO = re.compile(r"/_next/data/[^/]+/es-AR/p/(?P<slug>.+)-(?P<sku>[^-/]+)\.json$")
+
+
+def _handler(root: str, latency: float, fail_rate: float, stats: dict):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, como el sitio real
+
+        def log_message(self, format, *args):
+            pass
+
+        def _responder(self, status: int, body: bytes = b"", headers: dict = None):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _archivo(self, ruta: str):
+            if not os.path.exists(ruta):
+                return None
+            with open(ruta, "rb") as f:
+                return f.read()
+
+        def _antes(self) -> bool:
+            stats["requests"] += 1
+            if latency:
+                time.sleep(latency)
+            if fail_rate and random.random() < fail_rate:
+                stats["fallas"] += 1
+                self._responder(random.choice((429, 503)), b'{"error":"stub"}', {"Retry-After": "0"})
+                return False
+            return True
+
+        def do_POST(self):
+            largo = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(largo) if largo else b""
+            if self.path.split("?")[0] != "/api/v1":
+                return self._responder(404, b"{}")
+            if not self._antes():
+                return
+            try:
+                offset = int(json.loads(body)["variables"]["offset"])
+            except (ValueError, KeyError, TypeError):
+                return self._responder(400, b'{"error":"body invalido"}')
+            data = self._archivo(os.path.join(root, f"productos-offset{offset}.json"))
+            if data is None:
+                data = json.dumps({"data": {"items": {"results": []}}}).encode("utf-8")
+            self._responder(200, data)
+
+        def do_GET(self):
+            m = RUTA_PRODUCTO.search(self.path.split("?")[0])
+            if m is None:
+                return self._responder(404, b"{}")
+            if not self._antes():
+                return
+            ruta = os.path.join(root, "productos", f"{m.group('sku')}.json")
+            data = self._archivo(ruta)
+            if data is None:
+                return self._responder(404, b"{}")
+            validadores = {"ETag": f'"{hashlib.md5(data).hexdigest()}"',
+                           "Last-Modified": formatdate(os.path.getmtime(ruta), usegmt=True)}
+            if self.headers.get("If-None-Match") == validadores["ETag"]:
+                stats["not_modified"] += 1
+                self.send_response(304)
+                self.send_header("ETag", validadores["ETag"])
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._responder(200, data, validadores)
+
+    return StubHandler
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clientes que cortan la conexión (p.ej. un crawl cancelado) no son un error del stub
+        pass
+
+
+def serve(root: str, port: int = 0, latency: float = 0.0, fail_rate: float = 0.0):
+    """Levanta el stub en un thread; devuelve (server, base_url, stats). `server.shutdown()` lo frena."""
+    stats = {"requests": 0, "fallas": 0, "not_modified": 0}
+    server = _Server(("127.0.0.1", port), _handler(root, latency, fail_rate, stats))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub local de la API de Fravega")
+    parser.add_argument("root", help="carpeta con productos-offset<N>.json y productos/<sku>.json")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos de demora por request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fracción de requests que responden 429/503")
+    args = parser.parse_args()
+    server, url, _ = serve(args.root, args.port, args.latency, args.fail_rate)
+    print(f"Stub de Fravega en {url} sirviendo {args.root}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,353 @@
+"""
+Catálogo unificado de todas las tiendas (Fravega, Lenovo, ...) con resolución
+de entidades: el mismo producto vendido en varias tiendas queda como una sola
+fila con sus ofertas.
+
+1. Cada fuente se normaliza a ofertas con el mismo esquema (`COLUMNAS_OFERTAS`):
+   tienda, oferta_id, title, brand, price, list_price, categories, gtin, specs, url.
+2. Mismo GTIN/EAN válido (dígito verificador) -> mismo producto.
+3. Sin GTIN en común, títulos parecidos de la misma marca en tiendas distintas:
+   MinHash de los tokens del título + LSH por bandas (sólo se comparan las
+   ofertas que caen en el mismo bucket, nunca todos contra todos). Los pares
+   candidatos se confirman con la similitud estimada por las firmas y con los
+   códigos de modelo del título (`82H8009LAR`, `15itl6`...), y se descartan si
+   tienen GTIN distintos.
+4. Componentes conexas -> productos. El CSV de salida tiene el esquema de
+   productos-gemini.csv (title, slug, brand_name, categories, list_price) más
+   gtin, tiendas, n_ofertas y `ofertas` (JSON con precio y URL por tienda);
+   los tags se agregan después con `python catalog.py tag-catalog`.
+
+Uso: python -m scripts.unificar --fravega datos/fravega/ --lenovo datos/lenovo \
+         --destino datos/productos-unificados.csv [--fravega-specs datos/lenovo/atributos.parquet]
+"""
+from __future__ import annotations
+import argparse
+import glob
+import json
+import os
+import re
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional
+from unicodedata import normalize as uni_normalize
+
+import numpy as np
+import pandas as pd
+
+COLUMNAS_OFERTAS = ['tienda', 'oferta_id', 'title', 'brand', 'price', 'list_price',
+                    'categories', 'gtin', 'specs', 'url']
+
+NUM_PERM = 64
+FILAS_BANDA = 4
+# Umbral de similitud (Jaccard estimado por MinHash) para confirmar un par candidato
+UMBRAL_SIMILITUD = 0.6
+# Buckets más grandes que esto son títulos genéricos ("Notebook Lenovo"): no aportan pares
+MAX_BUCKET = 50
+FIRMAS_POR_LOTE = 20_000
+
+STOPWORDS = frozenset("de del con para y el la los las en a x por sin al un una".split())
+_UNIDADES = re.compile(r"(\d+(?:[.,]\d+)?)\s*(gb|tb|mb|ghz|mhz|hz|w|mah|mp|pulgadas|pulg|in|cm|mm|kg|l|ms)\b")
+_NO_ALNUM = re.compile(r"[^a-z0-9]+")
+_PRIMO = np.uint64(4294967311)  # primo > 2**32
+
+
+# -------- Normalización --------
+def tokens_titulo(titulo) -> List[str]:
+    """Tokens del título: minúsculas, sin acentos, unidades pegadas al número ("8 GB" -> "8gb"), sin stopwords."""
+    if not isinstance(titulo, str):
+        return []
+    s = uni_normalize("NFKD", titulo.lower()).encode("ascii", "ignore").decode("ascii")
+    s = _UNIDADES.sub(lambda m: m.group(1).replace(",", ".") + m.group(2), s)
+    return [t for t in _NO_ALNUM.sub(" ", s.replace(".", "")).split() if t not in STOPWORDS]
+
+def codigos_modelo(tokens: Iterable[str]) -> frozenset:
+    """Tokens con letras y dígitos de 4+ caracteres (códigos de modelo), sin las medidas tipo "512gb"."""
+    return frozenset(t for t in tokens if len(t) >= 4 and not t.isdigit() and not t.isalpha()
+                     and not _UNIDADES.fullmatch(t))
+
+def normalizar_marca(marca) -> str:
+    if not isinstance(marca, str):
+        return ""
+    return " ".join(tokens_titulo(marca))
+
+def normalizar_gtin(valor) -> Optional[str]:
+    """GTIN-8/12/13/14 como GTIN-14 (con ceros a la izquierda); None si no es válido."""
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)):
+        return None
+    digitos = re.sub(r"\D", "", str(valor))
+    if len(digitos) not in (8, 12, 13, 14) or not digitos.strip("0"):
+        return None
+    digitos = digitos.zfill(14)
+    suma = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(digitos[:-1]))
+    return digitos if (10 - suma % 10) % 10 == int(digitos[-1]) else None
+
+def _precio(v) -> Optional[float]:
+    """Precio como float; acepta números y strings tipo "$ 1.234.567,89"."""
+    if v is None or isinstance(v, bool):
+        return None
+    if isinstance(v, (int, float)):
+        return float(v) if v == v else None
+    s = re.sub(r"[^\d.,]", "", str(v))
+    if "," in s:
+        s = s.replace(".", "").replace(",", ".")
+    elif s.count(".") > 1 or re.search(r"\.\d{3}$", s):
+        s = s.replace(".", "")
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+def _primero(d: dict, *claves):
+    for clave in claves:
+        v = d.get(clave)
+        if v not in (None, "", []):
+            return v
+    return None
+
+
+# -------- Fuentes --------
+def ofertas_fravega(ruta: str, specs_path: Optional[str] = None) -> Iterator[dict]:
+    """Un SKU por oferta, de los `productos-offset*.json` de `scraping` (ruta = prefijo, p.ej. 'datos/fravega/')."""
+    from .fravega import FRAVEGA_BASE_URL, filas_skus, iter_listados
+    specs = {}
+    if specs_path:
+        from catalog_tagging import cargar_specs
+        specs = cargar_specs(specs_path)
+    vistos = set()
+    for data_json in iter_listados(ruta):
+        for (_id, title, _cat, slug, _bid, brand, sku, categories, list_price, sale_price, gtin) in filas_skus(data_json, vistos):
+            yield {'tienda': 'fravega', 'oferta_id': str(sku), 'title': title, 'brand': brand,
+                   'price': _precio(sale_price if sale_price is not None else list_price),
+                   'list_price': _precio(list_price), 'categories': " > ".join(c for c in categories if c),
+                   'gtin': gtin, 'specs': specs.get(str(sku)), 'url': f'{FRAVEGA_BASE_URL}/p/{slug}-{sku}/'}
+
+def _specs_lenovo(producto: dict) -> Optional[str]:
+    pares = []
+    for clave in ('specifications', 'classification', 'keyDetails'):
+        for s in producto.get(clave) or []:
+            if isinstance(s, dict):
+                nombre, valor = _primero(s, 'name', 'a', 'key'), _primero(s, 'value', 'b')
+                if nombre and isinstance(valor, str):
+                    pares.append(f"{nombre} {valor}")
+            elif isinstance(s, str):
+                pares.append(s)
+    return " . ".join(pares) or None
+
+def ofertas_lenovo(root: str) -> Iterator[dict]:
+    """Productos de las páginas de `scripts/lenovo.py` (`<root>/<categoria>/<categoria>-<page>.json`)."""
+    from .lenovo import productos_pagina
+    vistos = set()
+    for archivo in sorted(glob.glob(os.path.join(root, '*', '*-*.json'))):
+        categoria = os.path.basename(os.path.dirname(archivo))
+        with open(archivo, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for producto in productos_pagina(data):
+            if not isinstance(producto, dict):
+                continue
+            codigo = _primero(producto, 'productCode', 'code', 'id', 'partNumber')
+            if codigo is None or str(codigo) in vistos:
+                continue
+            vistos.add(str(codigo))
+            url = _primero(producto, 'url', 'productUrl', 'pdpUrl')
+            yield {'tienda': 'lenovo', 'oferta_id': str(codigo),
+                   'title': _primero(producto, 'productName', 'name', 'title', 'summary'),
+                   'brand': _primero(producto, 'brand', 'brandName') or 'Lenovo',
+                   'price': _precio(_primero(producto, 'finalPrice', 'salePrice', 'price', 'webPrice')),
+                   'list_price': _precio(_primero(producto, 'originalPrice', 'listPrice', 'webPrice', 'price')),
+                   'categories': categoria, 'gtin': _primero(producto, 'ean', 'gtin', 'upc', 'eanCode'),
+                   'specs': _specs_lenovo(producto),
+                   'url': ('https://www.lenovo.com' + url) if isinstance(url, str) and url.startswith('/') else url}
+
+def tabla_ofertas(fuentes: Iterable[Iterable[dict]]) -> pd.DataFrame:
+    return pd.DataFrame([o for fuente in fuentes for o in fuente], columns=COLUMNAS_OFERTAS)
+
+
+# -------- Resolución de entidades --------
+def _hash_tokens(tokens: List[str]) -> np.ndarray:
+    return np.fromiter((zlib.crc32(t.encode()) for t in tokens), dtype=np.uint64, count=len(tokens))
+
+def firmas_minhash(tokens: List[List[str]], num_perm: int = NUM_PERM, seed: int = 1,
+                   lote: int = FIRMAS_POR_LOTE) -> np.ndarray:
+    """Firma MinHash (n, num_perm) de cada conjunto de tokens, vectorizada por lotes."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 31, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 2 ** 31, size=num_perm, dtype=np.uint64)
+    firmas = np.empty((len(tokens), num_perm), dtype=np.uint32)
+    for inicio in range(0, len(tokens), lote):
+        conjuntos = [sorted(set(t)) or [f"\0{inicio + i}"] for i, t in enumerate(tokens[inicio:inicio + lote])]
+        largos = np.fromiter((len(c) for c in conjuntos), dtype=np.int64, count=len(conjuntos))
+        hashes = _hash_tokens([t for c in conjuntos for t in c])
+        valores = (hashes[:, None] * a + b) % _PRIMO
+        offsets = np.concatenate(([0], np.cumsum(largos)[:-1]))
+        firmas[inicio:inicio + len(conjuntos)] = np.minimum.reduceat(valores, offsets, axis=0)
+    return firmas
+
+def pares_candidatos(firmas: np.ndarray, bloque: np.ndarray, filas_banda: int = FILAS_BANDA,
+                     max_bucket: int = MAX_BUCKET, filtro=None, stats: Optional[dict] = None) -> np.ndarray:
+    """
+    Pares (i, j), i < j, que comparten al menos un bucket de LSH dentro del mismo
+    `bloque` (p.ej. la marca). `filtro(i, j) -> máscara` se aplica banda por banda,
+    así en memoria sólo quedan los pares que lo pasan. Devuelve un array (m, 2) sin repetidos.
+    """
+    n, num_perm = firmas.shape
+    unicos = np.empty(0, dtype=np.int64)
+    evaluados = 0
+    for banda in range(num_perm // filas_banda):
+        clave = bloque.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+        for col in firmas[:, banda * filas_banda:(banda + 1) * filas_banda].T:
+            clave = clave * np.uint64(1000003) ^ col.astype(np.uint64)
+        orden = np.argsort(clave, kind='stable')
+        ordenadas = clave[orden]
+        cortes = np.flatnonzero(ordenadas[1:] != ordenadas[:-1]) + 1
+        inicios = np.concatenate(([0], cortes))
+        tamanios = np.diff(np.concatenate((inicios, [n])))
+        pares = []
+        for tam in np.unique(tamanios[(tamanios >= 2) & (tamanios <= max_bucket)]):
+            miembros = orden[inicios[tamanios == tam][:, None] + np.arange(tam)]
+            i, j = np.triu_indices(tam, k=1)
+            a, b = miembros[:, i].ravel(), miembros[:, j].ravel()
+            evaluados += len(a)
+            if filtro is not None:
+                mascara = filtro(a, b)
+                a, b = a[mascara], b[mascara]
+            # Cada par como un solo int64 (menor * n + mayor): np.unique 1D es mucho más rápido que axis=0
+            pares.append(np.minimum(a, b) * n + np.maximum(a, b))
+        if pares:
+            unicos = np.union1d(unicos, np.concatenate(pares))
+    if stats is not None:
+        stats['candidatos_lsh'] = evaluados
+    return np.stack([unicos // n, unicos % n], axis=1)
+
+def componentes(n: int, aristas: np.ndarray) -> np.ndarray:
+    """Etiqueta de componente conexa (el menor índice) de cada nodo, por propagación de mínimos."""
+    etiquetas = np.arange(n)
+    if len(aristas) == 0:
+        return etiquetas
+    u, v = aristas[:, 0], aristas[:, 1]
+    while True:
+        m = np.minimum(etiquetas[u], etiquetas[v])
+        nuevas = etiquetas.copy()
+        np.minimum.at(nuevas, u, m)
+        np.minimum.at(nuevas, v, m)
+        while True:  # pointer jumping
+            saltadas = nuevas[nuevas]
+            if np.array_equal(saltadas, nuevas):
+                break
+            nuevas = saltadas
+        if np.array_equal(nuevas, etiquetas):
+            return etiquetas
+        etiquetas = nuevas
+
+def resolver_entidades(ofertas: pd.DataFrame, umbral: float = UMBRAL_SIMILITUD,
+                       num_perm: int = NUM_PERM, filas_banda: int = FILAS_BANDA,
+                       max_bucket: int = MAX_BUCKET) -> tuple:
+    """(producto de cada oferta, stats): índice de la oferta representante de su grupo."""
+    n = len(ofertas)
+    gtins = pd.Series([normalizar_gtin(g) for g in ofertas['gtin']], dtype=object)
+    tienda = pd.factorize(ofertas['tienda'])[0]
+    marcas = {m: normalizar_marca(m) for m in ofertas['brand'].dropna().unique()}
+    marca = pd.factorize(pd.Series([marcas.get(m, "") for m in ofertas['brand']]))[0]
+
+    # 1) Mismo GTIN: cada oferta se une a la primera con ese GTIN
+    codigos_gtin, _ = pd.factorize(gtins)
+    con_gtin = np.flatnonzero(codigos_gtin >= 0)
+    primero = pd.Series(con_gtin).groupby(codigos_gtin[con_gtin]).transform('first').to_numpy()
+    aristas_gtin = np.stack([primero, con_gtin], axis=1)[primero != con_gtin] if len(con_gtin) else np.empty((0, 2), dtype=np.int64)
+
+    # 2) Títulos parecidos de la misma marca en otra tienda
+    tokens = [tokens_titulo(t) for t in ofertas['title']]
+    firmas = firmas_minhash(tokens, num_perm)
+
+    def filtro(i, j):
+        # Otra tienda, sin GTIN contradictorios y con firmas parecidas (en tramos, para acotar memoria)
+        gtin_i, gtin_j = codigos_gtin[i], codigos_gtin[j]
+        mascara = (tienda[i] != tienda[j]) & ~((gtin_i >= 0) & (gtin_j >= 0) & (gtin_i != gtin_j))
+        for k in range(0, len(i), 1 << 20):
+            tramo = slice(k, k + (1 << 20))
+            similitud = (firmas[i[tramo]] == firmas[j[tramo]]).mean(axis=1)
+            mascara[tramo] &= similitud >= umbral
+        return mascara
+
+    stats = {}
+    candidatos = pares_candidatos(firmas, marca, filas_banda, max_bucket, filtro, stats)
+    i, j = candidatos[:, 0], candidatos[:, 1]
+    codigos = [codigos_modelo(t) for t in tokens]
+    # Dos códigos de modelo distintos (82H8 vs 82K2) son productos distintos aunque el resto coincida
+    confirmados = np.fromiter((not (codigos[a] and codigos[b]) or bool(codigos[a] & codigos[b])
+                               for a, b in zip(i, j)), dtype=bool, count=len(i))
+    aristas_titulo = np.stack([i[confirmados], j[confirmados]], axis=1)
+
+    grupos = componentes(n, np.concatenate([aristas_gtin, aristas_titulo]).astype(np.int64))
+    stats.update({'ofertas': n, 'con_gtin': int(len(con_gtin)), 'pares_gtin': int(len(aristas_gtin)),
+                  'pares_titulo': int(len(aristas_titulo)), 'productos': int(len(np.unique(grupos)))})
+    return grupos, stats
+
+
+# -------- Catálogo --------
+def _slug(titulo: str, clave: str) -> str:
+    base = "-".join(tokens_titulo(titulo))[:60].strip("-") or "producto"
+    return f"{base}-{zlib.crc32(clave.encode()):08x}"
+
+def catalogo_unificado(ofertas: pd.DataFrame, grupos: np.ndarray) -> pd.DataFrame:
+    """Una fila por producto con el esquema de productos-gemini.csv y sus ofertas por tienda."""
+    largo = ofertas['title'].fillna("").str.len().to_numpy()
+    orden = np.lexsort((-largo, grupos))  # dentro de cada grupo, primero el título más descriptivo
+    col = {c: ofertas[c].to_numpy(dtype=object)[orden].tolist() for c in COLUMNAS_OFERTAS}
+    gtins = [normalizar_gtin(g) for g in col['gtin']]
+    g = grupos[orden]
+    limites = np.concatenate(([0], np.flatnonzero(g[1:] != g[:-1]) + 1, [len(g)])).tolist()
+    filas = []
+    for ini, fin in zip(limites[:-1], limites[1:]):
+        titulo = col['title'][ini]
+        gtin = next((x for x in gtins[ini:fin] if x), None)
+        clave = gtin or min(f"{t}:{o}" for t, o in zip(col['tienda'][ini:fin], col['oferta_id'][ini:fin]))
+        precios = [p for p in col['price'][ini:fin] if p is not None and p == p]
+        marcas = Counter(m for m in col['brand'][ini:fin] if isinstance(m, str) and m)
+        ofertas_producto = [{'tienda': t, 'id': o, 'precio': p if p is not None and p == p else None, 'url': u}
+                            for t, o, p, u in zip(col['tienda'][ini:fin], col['oferta_id'][ini:fin],
+                                                  col['price'][ini:fin], col['url'][ini:fin])]
+        filas.append((titulo, _slug(titulo, clave), marcas.most_common(1)[0][0] if marcas else "",
+                      next((c for c in col['categories'][ini:fin] if isinstance(c, str) and c), ""),
+                      min(precios) if precios else np.nan, gtin,
+                      ",".join(sorted(set(col['tienda'][ini:fin]))), fin - ini,
+                      json.dumps(ofertas_producto, ensure_ascii=False),
+                      next((x for x in col['specs'][ini:fin] if isinstance(x, str) and x), None), ""))
+    return pd.DataFrame(filas, columns=['title', 'slug', 'brand_name', 'categories', 'list_price', 'gtin',
+                                        'tiendas', 'n_ofertas', 'ofertas', 'specs', 'atributos_correctos'])
+
+def unificar(fuentes: Dict[str, Iterable[dict]], destino: str, **kwargs) -> dict:
+    """Normaliza las fuentes, resuelve entidades y escribe el catálogo unificado en `destino` (CSV)."""
+    t0 = time.perf_counter()
+    ofertas = tabla_ofertas(fuentes.values())
+    t_carga = time.perf_counter() - t0
+    grupos, stats = resolver_entidades(ofertas, **kwargs)
+    t_resolucion = time.perf_counter() - t0 - t_carga
+    catalogo = catalogo_unificado(ofertas, grupos)
+    tmp = f"{destino}.{os.getpid()}.tmp"
+    catalogo.to_csv(tmp, index=False)
+    os.replace(tmp, destino)
+    stats.update({'por_tienda': ofertas['tienda'].value_counts().to_dict(),
+                  'multi_tienda': int((catalogo['n_ofertas'] > 1).sum()),
+                  'segundos_carga': round(t_carga, 2), 'segundos_resolucion': round(t_resolucion, 2),
+                  'segundos': round(time.perf_counter() - t0, 2), 'destino': destino})
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Catálogo unificado de todas las tiendas')
+    parser.add_argument('--fravega', default=None, help="prefijo de los productos-offset*.json (p.ej. 'datos/fravega/')")
+    parser.add_argument('--fravega-specs', default=None, help='tabla de scripts/atributos.py para los SKUs de Fravega')
+    parser.add_argument('--lenovo', default=None, help='carpeta de scripts/lenovo.py (datos/lenovo)')
+    parser.add_argument('--destino', default='datos/productos-unificados.csv')
+    parser.add_argument('--umbral', type=float, default=UMBRAL_SIMILITUD)
+    args = parser.parse_args()
+
+    fuentes = {}
+    if args.fravega:
+        fuentes['fravega'] = ofertas_fravega(args.fravega, args.fravega_specs)
+    if args.lenovo:
+        fuentes['lenovo'] = ofertas_lenovo(args.lenovo)
+    if not fuentes:
+        parser.error('Indicá al menos una fuente (--fravega, --lenovo)')
+    print(unificar(fuentes, args.destino, umbral=args.umbral))
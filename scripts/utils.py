@@ -1,15 +1,21 @@
 import requests
 import json
-from .env import HEADERS
+try:
+    from .env import HEADERS
+except ImportError:
+    # env.py (headers de la sesión) no se versiona
+    HEADERS = {}
 
 def obtener_json(endpoint, params, timeout=20):
     r = requests.get(endpoint, params=params, headers=HEADERS, timeout=timeout)
     r.raise_for_status()
     return r.json()
 
-def guardar_json(objeto, nombre_archivo: str):
+def guardar_json(objeto, nombre_archivo: str, indent=None):
+    # Compacto por defecto: con indent=2 los JSON de la API ocupan bastante más en disco
+    separators = (",", ":") if indent is None else None
     with open(nombre_archivo, "w", encoding="utf-8") as f:
-        json.dump(objeto, f, ensure_ascii=False, indent=2)
+        json.dump(objeto, f, ensure_ascii=False, indent=indent, separators=separators)
 
 def make_request(method, url, params, headers, cookies=None):
     if method == 'GET':
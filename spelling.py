@@ -0,0 +1,308 @@
+# spelling.py
+"""
+Corrección de typos de la query antes del clasificador (SymSpell: symmetric delete).
+
+El TextCatBOW del modelo usa unigramas (`ngram_size = 1`): un token mal escrito
+("notbook", "inalanbricos", "teclao") no aporta nada a `doc.cats`. Acá cada
+token desconocido se reemplaza por la palabra del diccionario más cercana
+(distancia de edición <= len // 4, entre 1 y 2; a igual distancia la más
+frecuente).
+
+- Diccionario: vocabulario del clasificador (`vocab/strings.json`) + palabras
+  de los títulos del catálogo, con su frecuencia en el catálogo, + semillas
+  que no salen de los títulos: palabras de query en castellano (`QUERY_WORDS`),
+  las del parser de precios (`PRICE_WORDS`) y las de los labels del modelo.
+  Todas cuentan como conocidas (no se corrigen); sólo las que aparecen al
+  menos `MIN_FREQUENCY` veces pueden ser el reemplazo de un token.
+- Las palabras del parser de precios no se corrigen nunca, estén o no en el
+  diccionario: la corrección corre antes de `query_constraints.parse_query` y
+  "hasta 500 lucas" no puede pasar a "hasta 500 luces".
+- Índice: los borrados (hasta `max_distance` caracteres) del prefijo de cada
+  palabra, hasheados a uint32 (`claves`, ordenadas) con la palabra de origen
+  (`ids`). Una búsqueda genera los borrados del token, los busca con
+  searchsorted y verifica los candidatos con la distancia real: una colisión
+  de hash sólo agrega un candidato de más.
+- Se guarda al lado del modelo (`es_ecommerce_classifier/spelling/`, .npy
+  memory-mappeables) con la firma del vocabulario y del catálogo, para no
+  rearmarlo en cada arranque.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import shutil
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from label_registry import META_PATH, model_labels
+from query_constraints import PRICE_WORDS, normalizar
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "es_ecommerce_classifier")
+MODEL_STRINGS = os.path.join(MODEL_DIR, "es_ecommerce_classifier-1.0.0", "vocab", "strings.json")
+SPELLING_DIR = os.path.join(MODEL_DIR, "spelling")
+
+MAX_DISTANCE = 2
+PREFIX_LENGTH = 7
+# Tokens más cortos no se corrigen (demasiadas palabras a distancia 1)
+MIN_LENGTH = 4
+# Caracteres del token por cada edición admitida (con tope MAX_DISTANCE)
+LENGTH_PER_EDIT = 4
+# Apariciones mínimas para que una palabra reemplace a un token: las que están
+# una sola vez en los títulos (códigos de modelo, typos del catálogo) no
+MIN_FREQUENCY = 2
+# Palabras frecuentes en las queries que no suelen estar en los títulos
+QUERY_WORDS = (
+    "el", "la", "los", "las", "un", "una", "unos", "unas", "de", "del", "al", "a", "en", "y", "o", "u",
+    "con", "sin", "para", "por", "que", "como", "cual", "cuál", "donde", "mi", "me", "mas", "más", "muy",
+    "menos", "algo", "otro", "otra", "sobre", "bajo", "hasta", "desde", "entre", "tipo", "unos",
+    "busco", "buscar", "quiero", "necesito", "comprar", "regalo", "regalar", "oferta", "ofertas",
+    "precio", "precios", "barato", "barata", "baratos", "baratas", "economico", "económico",
+    "economica", "económica", "mejor", "mejores", "bueno", "buena", "buenos", "buenas", "nuevo",
+    "nueva", "usado", "usada", "calidad", "marca", "modelo", "grande", "chico", "chica", "liviano",
+    "liviana", "potente", "rapido", "rápido", "rapida", "rápida", "ideal", "uso", "casa", "hogar",
+    "trabajo", "trabajar", "oficina", "estudio", "estudiar", "estudiante", "estudiantes", "facultad",
+    "colegio", "escuela", "juegos", "jugar", "gamer", "gaming", "diseño", "diseñador", "edicion",
+    "edición", "video", "videos", "programar", "programacion", "programación", "viaje", "viajes",
+    "máximo", "mínimo", "millón",
+)
+_PALABRA = re.compile(r"[^\W\d_]+")
+
+
+def _borrados(palabra: str, max_distance: int) -> set:
+    """La palabra y todas las que salen de borrarle hasta `max_distance` caracteres."""
+    res = frontera = {palabra}
+    for _ in range(max_distance):
+        frontera = {w[:i] + w[i + 1:] for w in frontera if len(w) > 1 for i in range(len(w))}
+        res = res | frontera
+    return res
+
+
+def _hash(texto: str) -> int:
+    return zlib.crc32(texto.encode("utf-8"))
+
+
+def distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Damerau-Levenshtein (transposiciones adyacentes); `max_distance + 1` si se pasa.
+    Sólo se calcula la banda |i - j| <= max_distance de la matriz.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    fuera = max_distance + 1
+    n = len(b)
+    anterior, previa = None, list(range(n + 1))
+    for i in range(1, len(a) + 1):
+        actual = [fuera] * (n + 1)
+        if i <= max_distance:
+            actual[0] = i
+        ca = a[i - 1]
+        minimo = actual[0]
+        for j in range(max(1, i - max_distance), min(n, i + max_distance) + 1):
+            cb = b[j - 1]
+            v = previa[j - 1] + (ca != cb)
+            if previa[j] + 1 < v:
+                v = previa[j] + 1
+            if actual[j - 1] + 1 < v:
+                v = actual[j - 1] + 1
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb and anterior[j - 2] + 1 < v:
+                v = anterior[j - 2] + 1
+            actual[j] = v
+            if v < minimo:
+                minimo = v
+        if minimo > max_distance:
+            return fuera
+        anterior, previa = previa, actual
+    return min(previa[n], fuera)
+
+
+def seed_words(meta_path: str = META_PATH) -> List[str]:
+    """`QUERY_WORDS`, `PRICE_WORDS` y las palabras de los labels del modelo ("INT_INT_DISEÑO" -> "diseño")."""
+    semillas = set(QUERY_WORDS) | PRICE_WORDS
+    for label in model_labels(meta_path):
+        nombre = re.sub(r"^((CAT|INT|ATTR)_)+", "", label)
+        try:
+            # Algunos labels vienen con UTF-8 leído como cp1252 ("ESPAÃ‘OL")
+            nombre = nombre.encode("cp1252").decode("utf-8")
+        except UnicodeError:
+            pass
+        semillas.update(_PALABRA.findall(nombre.lower().replace("_", " ")))
+    return sorted(semillas)
+
+
+def build_vocabulary(titulos: Iterable, strings_path: Optional[str] = MODEL_STRINGS,
+                     semillas: Iterable[str] = ()) -> Counter:
+    """
+    Frecuencia de cada palabra (minúsculas, sólo letras) en los títulos, más el
+    vocabulario del modelo y las `semillas` (éstas con al menos `MIN_FREQUENCY`).
+    """
+    frecuencias = Counter()
+    for titulo in titulos:
+        if isinstance(titulo, str):
+            frecuencias.update(_PALABRA.findall(titulo.lower()))
+    if strings_path and os.path.exists(strings_path):
+        with open(strings_path, encoding="utf-8") as f:
+            for s in json.load(f):
+                if isinstance(s, str) and s.isalpha() and len(s) > 1:
+                    frecuencias[s.lower()] += 1
+    for palabra in semillas:
+        frecuencias[palabra] = max(frecuencias[palabra], MIN_FREQUENCY)
+    return frecuencias
+
+
+class SpellChecker:
+    """
+    Diccionario + índice de borrados; `correct(query)` reemplaza los tokens desconocidos.
+    El índice sólo tiene las palabras con al menos `min_frequency` apariciones.
+    """
+
+    _ARRAYS = ("claves", "ids", "frecuencias")
+
+    def __init__(self, palabras: List[str], frecuencias: np.ndarray, claves: np.ndarray, ids: np.ndarray,
+                 max_distance: int = MAX_DISTANCE, prefix_length: int = PREFIX_LENGTH,
+                 min_frequency: int = MIN_FREQUENCY):
+        self.palabras = list(palabras)
+        self.palabra_id = {p: i for i, p in enumerate(self.palabras)}
+        self.frecuencias = frecuencias
+        self.claves = claves
+        self.ids = ids
+        self.max_distance = int(max_distance)
+        self.prefix_length = int(prefix_length)
+        self.min_frequency = int(min_frequency)
+        self.lookup = lru_cache(maxsize=65536)(self._lookup)
+
+    @classmethod
+    def build(cls, frecuencias: Dict[str, int], max_distance: int = MAX_DISTANCE,
+              prefix_length: int = PREFIX_LENGTH, min_frequency: int = MIN_FREQUENCY) -> "SpellChecker":
+        palabras = sorted(frecuencias)
+        claves, ids = [], []
+        for i, palabra in enumerate(palabras):
+            if frecuencias[palabra] < min_frequency:
+                continue
+            hashes = {_hash(b) for b in _borrados(palabra[:prefix_length], max_distance)}
+            claves.extend(hashes)
+            ids.extend([i] * len(hashes))
+        claves = np.asarray(claves, dtype=np.uint32)
+        orden = np.argsort(claves, kind="stable")
+        return cls(palabras, np.asarray([frecuencias[p] for p in palabras], dtype=np.uint32),
+                   claves[orden], np.asarray(ids, dtype=np.uint32)[orden], max_distance, prefix_length,
+                   min_frequency)
+
+    # ---------- Persistencia ----------
+    def save(self, path: str, firma: Optional[dict] = None) -> None:
+        """Escribe en un directorio temporal y lo renombra: otros procesos nunca ven uno a medias."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in self._ARRAYS:
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(tmp, "palabras.json"), "w", encoding="utf-8") as f:
+            json.dump({"palabras": self.palabras, "max_distance": self.max_distance,
+                       "prefix_length": self.prefix_length, "min_frequency": self.min_frequency,
+                       "firma": firma}, f, ensure_ascii=False)
+        shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # Otro proceso lo publicó mientras tanto
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "SpellChecker":
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in cls._ARRAYS}
+        with open(os.path.join(path, "palabras.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(meta["palabras"], max_distance=meta["max_distance"],
+                   prefix_length=meta["prefix_length"],
+                   min_frequency=meta.get("min_frequency", MIN_FREQUENCY), **arrays)
+
+    # ---------- Consultas ----------
+    def _lookup(self, token: str) -> Optional[str]:
+        """La palabra del diccionario más cercana a `token` (minúsculas), o None si no hay ninguna."""
+        if token in self.palabra_id:
+            return token
+        # Más ediciones cuanto más largo el token: "mini" no reemplaza a "minimo"
+        max_distance = min(self.max_distance, max(1, len(token) // LENGTH_PER_EDIT))
+        hashes = np.fromiter((_hash(b) for b in _borrados(token[:self.prefix_length], max_distance)),
+                             dtype=np.uint32)
+        ini = np.searchsorted(self.claves, hashes, side="left")
+        largos = np.searchsorted(self.claves, hashes, side="right") - ini
+        # Posiciones de todos los rangos [ini, fin) en una sola indexación
+        pos = np.repeat(ini - np.cumsum(largos) + largos, largos) + np.arange(largos.sum())
+        mejor, mejor_clave = None, None
+        for i in np.unique(self.ids[pos]).tolist():
+            palabra = self.palabras[i]
+            d = distance(token, palabra, max_distance)
+            if d <= max_distance:
+                clave = (d, -int(self.frecuencias[i]), palabra)
+                if mejor_clave is None or clave < mejor_clave:
+                    mejor, mejor_clave = palabra, clave
+        return mejor
+
+    def correct_token(self, token: str) -> str:
+        t = token.lower()
+        if len(t) < MIN_LENGTH or t in self.palabra_id or normalizar(t) in PRICE_WORDS:
+            return token
+        sugerida = self.lookup(t)
+        if sugerida is None:
+            return token
+        # Se respeta la mayúscula inicial / todo en mayúsculas del original
+        if token.isupper():
+            return sugerida.upper()
+        return sugerida.capitalize() if token[0].isupper() else sugerida
+
+    def correct(self, query: str) -> str:
+        """La query con cada palabra desconocida reemplazada; números, signos y espacios quedan igual."""
+        return _PALABRA.sub(lambda m: self.correct_token(m.group(0)), query)
+
+    def stats(self) -> Dict[str, int]:
+        return {"palabras": len(self.palabras), "borrados": int(len(self.claves)),
+                "bytes": int(sum(getattr(self, name).nbytes for name in self._ARRAYS))}
+
+
+def _firma(frecuencias: Counter, max_distance: int, prefix_length: int, min_frequency: int) -> dict:
+    h = hashlib.sha256()
+    for palabra, n in sorted(frecuencias.items()):
+        h.update(f"{palabra}\t{n}\n".encode("utf-8"))
+    return {"vocabulario": h.hexdigest(), "max_distance": max_distance, "prefix_length": prefix_length,
+            "min_frequency": min_frequency}
+
+
+def load_or_build(titulos: Iterable, catalog_checksum: Optional[str] = None, path: str = SPELLING_DIR,
+                  max_distance: int = MAX_DISTANCE, prefix_length: int = PREFIX_LENGTH,
+                  min_frequency: int = MIN_FREQUENCY) -> SpellChecker:
+    """
+    El índice guardado en `path` si corresponde a este catálogo (`catalog_checksum`),
+    al vocabulario del modelo y a las semillas; si no, lo arma y lo guarda. Sin
+    checksum (catálogo de muestra) se compara la firma del vocabulario completo.
+    """
+    firma_modelo = None
+    if os.path.exists(MODEL_STRINGS):
+        with open(MODEL_STRINGS, "rb") as f:
+            firma_modelo = hashlib.sha256(f.read()).hexdigest()
+    try:
+        with open(os.path.join(path, "palabras.json"), encoding="utf-8") as f:
+            guardada = json.load(f).get("firma") or {}
+    except (OSError, ValueError):
+        guardada = {}
+
+    semillas = seed_words()
+    esperada = {"catalogo": catalog_checksum, "modelo": firma_modelo,
+                "semillas": hashlib.sha256("\n".join(semillas).encode("utf-8")).hexdigest(),
+                "max_distance": max_distance, "prefix_length": prefix_length, "min_frequency": min_frequency}
+    if catalog_checksum is not None and all(guardada.get(k) == v for k, v in esperada.items()):
+        return SpellChecker.load(path)
+
+    frecuencias = build_vocabulary(titulos, semillas=semillas)
+    firma = {**esperada, **_firma(frecuencias, max_distance, prefix_length, min_frequency)}
+    if catalog_checksum is None and guardada.get("vocabulario") == firma["vocabulario"]:
+        return SpellChecker.load(path)
+    checker = SpellChecker.build(frecuencias, max_distance, prefix_length, min_frequency)
+    checker.save(path, firma)
+    print(f"SUCCESS: Índice de corrección armado: {checker.stats()} -> {path}")
+    return checker
@@ -0,0 +1,330 @@
+# tag_engine.py
+from __future__ import annotations
+import ast
+import json
+import os
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from inverted_index import InvertedIndex
+
+# ID reservado para valores que no son tags (NaN, números, etc.).
+# Las máscaras de query tienen un casillero extra al final que siempre vale 0,
+# así que indexar con -1 nunca suma coincidencias.
+NO_TAG = -1
+
+
+def _as_list(x) -> list:
+    """Misma semántica que `safe_list`: string "['A','B']" -> lista, otro tipo -> []."""
+    if isinstance(x, list):
+        return x
+    if isinstance(x, str):
+        try:
+            return ast.literal_eval(x)
+        except Exception:
+            return []
+    return []
+
+
+class TagEngine:
+    """
+    Catálogo precompilado a IDs enteros de tags para puntuar sin `df.apply`.
+
+    - `cat_ids` / `intent_ids`: un ID por producto (o NO_TAG).
+    - `attr_indptr` / `attr_indices`: matriz producto×tag en formato CSR con los
+      atributos en el mismo orden (y con los mismos duplicados) que `atributos_list`.
+    - `attr_first`: marca la primera aparición de cada tag dentro de su fila,
+      para contar coincidencias como `set(attrs)` sin volver a deduplicar.
+    - `brand_ids`: marca normalizada internada (opcional, ver `brand_key`).
+    """
+
+    def __init__(self,
+                 vocab: List[str],
+                 cat_ids: np.ndarray,
+                 intent_ids: np.ndarray,
+                 attr_indptr: np.ndarray,
+                 attr_indices: np.ndarray,
+                 attr_first: np.ndarray,
+                 brand_vocab: Optional[List[str]] = None,
+                 brand_ids: Optional[np.ndarray] = None):
+        self.vocab = list(vocab)
+        self.tag_to_id = {t: i for i, t in enumerate(self.vocab)}
+        self.cat_ids = cat_ids
+        self.intent_ids = intent_ids
+        self.attr_indptr = attr_indptr
+        self.attr_indices = attr_indices
+        self.attr_first = attr_first
+        self.brand_vocab = list(brand_vocab or [])
+        self.brand_to_id = {b: i for i, b in enumerate(self.brand_vocab)}
+        self.brand_ids = brand_ids if brand_ids is not None else np.full(len(cat_ids), NO_TAG, dtype=np.int32)
+        self.index: Optional[InvertedIndex] = None
+
+    # ---------- Construcción ----------
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame,
+                       brand_key: Optional[Callable[[str], str]] = None) -> "TagEngine":
+        """
+        Compila 'categoria_detectada', 'intencion_detectada' y 'atributos_list'.
+        Aplica las mismas normalizaciones que `filtrar_por_tags` (fillna(""), safe_list).
+        Si se pasa `brand_key` (p.ej. `recommender.slugify_tag`), también interna
+        `brand_key(str(brand_name))` para los bonus de marca de `rank_products`.
+        """
+        n = len(df)
+        tag_to_id: dict = {}
+
+        def intern(tag) -> int:
+            if not isinstance(tag, str):
+                return NO_TAG
+            tid = tag_to_id.get(tag)
+            if tid is None:
+                tid = tag_to_id[tag] = len(tag_to_id)
+            return tid
+
+        def column(col: str) -> Iterable:
+            if col not in df.columns:
+                return [""] * n
+            return df[col].fillna("").tolist()
+
+        cat_ids = np.fromiter((intern(c) for c in column("categoria_detectada")), dtype=np.int32, count=n)
+        intent_ids = np.fromiter((intern(c) for c in column("intencion_detectada")), dtype=np.int32, count=n)
+
+        attrs_col = df["atributos_list"].tolist() if "atributos_list" in df.columns else [[]] * n
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        indices: list = []
+        first: list = []
+        for i, raw in enumerate(attrs_col):
+            attrs = _as_list(raw)
+            if isinstance(attrs, list):
+                vistos = set()
+                for a in attrs:
+                    tid = intern(a)
+                    indices.append(tid)
+                    first.append(tid != NO_TAG and tid not in vistos)
+                    vistos.add(tid)
+            indptr[i + 1] = len(indices)
+
+        vocab = [None] * len(tag_to_id)
+        for tag, tid in tag_to_id.items():
+            vocab[tid] = tag
+
+        brand_vocab, brand_ids = None, None
+        if brand_key is not None:
+            brands = df["brand_name"].tolist() if "brand_name" in df.columns else [""] * n
+            brand_to_id: dict = {}
+            brand_ids = np.fromiter(
+                (brand_to_id.setdefault(brand_key(str(b)), len(brand_to_id)) for b in brands),
+                dtype=np.int32, count=n,
+            )
+            brand_vocab = list(brand_to_id)
+
+        return cls(
+            vocab=vocab,
+            cat_ids=cat_ids,
+            intent_ids=intent_ids,
+            attr_indptr=indptr,
+            attr_indices=np.asarray(indices, dtype=np.int32),
+            attr_first=np.asarray(first, dtype=bool),
+            brand_vocab=brand_vocab,
+            brand_ids=brand_ids,
+        )
+
+    @classmethod
+    def concat_take(cls, base: "TagEngine", delta: "TagEngine", sel: np.ndarray) -> "TagEngine":
+        """
+        Motor nuevo cuyas filas son `sel` sobre la concatenación virtual
+        [filas de base..., filas de delta...], sin recompilar nada fila por fila.
+
+        El vocabulario de `base` se conserva tal cual (los IDs existentes no cambian)
+        y los tags/marcas nuevos de `delta` se agregan al final. Sirve para aplicar
+        upserts/deletes: `sel` deja afuera las filas borradas y reemplaza las
+        actualizadas por su versión en `delta`.
+        """
+        vocab = list(base.vocab)
+        tag_to_id = dict(base.tag_to_id)
+        for tag in delta.vocab:
+            if tag not in tag_to_id:
+                tag_to_id[tag] = len(vocab)
+                vocab.append(tag)
+        # El último casillero es NO_TAG: remap[-1] = -1
+        remap = np.array([tag_to_id[t] for t in delta.vocab] + [NO_TAG], dtype=np.int32)
+
+        brand_vocab = list(base.brand_vocab)
+        brand_to_id = dict(base.brand_to_id)
+        for brand in delta.brand_vocab:
+            if brand not in brand_to_id:
+                brand_to_id[brand] = len(brand_vocab)
+                brand_vocab.append(brand)
+        brand_remap = np.array([brand_to_id[b] for b in delta.brand_vocab] + [NO_TAG], dtype=np.int32)
+
+        sel = np.asarray(sel, dtype=np.int64)
+
+        def por_fila(a_base, a_delta, remap_ids):
+            todo = np.concatenate((np.asarray(a_base), remap_ids[a_delta]))
+            return todo[sel]
+
+        # CSR: inicio y largo de cada fila en los nnz concatenados
+        nnz_base = len(base.attr_indices)
+        inicio = np.concatenate((base.attr_indptr[:-1], delta.attr_indptr[:-1] + nnz_base))
+        largo = np.concatenate((np.diff(base.attr_indptr), np.diff(delta.attr_indptr)))
+        indices = np.concatenate((np.asarray(base.attr_indices), remap[delta.attr_indices]))
+        first = np.concatenate((np.asarray(base.attr_first), delta.attr_first))
+
+        largo_sel = largo[sel]
+        indptr = np.zeros(len(sel) + 1, dtype=np.int64)
+        np.cumsum(largo_sel, out=indptr[1:])
+        pos = np.repeat(inicio[sel] - indptr[:-1], largo_sel) + np.arange(indptr[-1])
+
+        return cls(
+            vocab=vocab,
+            cat_ids=por_fila(base.cat_ids, delta.cat_ids, remap),
+            intent_ids=por_fila(base.intent_ids, delta.intent_ids, remap),
+            attr_indptr=indptr,
+            attr_indices=indices[pos],
+            attr_first=first[pos],
+            brand_vocab=brand_vocab,
+            brand_ids=por_fila(base.brand_ids, delta.brand_ids, brand_remap),
+        )
+
+    def build_index(self):
+        """Construye (y guarda en `self.index`) el índice invertido tag -> productos."""
+        self.index = InvertedIndex.from_engine(self)
+        return self.index
+
+    # ---------- Persistencia ----------
+    _ARRAYS = ("cat_ids", "intent_ids", "attr_indptr", "attr_indices", "attr_first", "brand_ids")
+
+    def save(self, path: str) -> None:
+        """Guarda los arrays como .npy (memory-mappeables) y los vocabularios como JSON."""
+        os.makedirs(path, exist_ok=True)
+        for name in self._ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump({"tags": self.vocab, "brands": self.brand_vocab}, f, ensure_ascii=False)
+        if self.index is not None:
+            self.index.save(os.path.join(path, "index"))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "TagEngine":
+        """Abre un motor guardado con `save`; con `mmap` los arrays no se copian a RAM."""
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in cls._ARRAYS}
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            vocab = json.load(f)
+        motor = cls(vocab=vocab["tags"], brand_vocab=vocab["brands"], **arrays)
+        if os.path.isdir(os.path.join(path, "index")):
+            motor.index = InvertedIndex.load(os.path.join(path, "index"), mmap=mmap)
+        return motor
+
+    # ---------- Info ----------
+    @property
+    def n_products(self) -> int:
+        return len(self.cat_ids)
+
+    @property
+    def n_tags(self) -> int:
+        return len(self.vocab)
+
+    def tag_id(self, tag: str) -> int:
+        return self.tag_to_id.get(tag, NO_TAG)
+
+    def brand_id(self, brand: str) -> int:
+        return self.brand_to_id.get(brand, NO_TAG)
+
+    def rows_with_category(self, tag: str) -> np.ndarray:
+        tid = self.tag_id(tag)
+        if tid == NO_TAG:
+            return np.empty(0, dtype=np.int64)
+        if self.index is not None:
+            # La posting del tag también trae las filas que lo tienen como intención o atributo
+            filas = self.index.postings(tid)
+            return filas[self.cat_ids[filas] == tid]
+        return np.flatnonzero(self.cat_ids == tid)
+
+    def query_mask(self, tags: Iterable[str]) -> np.ndarray:
+        """Vector booleano de largo n_tags+1 (el último casillero es NO_TAG y queda en False)."""
+        mask = np.zeros(self.n_tags + 1, dtype=bool)
+        ids = [self.tag_to_id[t] for t in tags if t in self.tag_to_id]
+        mask[ids] = True
+        return mask
+
+    def score_vector(self, scores: Dict[str, float]) -> np.ndarray:
+        """Vector denso de largo n_tags+1 con el score de cada tag (0.0 si no está)."""
+        vec = np.zeros(self.n_tags + 1, dtype=np.float64)
+        for tag, value in scores.items():
+            tid = self.tag_to_id.get(tag)
+            if tid is not None:
+                vec[tid] = float(value)
+        return vec
+
+    def attr_lists(self, rows: Optional[np.ndarray] = None) -> List[List[str]]:
+        """Reconstruye `atributos_list` (como listas) para las filas pedidas."""
+        if rows is None:
+            rows = np.arange(self.n_products)
+        vocab, indptr, indices = self.vocab, self.attr_indptr, self.attr_indices
+        return [
+            [vocab[t] for t in indices[indptr[r]:indptr[r + 1]] if t != NO_TAG]
+            for r in rows
+        ]
+
+    # ---------- Scoring ----------
+    def _rows(self, rows: Optional[np.ndarray]) -> np.ndarray:
+        return np.arange(self.n_products) if rows is None else np.asarray(rows, dtype=np.int64)
+
+    def attr_match_counts(self, mask: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cantidad de atributos distintos de cada fila que están en `mask`."""
+        if rows is None:
+            # Suma por fila del CSR: prefijos acumulados sobre los nnz que cuentan
+            hits = mask[self.attr_indices] & self.attr_first
+            acumulado = np.concatenate(([0], np.cumsum(hits, dtype=np.int64)))
+            return acumulado[self.attr_indptr[1:]] - acumulado[self.attr_indptr[:-1]]
+
+        # Subconjunto de filas: sólo se tocan los nnz de esas filas
+        rows = self._rows(rows)
+        total = np.zeros(len(rows), dtype=np.int64)
+        start = self.attr_indptr[rows]
+        length = self.attr_indptr[rows + 1] - start
+        for j in range(int(length.max()) if len(rows) else 0):
+            sel = np.flatnonzero(length > j)
+            pos = start[sel] + j
+            total[sel] += mask[self.attr_indices[pos]] & self.attr_first[pos]
+        return total
+
+    def match_counts(self, tags_set: Iterable[str], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Equivalente vectorizado de `similitud_producto` sobre todo el catálogo
+        (o sobre `rows`): +1 por categoría, +1 por intención, +1 por cada atributo
+        distinto presente.
+        """
+        rows_idx = self._rows(rows)
+        mask = self.query_mask(tags_set)
+        total = mask[self.cat_ids[rows_idx]].astype(np.int64)
+        total += mask[self.intent_ids[rows_idx]]
+        total += self.attr_match_counts(mask, rows)
+        return total
+
+    def weighted_scores(self,
+                        cat_values: np.ndarray,
+                        intent_values: np.ndarray,
+                        attr_values: np.ndarray,
+                        rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Mat-vec por bloques: categoría + intención + cada atributo de la fila.
+
+        Cada `*_values` es un vector de largo n_tags+1 (score del modelo ya escalado
+        por el peso del bloque). Los atributos se suman columna a columna, en el
+        orden de `atributos_list`, para que el resultado en float64 sea idéntico
+        bit a bit al acumulado secuencial de `score_row`.
+        """
+        rows = self._rows(rows)
+        total = np.zeros(len(rows), dtype=np.float64)
+        total += cat_values[self.cat_ids[rows]]
+        total += intent_values[self.intent_ids[rows]]
+
+        start = self.attr_indptr[rows]
+        length = self.attr_indptr[rows + 1] - start
+        for j in range(int(length.max()) if len(rows) else 0):
+            sel = np.flatnonzero(length > j)
+            total[sel] += attr_values[self.attr_indices[start[sel] + j]]
+        return total
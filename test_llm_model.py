@@ -8,11 +8,14 @@ import os
 import re
 import json
 import pandas as pd
+import numpy as np
 import ast
 
 # Add the extracted model to the Python path
 sys.path.insert(0, '.')
 
+from topk import top_k_indices
+
 def clean_label(label):
     """Clean up duplicate prefixes in model labels"""
     # Remove duplicated prefixes: CAT_CAT_, INT_INT_, ATTR_ATTR_
@@ -94,20 +97,17 @@ def find_top_products(predictions: dict, df: pd.DataFrame, top_k: int = 5):
         return pd.DataFrame()
     
     # Calcular scores para todos los productos
-    scores = []
-    for idx, product in df.iterrows():
-        score = calculate_product_score(product, predictions)
-        scores.append((idx, score))
-
-    # Ordenar por score descendente
-    scores.sort(key=lambda x: x[1], reverse=True)
+    scores = np.fromiter(
+        (calculate_product_score(product, predictions) for _, product in df.iterrows()),
+        dtype=float, count=len(df),
+    )
 
-    # Tomar los top_k productos con mejor score
-    top_indices = [idx for idx, score in scores[:top_k]]
-    result_df = df.loc[top_indices].copy()
+    # Tomar los top_k productos con mejor score (selección parcial, sin ordenar todo)
+    top_pos = top_k_indices(scores, top_k)
+    result_df = df.iloc[top_pos].copy()
 
     # Agregar columna de score para mostrar
-    result_df['relevance_score'] = [score for _, score in scores[:top_k]]
+    result_df['relevance_score'] = scores[top_pos]
 
     return result_df
 
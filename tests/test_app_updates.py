@@ -0,0 +1,96 @@
+import importlib
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from catalog_updates import CsvWatcher
+
+FILAS = [
+    ("Notebook Lenovo", "nb-1", "Lenovo", 250000, "CAT_NOTEBOOK", "INT_OFICINA", ["ATTR_PORTATIL"]),
+    ("Monitor Samsung", "mon-1", "Samsung", 120000, "CAT_MONITOR", "INT_DISENO", ["ATTR_PANEL_IPS"]),
+    ("Auricular Sony", "aur-1", "Sony", 50000, "CAT_AURICULAR", "INT_GAMING", ["ATTR_OVER_EAR"]),
+]
+
+
+def _csv(ruta, filas=FILAS):
+    pd.DataFrame({
+        "title": [f[0] for f in filas],
+        "slug": [f[1] for f in filas],
+        "brand_name": [f[2] for f in filas],
+        "list_price": [f[3] for f in filas],
+        "categories": ["" for _ in filas],
+        "atributos_correctos": [str({"categoria": f[4], "intencion": f[5], "atributos": f[6]}) for f in filas],
+    }).to_csv(ruta, index=False)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Importa app_v0 (de cero cada vez, como un proceso nuevo) sobre un CSV chico en `tmp_path`."""
+    (tmp_path / "datos").mkdir()
+    _csv(tmp_path / "datos" / "productos-gemini.csv")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SPELLING", "0")
+
+    def cargar():
+        sys.modules.pop("app_v0", None)
+        return importlib.import_module("app_v0")
+    yield cargar
+    sys.modules.pop("app_v0", None)
+
+
+def _etiquetas(app_v0, sku):
+    fila = int(np.flatnonzero(app_v0.df["sku_id"].astype(str).to_numpy() == sku)[0])
+    motor = app_v0.motor
+    return motor.vocab[motor.cat_ids[fila]], motor.vocab[motor.intent_ids[fila]]
+
+
+def test_publicar_actualiza_motor_filtros_y_facetas(app):
+    app_v0 = app()
+    resumen = app_v0.registrar_cambios([
+        {"slug": "aur-1", "list_price": 400000},
+        {"slug": "tec-1", "title": "Teclado Logitech", "brand_name": "Logitech", "list_price": 30000,
+         "atributos_correctos": "{'categoria': 'CAT_TECLADO', 'intencion': 'INT_OFICINA', 'atributos': []}"},
+    ], ["mon-1"])
+    assert (resumen["actualizados"], resumen["insertados"], resumen["borrados"]) == (1, 1, 1)
+
+    c = app_v0.vigente()
+    assert c.checksum == resumen["version"] and len(c.df) == 3
+    assert _etiquetas(app_v0, "tec-1") == ("CAT_TECLADO", "INT_OFICINA")
+    # Filtro de precio con los precios nuevos (sale_price = 90% de list_price)
+    filas = c.filters().rows(precio_min=300000)
+    assert c.df["sku_id"].iloc[filas].tolist() == ["aur-1"]
+    conteos = c.facets().counts()
+    assert {v["value"] for v in conteos["brand_name"]} == {"Lenovo", "Sony", "Logitech"}
+    assert {v["value"] for v in conteos["categoria_detectada"]} == {"CAT_NOTEBOOK", "CAT_AURICULAR", "CAT_TECLADO"}
+
+
+def test_journal_se_reaplica_al_reiniciar(app):
+    app_v0 = app()
+    resumen = app_v0.registrar_cambios([{"slug": "nb-1", "list_price": 999000}], ["aur-1"])
+    # Otro proceso (o el mismo después de reiniciar) lee el journal al arrancar
+    app_v0 = app()
+    c = app_v0.vigente()
+    assert c.checksum == resumen["version"]
+    assert sorted(c.df["sku_id"].astype(str)) == ["mon-1", "nb-1"]
+    assert c.df.set_index("sku_id").loc["nb-1", "list_price"] == 999000
+
+
+def test_csv_watcher_aplica_los_cambios_del_csv(app, tmp_path):
+    app_v0 = app()
+    ruta = tmp_path / "datos" / "productos-gemini.csv"
+    watcher = CsvWatcher(str(ruta), app_v0.cambios_del_csv, interval=0.05, debounce=0.05)
+    watcher.start()
+    try:
+        nuevo = FILAS[:2] + [("Auricular Sony XB", "aur-1", "Sony", 60000, "CAT_AURICULAR", "INT_GAMING", ["ATTR_OVER_EAR"])]
+        _csv(ruta, nuevo)
+        limite = time.time() + 10
+        while time.time() < limite and app_v0.vigente().df.set_index("sku_id").loc["aur-1", "list_price"] != 60000:
+            time.sleep(0.05)
+    finally:
+        watcher.stop()
+    c = app_v0.vigente()
+    assert c.df.set_index("sku_id").loc["aur-1", "title"] == "Auricular Sony XB"
+    assert len(c.df) == 3
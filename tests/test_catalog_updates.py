@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from catalog import CatalogSnapshot, process_catalog
+from catalog_updates import apply_delta
+from facets import FacetIndex
+from lexical_index import LexicalIndex
+from recommender import compile_products
+
+
+def _catalogo() -> CatalogSnapshot:
+    df = process_catalog(pd.DataFrame({
+        "title": ["Notebook Lenovo", "Monitor Samsung", "Auricular Sony"],
+        "slug": ["nb-1", "mon-1", "aur-1"],
+        "brand_name": ["Lenovo", "Samsung", "Sony"],
+        "list_price": [250000, 120000, 50000],
+        "atributos_correctos": [
+            "{'categoria': 'CAT_NOTEBOOK', 'intencion': 'INT_OFICINA', 'atributos': ['ATTR_PORTATIL']}",
+            "{'categoria': 'CAT_MONITOR', 'intencion': 'INT_DISENO', 'atributos': ['ATTR_PANEL_IPS']}",
+            "{'categoria': 'CAT_AURICULAR', 'intencion': 'INT_GAMING', 'atributos': ['ATTR_OVER_EAR']}",
+        ],
+    }))
+    return CatalogSnapshot(df, compile_products(df), "v0", None)
+
+
+def test_delta_mixto_rederiva_tags_por_fila():
+    cat, resumen = apply_delta(_catalogo(), [
+        # update de atributos, update sólo de precio e insert, en el mismo delta
+        {"slug": "nb-1", "atributos_correctos":
+            "{'categoria': 'CAT_NOTEBOOK', 'intencion': 'INT_GAMING', 'atributos': ['ATTR_POTENTE']}"},
+        {"slug": "mon-1", "list_price": 99000},
+        {"slug": "tec-1", "title": "Teclado Logitech", "brand_name": "Logitech",
+         "atributos_correctos": "{'categoria': 'CAT_TECLADO', 'intencion': 'INT_OFICINA', 'atributos': ['ATTR_MECANICO']}"},
+    ])
+    assert (resumen["actualizados"], resumen["insertados"]) == (2, 1)
+    df = cat.df.set_index("sku_id")
+    assert df.loc["nb-1", "intencion_detectada"] == "INT_GAMING"
+    assert list(df.loc["nb-1", "atributos_list"]) == ["ATTR_POTENTE"]
+    assert df.loc["mon-1", "categoria_detectada"] == "CAT_MONITOR"
+    assert list(df.loc["mon-1", "atributos_list"]) == ["ATTR_PANEL_IPS"]
+    assert df.loc["tec-1", "categoria_detectada"] == "CAT_TECLADO"
+    assert df.loc["tec-1", "intencion_detectada"] == "INT_OFICINA"
+    assert list(df.loc["tec-1", "atributos_list"]) == ["ATTR_MECANICO"]
+
+    # El motor incremental coincide con compilar el catálogo resultante de cero
+    esperado = compile_products(cat.df)
+    vocab = cat.motor.vocab
+    assert [vocab[t] for t in cat.motor.cat_ids] == [esperado.vocab[t] for t in esperado.cat_ids]
+    assert [vocab[t] for t in cat.motor.intent_ids] == [esperado.vocab[t] for t in esperado.intent_ids]
+    assert [vocab[t] for t in cat.motor.attr_indices] == [esperado.vocab[t] for t in esperado.attr_indices]
+
+
+def test_catalogo_sin_sku_id_usa_slug():
+    cat = _catalogo()
+    df = cat.df.drop(columns=["sku_id"])
+    cat = CatalogSnapshot(df, compile_products(df), "v0", None)
+    cat, resumen = apply_delta(cat, [{"slug": "mon-1", "list_price": 99000}], ["aur-1"])
+    assert (resumen["actualizados"], resumen["borrados"], resumen["productos"]) == (1, 1, 2)
+
+
+def test_delta_de_precio_no_rearma_el_lexico(monkeypatch):
+    cat = _catalogo()
+    lexico = cat.lexical()
+
+    def rearmar(*args, **kwargs):
+        raise AssertionError("se rearmó el índice BM25")
+    monkeypatch.setattr(LexicalIndex, "from_dataframe", rearmar)
+    nuevo, _ = apply_delta(cat, [{"slug": "mon-1", "list_price": 99000}])
+    assert nuevo.lexical() is lexico
+    assert not nuevo.lexico_pendiente
+
+
+def test_delta_con_textos_sirve_el_lexico_anterior_hasta_rearmarlo():
+    cat = _catalogo()
+    cat.lexical()
+    nuevo, _ = apply_delta(cat, [{"slug": "tec-1", "title": "Teclado Logitech", "brand_name": "Logitech"}],
+                           ["nb-1"])
+    assert nuevo.lexico_pendiente
+    # Renumerado: las filas viejas se siguen encontrando, la nueva todavía no
+    filas, _ = nuevo.lexical().search("monitor samsung", 5)
+    assert nuevo.df["sku_id"].iloc[filas].tolist() == ["mon-1"]
+    assert len(nuevo.lexical().search("teclado", 5)[0]) == 0
+    nuevo.rebuild_lexical()
+    filas, _ = nuevo.lexical().search("teclado", 5)
+    assert nuevo.df["sku_id"].iloc[filas].tolist() == ["tec-1"] and not nuevo.lexico_pendiente
+
+
+def test_delta_de_precio_reusa_facetas_salvo_precio():
+    cat = _catalogo()
+    facetas = cat.facets()
+    nuevo, _ = apply_delta(cat, [{"slug": "aur-1", "list_price": 300000}])
+    assert nuevo.facetas is None  # se arman al primer uso
+    nuevas = nuevo.facets()
+    assert nuevas.facetas["brand_name"] is facetas.facetas["brand_name"]
+    assert nuevas.facetas["precio"] is not facetas.facetas["precio"]
+    esperadas = FacetIndex.from_catalog(nuevo.df, nuevo.motor)
+    assert nuevas.counts() == esperadas.counts()
+    assert nuevas.counts(np.array([0, 2])) == esperadas.counts(np.array([0, 2]))
+
+
+def test_delta_de_marca_rearma_facetas():
+    cat = _catalogo()
+    facetas = cat.facets()
+    nuevo, _ = apply_delta(cat, [{"slug": "aur-1", "brand_name": "JBL"}])
+    assert nuevo.facets().facetas["brand_name"] is not facetas.facetas["brand_name"]
+    marcas = {v["value"] for v in nuevo.facets().counts()["brand_name"]}
+    assert marcas == {"Lenovo", "Samsung", "JBL"}
@@ -0,0 +1,58 @@
+import pytest
+
+from query_constraints import parse_price
+from spelling import SpellChecker, build_vocabulary, seed_words
+
+# Palabras de títulos a distancia 1-2 de las del parser de precios
+TITULOS = ["Luces LED", "Luces RGB", "Pasos contador", "Pasos podometro", "Super Mini PC",
+           "Super Mini Parlante", "Bajo consumo", "Bajo ruido", "Paso a paso"]
+QUERIES = [
+    "notebook de 300 a 500 lucas",
+    "celular que no supere 800 mil",
+    "monitor como minimo 200 mil",
+    "tablet por debajo de 300 mil",
+    "notebook hasta 2 palos",
+    "tele de 1 a 2 palos",
+    "auriculares máximo 80 mil",
+    "parlante mínimo 50 lucas",
+]
+
+
+@pytest.mark.parametrize("semillas", [(), seed_words()], ids=["sin_semillas", "con_semillas"])
+@pytest.mark.parametrize("query", QUERIES)
+def test_correccion_no_cambia_el_precio(query, semillas):
+    checker = SpellChecker.build(build_vocabulary(TITULOS, strings_path=None, semillas=semillas))
+    # Mismo orden que app_v0: corregir_query y después filtrar_query
+    assert parse_price(checker.correct(query))[:2] == parse_price(query)[:2]
+    assert parse_price(query)[:2] != (None, None)
+
+
+def test_typos_fuera_del_precio_se_siguen_corrigiendo():
+    checker = SpellChecker.build(build_vocabulary(TITULOS + ["Notebook HP", "Notebook Lenovo"],
+                                                  strings_path=None))
+    assert checker.correct("notbook hasta 500 lucas") == "notebook hasta 500 lucas"
+
+
+@pytest.mark.parametrize("query", [
+    "mouse hasta 16000 dpi",
+    "powerbank de hasta 20000 mah",
+    "tv menos de 2000 w",
+    "disco hasta 2000 gb",
+    "ventilador menos de 3000 rpm",
+    'monitor hasta 27"',
+    "tv hasta 1.500.000 w",
+])
+def test_numero_con_unidad_no_es_precio(query):
+    precio_min, precio_max, resto = parse_price(query)
+    assert (precio_min, precio_max) == (None, None)
+    assert resto == query
+
+
+@pytest.mark.parametrize("query, rango", [
+    ("mouse hasta 16000", (None, 16000.0)),
+    ("celular 5000mah hasta 300 mil", (None, 300000.0)),
+    ("tv de 50 a 65 pulgadas hasta 900 mil", (None, 900000.0)),
+    ("hasta 1.500.000", (None, 1500000.0)),
+])
+def test_precio_junto_a_especificaciones(query, rango):
+    assert parse_price(query)[:2] == rango
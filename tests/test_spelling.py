@@ -0,0 +1,21 @@
+from spelling import SpellChecker, build_vocabulary, seed_words
+
+
+def _corrector(titulos, semillas=()):
+    return SpellChecker.build(build_vocabulary(titulos, strings_path=None, semillas=semillas))
+
+
+def test_semillas_no_se_corrigen():
+    titulos = ["Silla para oficinas", "Escritorio para oficinas", "Cable para estudios"]
+    assert _corrector(titulos).correct("notebook oficina") == "notebook oficinas"
+    assert _corrector(titulos, seed_words()).correct("notebook oficina estudio") == "notebook oficina estudio"
+
+
+def test_frecuencia_minima_y_margen_por_largo():
+    c = _corrector(["Notebook Lenovo", "Notebook HP", "Ideapad Slim"])
+    assert c.correct("notbook") == "notebook"
+    # "ideapad" está una sola vez: se conoce pero no reemplaza a otro token
+    assert c.correct("ideapod") == "ideapod"
+    # Token de 6 letras: a lo sumo una edición
+    c = _corrector(["Mini PC", "Mini Parlante"])
+    assert c.correct("minimo") == "minimo"
@@ -0,0 +1,39 @@
+# topk.py
+from __future__ import annotations
+from typing import Optional
+
+import numpy as np
+
+
+def top_k_indices(scores: np.ndarray, k: int, tiebreak: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Posiciones de los `k` scores más altos, ordenadas de mayor a menor.
+
+    Selección parcial con `np.partition` (O(n)) y orden sólo de los k elegidos
+    (O(k log k)), en vez de ordenar todo el catálogo.
+    Empates deterministas: primero por `tiebreak` ascendente (p.ej. precio),
+    después por posición en el catálogo. NaN cuenta como el peor score.
+    """
+    scores = np.asarray(scores)
+    n = len(scores)
+    k = min(int(k), n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if scores.dtype.kind == "f" and np.isnan(scores).any():
+        scores = np.where(np.isnan(scores), -np.inf, scores)
+
+    if k < n:
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        empatados = np.flatnonzero(scores == kth)
+        if tiebreak is not None:
+            empatados = empatados[np.lexsort((empatados, tiebreak[empatados]))]
+        cand = np.concatenate((above, empatados[:k - len(above)]))
+    else:
+        cand = np.arange(n)
+
+    if tiebreak is None:
+        orden = np.lexsort((cand, -scores[cand]))
+    else:
+        orden = np.lexsort((cand, tiebreak[cand], -scores[cand]))
+    return cand[orden]